@@ -4,17 +4,41 @@ os.environ.setdefault("HTTP_PROXY", "http://192.168.0.102:7897")
 os.environ.setdefault("HTTPS_PROXY", "http://192.168.0.102:7897")
 
 import uvicorn
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel
-from routes.meditation import medi
+from routes.meditation import medi, warm_pool
 from routes.user import user
 from routes.history import hist
 from routes.deepseek_api import deep
 from routes.rating import rating_router
 from routes.enhanced_meditation import enhanced_meditation_router
+from routes.audio import audio_router
 from fastapi.middleware.cors import CORSMiddleware
+from services.deepseek_client import deepseek_client
+from services.feedback_worker import feedback_worker
+from services.audio_pipeline import audio_pipeline
+from services.unit_of_work import CommitTimingMiddleware
 
-app = FastAPI(title="Meditation API", description="API for meditation app")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Open shared outbound connection pools once per worker
+    await deepseek_client.start()
+    # Pre-generate meditations for the common moods in the background
+    await warm_pool.start()
+    # Compute feedback profiles off the request path
+    await feedback_worker.start()
+    # Synthesize and upload audio for async_audio requests
+    await audio_pipeline.start()
+    yield
+    await audio_pipeline.stop()
+    await feedback_worker.stop()
+    await warm_pool.stop()
+    await deepseek_client.close()
+
+
+app = FastAPI(title="Meditation API", description="API for meditation app", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -22,7 +46,10 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing", "X-Next-Cursor"],
 )
+# Server-Timing header with the request's Firestore batch commit time
+app.add_middleware(CommitTimingMiddleware)
 
 
 app.include_router(medi, prefix="/meditation", tags=["Meditation"])
@@ -31,6 +58,7 @@ app.include_router(hist, prefix="/history", tags=["History"])
 app.include_router(deep, prefix="/deep", tags=["deepseek"])
 app.include_router(rating_router, prefix="/rating", tags=["Rating"])
 app.include_router(enhanced_meditation_router, prefix="/enhanced-meditation", tags=["Enhanced Meditation"])
+app.include_router(audio_router, prefix="/audio", tags=["Audio"])
 
 
 @app.get("/")
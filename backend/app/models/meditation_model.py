@@ -14,6 +14,9 @@ class MeditationRecord(BaseModel):
     feedback: Optional[str] = None
     score: Optional[int] = Field(default=None, ge=1, le=5)
     audio_url: Optional[str] = None
+    audio_status: Optional[str] = None  # pending / processing / ready / failed
+    audio_profile: Optional[str] = None
+    playlist_url: Optional[str] = None  # HLS master playlist
     feedback_optimized: bool = False
     created_at: datetime
     updated_at: datetime
@@ -24,9 +27,13 @@ class MeditationHistoryItem(BaseModel):
     mood: str
     context: str
     script: str
+    script_excerpt: Optional[str] = None  # 列表页摘要，避免读取整篇脚本
     is_regenerated: bool = False
     score: Optional[int] = Field(default=None, ge=1, le=5)
     audio_url: Optional[str] = None
+    audio_status: Optional[str] = None  # pending / processing / ready / failed
+    audio_profile: Optional[str] = None
+    playlist_url: Optional[str] = None  # HLS master playlist
     feedback_optimized: bool = False
     created_at: datetime
     updated_at: datetime
\ No newline at end of file
@@ -14,6 +14,7 @@ class RatingRecord(BaseModel):
     rating_type: RatingType
     score: int = Field(..., ge=1, le=5)
     comment: Optional[str] = None
+    meditation_record_id: Optional[str] = None
     created_at: datetime
     updated_at: datetime
 
@@ -22,6 +23,7 @@ class CreateRatingRequest(BaseModel):
     rating_type: RatingType
     score: int = Field(..., ge=1, le=5)
     comment: Optional[str] = None
+    meditation_record_id: Optional[str] = None
 
 class UpdateRatingRequest(BaseModel):
     score: int = Field(..., ge=1, le=5)
@@ -33,6 +35,7 @@ class RatingResponse(BaseModel):
     rating_type: RatingType
     score: int
     comment: Optional[str] = None
+    meditation_record_id: Optional[str] = None
     created_at: datetime
     updated_at: datetime
 
@@ -0,0 +1,192 @@
+import os
+import re
+import time
+import asyncio
+from collections import OrderedDict
+from email.utils import formatdate
+from typing import Optional, Tuple
+
+import anyio
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import RedirectResponse, Response
+from starlette.types import Scope, Receive, Send
+
+from services.database_service import MeditationDatabaseService
+from services.audio_cache import audio_cache
+from services.storage_backends import storage_backend, LocalStorageBackend
+
+audio_router = APIRouter()
+db_service = MeditationDatabaseService()
+
+AUDIO_CACHE_CONTROL = os.getenv("AUDIO_CACHE_CONTROL", "public, max-age=31536000, immutable")
+AUDIO_READ_CHUNK_SIZE = 256 * 1024
+# Deleting a record forgets its path on this instance; other instances stop serving it after this long
+AUDIO_PATH_CACHE_SECONDS = float(os.getenv("AUDIO_PATH_CACHE_SECONDS", "60"))
+
+CONTENT_TYPES = {"mp3": "audio/mpeg", "ogg": "audio/ogg"}
+
+_HASHED_AUDIO = re.compile(r"meditations/by-hash/[^/]+/(?P<key>[0-9a-f]{64})\.(?P<ext>\w+)$")
+_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+# record_id -> (local file path, expiry), only for records whose audio is on this machine
+_resolved_paths: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+_RESOLVED_PATHS_MAX = 4096
+
+
+def forget_audio_path(record_id: str):
+    """Drop a record's cached audio path, e.g. once the record is deleted"""
+    _resolved_paths.pop(record_id, None)
+
+
+class RangeFileResponse(Response):
+    """Serve a local file with single-range support
+
+    The body goes out through the ASGI zero-copy extension (sendfile) when
+    the server offers it, otherwise in chunks read off the event loop.
+    """
+
+    def __init__(self, path: str, stat_result: os.stat_result, media_type: str,
+                 byte_range: Optional[Tuple[int, int]] = None, headers: Optional[dict] = None,
+                 head_only: bool = False):
+        super().__init__(content=None, status_code=206 if byte_range else 200,
+                         headers=headers, media_type=media_type)
+        self.path = path
+        size = stat_result.st_size
+        self.start, self.end = byte_range or (0, size - 1)
+        self.head_only = head_only
+
+        self.headers["accept-ranges"] = "bytes"
+        self.headers["content-length"] = str(max(self.end - self.start + 1, 0))
+        self.headers["last-modified"] = formatdate(stat_result.st_mtime, usegmt=True)
+        if byte_range:
+            self.headers["content-range"] = f"bytes {self.start}-{self.end}/{size}"
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        count = self.end - self.start + 1
+        if self.head_only or count <= 0:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+
+        if "http.response.zerocopysend" in scope.get("extensions", {}):
+            with open(self.path, "rb") as file:
+                await send({
+                    "type": "http.response.zerocopysend",
+                    "file": file,
+                    "offset": self.start,
+                    "count": count,
+                    "more_body": False,
+                })
+            return
+
+        async with await anyio.open_file(self.path, mode="rb") as file:
+            await file.seek(self.start)
+            remaining = count
+            while remaining > 0:
+                chunk = await file.read(min(AUDIO_READ_CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+            if remaining > 0:
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+
+def _local_audio_path(audio_url: str) -> Optional[str]:
+    """Path of the record's audio on local disk, if this instance has it"""
+    if isinstance(storage_backend, LocalStorageBackend):
+        name = None
+        if audio_url.startswith("file://"):
+            path = audio_url[len("file://"):]
+            if os.path.isfile(path):
+                return path
+        elif storage_backend.base_url and audio_url.startswith(storage_backend.base_url + "/"):
+            name = audio_url[len(storage_backend.base_url) + 1:]
+        if name:
+            try:
+                path = storage_backend.path(name)
+            except ValueError:
+                path = None
+            if path and os.path.isfile(path):
+                return path
+
+    match = _HASHED_AUDIO.search(audio_url.split("?", 1)[0])
+    if match:
+        return audio_cache.get_audio_path(match.group("key"), match.group("ext"))
+    return None
+
+
+def _parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """(start, end) of a single bytes range; None to serve the whole file"""
+    match = _RANGE.match(header.strip())
+    if not match or size == 0:
+        # Multi-range and malformed requests get the full file
+        return None
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        if last and int(last) < start:
+            # Syntactically invalid (RFC 7233 §2.1): ignore the header
+            return None
+        end = min(int(last), size - 1) if last else size - 1
+    elif last:
+        start = max(size - int(last), 0)
+        end = size - 1
+    else:
+        return None
+    if start >= size:
+        raise HTTPException(status_code=416, detail="Requested range not satisfiable",
+                            headers={"Content-Range": f"bytes */{size}"})
+    return start, end
+
+
+def _etag(stat_result: os.stat_result) -> str:
+    return f'"{stat_result.st_size:x}-{stat_result.st_mtime_ns:x}"'
+
+
+@audio_router.api_route("/{record_id}", methods=["GET", "HEAD"])
+async def get_meditation_audio(record_id: str, request: Request):
+    """Serve a meditation's audio from local disk, or redirect to its stored audio_url
+
+    Supports single byte ranges, If-None-Match / If-Range with a strong
+    ETag, and long-lived Cache-Control.
+    """
+    path, expires = _resolved_paths.get(record_id, (None, 0.0))
+    if path is None or expires < time.monotonic() or not os.path.isfile(path):
+        record = await asyncio.to_thread(db_service.get_meditation_record, record_id)
+        if record is None:
+            raise HTTPException(status_code=404, detail="Meditation record not found")
+        audio_url = record.get("audio_url")
+        if not audio_url:
+            raise HTTPException(status_code=404, detail="Meditation audio not available")
+
+        path = _local_audio_path(audio_url)
+        if path is None:
+            return RedirectResponse(storage_backend.resolve_url(audio_url), status_code=302)
+
+        _resolved_paths[record_id] = (path, time.monotonic() + AUDIO_PATH_CACHE_SECONDS)
+        _resolved_paths.move_to_end(record_id)
+        if len(_resolved_paths) > _RESOLVED_PATHS_MAX:
+            _resolved_paths.popitem(last=False)
+
+    stat_result = await anyio.to_thread.run_sync(os.stat, path)
+    etag = _etag(stat_result)
+    headers = {"ETag": etag, "Cache-Control": AUDIO_CACHE_CONTROL}
+
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+
+    byte_range = None
+    range_header = request.headers.get("range")
+    if range_header and request.headers.get("if-range", etag) == etag:
+        byte_range = _parse_range(range_header, stat_result.st_size)
+
+    extension = path.rsplit(".", 1)[-1].lower()
+    return RangeFileResponse(
+        path,
+        stat_result,
+        media_type=CONTENT_TYPES.get(extension, "application/octet-stream"),
+        byte_range=byte_range,
+        headers=headers,
+        head_only=request.method == "HEAD",
+    )
@@ -4,6 +4,10 @@ from pydantic import BaseModel
 import httpx
 from dotenv import load_dotenv
 
+from services.deepseek_client import deepseek_client
+from services.llm_scheduler import SchedulerTimeout
+from services.circuit_breaker import CircuitOpenError
+
 load_dotenv()
 
 deep = APIRouter()
@@ -19,21 +23,25 @@ class ChatRequest(BaseModel):
 
 @deep.post("/chat")
 async def chat_with_deepseek(request: ChatRequest):
-    url = "https://api.deepseek.com/v1/chat/completions"
-    headers = {
-        "Authorization": f"Bearer {DEEPSEEK_API_KEY}",
-        "Content-Type": "application/json"
-    }
     payload = {
         "model": request.model,
         "messages": request.messages,
         "max_tokens": 2048
     }
 
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.post(url, headers=headers, json=payload, timeout=30)
-            response.raise_for_status()
-            return response.json()["choices"][0]["message"]["content"]
-        except httpx.HTTPStatusError as e:
-            raise HTTPException(status_code=e.response.status_code, detail="DeepSeek API Call failed")
\ No newline at end of file
+    try:
+        response = await deepseek_client.chat_completions(DEEPSEEK_API_KEY, payload)
+        response.raise_for_status()
+        return response.json()["choices"][0]["message"]["content"]
+    except httpx.HTTPStatusError as e:
+        raise HTTPException(status_code=e.response.status_code, detail="DeepSeek API Call failed")
+    except (SchedulerTimeout, CircuitOpenError) as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+@deep.get("/scheduler/stats")
+async def get_scheduler_stats():
+    """Outbound LLM scheduler state: concurrency limit, queue, token budget and circuit"""
+    return {
+        **deepseek_client.scheduler.stats(),
+        "circuit": deepseek_client.breaker.stats(),
+    }
@@ -1,5 +1,6 @@
 import uuid
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request, Response
+from fastapi.responses import StreamingResponse, JSONResponse
 from pydantic import BaseModel
 from typing import Optional
 
@@ -8,17 +9,24 @@ from services.enhanced_meditation_service import (
     EnhancedMeditationRequest
 )
 from services.feedback_analysis_service import FeedbackAnalysisService
+from services.feedback_profile_service import FeedbackProfileService
+from services.sse import format_sse
+from services.tts_service import AUDIO_PROFILES, DEFAULT_AUDIO_PROFILE
 from config.config import DEEPSEEK_API_KEY
 
 enhanced_meditation_router = APIRouter()
 enhanced_meditation_service = EnhancedMeditationService(DEEPSEEK_API_KEY)
 feedback_analysis_service = FeedbackAnalysisService(DEEPSEEK_API_KEY)
+profile_service = FeedbackProfileService()
 
 class EnhancedMeditationRequestModel(BaseModel):
     """增强冥想请求模型"""
     user_id: str
     mood: str
     description: str
+    async_audio: bool = False  # 先返回脚本，音频由后台生成，通过 /meditation/{record_id}/audio-status 查询
+    audio_profile: str = DEFAULT_AUDIO_PROFILE  # 音频编码配置：mobile-low / standard / hq
+    hls: bool = False  # 同时生成多码率 HLS 分片和播放列表（playlist_url）
 
 class EnhancedMeditationResponse(BaseModel):
     """增强冥想响应模型"""
@@ -26,6 +34,8 @@ class EnhancedMeditationResponse(BaseModel):
     record_id: str
     meditation_script: str
     audio_url: Optional[str] = None
+    audio_status: Optional[str] = None
+    playlist_url: Optional[str] = None
     metadata: dict
     feedback_optimized: bool = True
 
@@ -46,11 +56,17 @@ async def generate_enhanced_meditation(request: EnhancedMeditationRequestModel):
         if not request.description.strip():
             raise HTTPException(status_code=400, detail="Description cannot be empty")
         
+        if request.audio_profile not in AUDIO_PROFILES:
+            raise HTTPException(status_code=400, detail=f"Unknown audio profile: {request.audio_profile}")
+        
         # 创建增强冥想请求
         enhanced_request = EnhancedMeditationRequest(
             user_id=request.user_id,
             mood=request.mood,
-            description=request.description
+            description=request.description,
+            async_audio=request.async_audio,
+            audio_profile=request.audio_profile,
+            hls=request.hls
         )
         
         # 生成增强冥想内容
@@ -70,6 +86,8 @@ async def generate_enhanced_meditation(request: EnhancedMeditationRequestModel):
             record_id=result["record_id"],
             meditation_script=result["meditation_script"],
             audio_url=result.get("audio_url"),
+            audio_status=result.get("audio_status"),
+            playlist_url=result.get("playlist_url"),
             metadata=result["metadata"],
             feedback_optimized=True
         )
@@ -79,49 +97,87 @@ async def generate_enhanced_meditation(request: EnhancedMeditationRequestModel):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"生成增强冥想失败: {str(e)}")
 
+@enhanced_meditation_router.post("/generate-enhanced-meditation/stream")
+async def generate_enhanced_meditation_stream(request: EnhancedMeditationRequestModel):
+    """以 Server-Sent Events 流式返回增强冥想内容"""
+    
+    if not DEEPSEEK_API_KEY:
+        raise HTTPException(status_code=500, detail="DEEPSEEK_API_KEY is missing")
+    
+    if not request.user_id.strip():
+        raise HTTPException(status_code=400, detail="User ID cannot be empty")
+    
+    if not request.mood.strip():
+        raise HTTPException(status_code=400, detail="Mood cannot be empty")
+    
+    if not request.description.strip():
+        raise HTTPException(status_code=400, detail="Description cannot be empty")
+    
+    if request.audio_profile not in AUDIO_PROFILES:
+        raise HTTPException(status_code=400, detail=f"Unknown audio profile: {request.audio_profile}")
+    
+    enhanced_request = EnhancedMeditationRequest(
+        user_id=request.user_id,
+        mood=request.mood,
+        description=request.description,
+        async_audio=request.async_audio,
+        audio_profile=request.audio_profile,
+        hls=request.hls
+    )
+
+    async def event_stream():
+        async for event, data in enhanced_meditation_service.stream_enhanced_meditation(enhanced_request):
+            if event == "token":
+                yield format_sse("token", {"text": data})
+            else:
+                yield format_sse(event, data)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @enhanced_meditation_router.get("/user/{user_id}/feedback-analysis")
-async def get_user_feedback_analysis(user_id: str):
-    """获取用户反馈分析结果"""
+async def get_user_feedback_analysis(user_id: str, request: Request):
+    """获取用户反馈分析结果（读取物化的用户画像，仅在评分变化后重建）"""
     
     try:
         if not user_id.strip():
             raise HTTPException(status_code=400, detail="User ID cannot be empty")
         
-        # 获取用户历史反馈
-        user_feedbacks = enhanced_meditation_service._get_user_feedback_history(user_id)
+        # 读取物化画像，过期或缺失时重建
+        profile = profile_service.get_profile_document(user_id)
+        if not profile_service.is_fresh(profile):
+            from services.feedback_worker import feedback_worker
+            profile = await feedback_worker.refresh_profile(user_id)
         
-        if not user_feedbacks:
-            return {
+        etag = profile_service.etag(profile)
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers={"ETag": etag})
+        
+        if not profile.get("feedback_count"):
+            body = {
                 "user_id": user_id,
                 "has_feedback": False,
                 "message": "用户暂无反馈记录"
             }
-        
-        # 分析最新反馈
-        latest_feedback = user_feedbacks[0]
-        analysis = feedback_analysis_service.analyze_user_feedback(
-            latest_feedback, user_feedbacks[1:]
-        )
-        
-        return {
-            "user_id": user_id,
-            "has_feedback": True,
-            "feedback_count": len(user_feedbacks),
-            "latest_feedback": {
-                "rating_score": latest_feedback.rating_score,
-                "rating_comment": latest_feedback.rating_comment,
-                "mood": latest_feedback.mood,
-                "context": latest_feedback.context,
-                "created_at": latest_feedback.created_at.isoformat()
-            },
-            "analysis": {
-                "overall_satisfaction": analysis.overall_satisfaction,
-                "key_issues": analysis.key_issues,
-                "improvement_suggestions": analysis.improvement_suggestions,
-                "user_preferences": analysis.user_preferences,
-                "next_meditation_guidance": analysis.next_meditation_guidance
+        else:
+            body = {
+                "user_id": user_id,
+                "has_feedback": True,
+                "feedback_count": profile["feedback_count"],
+                "latest_feedback": profile["latest_feedback"],
+                "analysis": {
+                    "overall_satisfaction": profile["overall_satisfaction"],
+                    "key_issues": profile["key_issues"],
+                    "improvement_suggestions": profile["improvement_suggestions"],
+                    "user_preferences": profile["user_preferences"],
+                    "next_meditation_guidance": profile["next_meditation_guidance"]
+                }
             }
-        }
+        
+        return JSONResponse(content=body, headers={"ETag": etag, "Cache-Control": "private, no-cache"})
         
     except HTTPException:
         raise
@@ -165,3 +221,9 @@ async def get_user_feedback_history(user_id: str, limit: int = 10):
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"获取反馈历史失败: {str(e)}")
+
+@enhanced_meditation_router.get("/feedback-worker/stats")
+async def get_feedback_worker_stats():
+    """反馈分析后台任务状态"""
+    from services.feedback_worker import feedback_worker
+    return feedback_worker.stats()
@@ -1,9 +1,12 @@
 from datetime import datetime
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query, Response
 from pydantic import BaseModel, Field
-from typing import Optional, Dict, List
+from typing import Optional, Dict, List, Union
 
 from services.database_service import MeditationDatabaseService
+from services.pagination import NEXT_CURSOR_HEADER
+from services.storage_backends import storage_backend
+from routes.audio import forget_audio_path
 
 
 hist = APIRouter()
@@ -39,27 +42,61 @@ class MeditationHistoryResponse(BaseModel):
     is_regenerated:bool
     score: Optional[int] = None
     feedback: Optional[str] = None
+    audio_url: Optional[str] = None
+    playlist_url: Optional[str] = None
+
+
+# 列表页摘要（summary=true），完整脚本通过 /history/record/{record_id} 获取
+class MeditationHistorySummary(BaseModel):
+    record_id: str
+    mood: str
+    created_at: datetime
+    is_regenerated: bool = False
+    score: Optional[int] = None
+    audio_status: Optional[str] = None
+    script_excerpt: Optional[str] = None
 
 
 # get user meditation history
-@hist.get("/{user_id}", response_model=list[MeditationHistoryResponse])
-def get_user_meditation_history(user_id:str, limit:int = 50):
+# 分页：响应头 X-Next-Cursor 携带下一页游标，作为 cursor 参数传回即可继续读取；最后一页没有该响应头
+@hist.get("/{user_id}", response_model=Union[list[MeditationHistoryResponse], list[MeditationHistorySummary]])
+def get_user_meditation_history(user_id:str, response: Response,
+                                limit: int = Query(50, ge=1, le=100, description="每页记录数量"),
+                                cursor: Optional[str] = None,
+                                summary: bool = False):
     try:
-        records = db_service.get_user_meditation_history(user_id, limit)
+        records, next_cursor = db_service.get_user_meditation_history_page(user_id, limit, cursor, summary)
+        if next_cursor:
+            response.headers[NEXT_CURSOR_HEADER] = next_cursor
         if not records:
             return []  # 返回空列表而不是404，因为用户可能确实没有记录
-        return [MeditationHistoryResponse(**record) for record in records]
+        if summary:
+            return [MeditationHistorySummary(**record) for record in records]
+        return [MeditationHistoryResponse(**storage_backend.resolve_urls(record)) for record in records]
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 # get user meditation history grouped by date
+# 同一天的记录可能跨越两页，客户端按日期合并即可
 @hist.get("/{user_id}/grouped")
-def get_user_meditation_history_grouped(user_id:str, limit:int = 50):
+def get_user_meditation_history_grouped(user_id:str, response: Response,
+                                        limit: int = Query(50, ge=1, le=100, description="每页记录数量"),
+                                        cursor: Optional[str] = None,
+                                        summary: bool = False):
     try:
-        grouped_records = db_service.get_meditation_history_by_date(user_id, limit)
+        records, next_cursor = db_service.get_user_meditation_history_page(user_id, limit, cursor, summary)
+        if next_cursor:
+            response.headers[NEXT_CURSOR_HEADER] = next_cursor
+        if not summary:
+            records = [storage_backend.resolve_urls(record) for record in records]
+        grouped_records = db_service.group_records_by_date(records, summary)
         if not grouped_records:
             return {}  # 返回空字典而不是404，因为用户可能确实没有记录
         return grouped_records
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -70,7 +107,7 @@ def get_meditation_record(record_id:str):
         record = db_service.get_meditation_record(record_id)
         if record is None:
             raise HTTPException(status_code=404, detail="Record not found")
-        return MeditationHistoryResponse(**record)
+        return MeditationHistoryResponse(**storage_backend.resolve_urls(record))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -95,6 +132,7 @@ def delete_meditation_record(record_id:str):
     try:
         success = db_service.delete_meditation_record(record_id)
         if success:
+            forget_audio_path(record_id)
             return {"message": "Record deleted successfully"}
         else:
             raise HTTPException(status_code=500, detail="Failed to delete record")
@@ -1,19 +1,30 @@
-import requests
 import json
 import time
 import asyncio
 import uuid
-from services.tts_service import TTSService
+import httpx
+from services.tts_service import TTSService, AUDIO_PROFILES, DEFAULT_AUDIO_PROFILE
 
 from dataclasses import dataclass
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, AsyncIterator, Tuple, List
 from config.config import DEEPSEEK_API_KEY
 
 deepseek_api_key = DEEPSEEK_API_KEY
 
 from services.database_service import MeditationDatabaseService
+from services.deepseek_client import deepseek_client
+from services.llm_scheduler import SchedulerTimeout
+from services.circuit_breaker import CircuitOpenError
+from services.sse import format_sse
+from services.script_cache import ScriptCache, script_cache
+from services.single_flight import SingleFlight
+from services.warm_pool import MeditationWarmPool, WarmPoolItem
+from services.audio_pipeline import audio_pipeline, AUDIO_PENDING, AUDIO_READY, AUDIO_FAILED
+from services.audio_streaming import SpeechStream, once
+from services.storage_backends import storage_backend
 
 
 medi = APIRouter()
@@ -25,16 +36,104 @@ class SimpleMeditationRequest(BaseModel):
 
 
 
+# Mood-specific guidance
+MOOD_GUIDANCE = {
+    "anxious": "Focus on grounding techniques, slow breathing, and present-moment awareness. Use reassuring language about safety and control.",
+    "stressed": "Emphasize releasing tension, letting go, and finding calm. Include body relaxation and mental decluttering.",
+    "sad": "Provide gentle companionship, self-compassion, and emotional acceptance. Avoid forcing positivity.",
+    "overwhelmed": "Focus on simplifying, one breath at a time. Create space and mental clarity.",
+    "angry": "Guide toward cooling down, releasing heat, and finding inner peace. Use calming imagery.",
+    "tired": "Offer gentle energy renewal while honoring their need for rest. Balance restoration with gentle awakening.",
+    "lonely": "Provide warm, connecting language. Focus on self-love and universal connection.",
+    "frustrated": "Help release tension and find patience. Guide toward acceptance and letting go.",
+    "worried": "Address future-focused anxiety. Bring attention to the present moment and what's actually okay right now.",
+    "restless": "Provide grounding and settling techniques. Help find stillness within movement."
+}
+
+# Default guidance for unrecognized moods
+DEFAULT_GUIDANCE = "Acknowledge their current emotional state with acceptance and provide gentle guidance toward inner calm and balance."
+
+# Context detected from the description: keywords, prompt guidance and the matching fallback passage
+CONTEXT_GUIDANCE = {
+    "work": {
+        "keywords": ["work", "job", "office", "meeting"],
+        "guidance": "Reference work-related stress and the need to find calm amidst professional demands.",
+        "passage": "The tasks and meetings waiting for you can rest outside this moment. For these few minutes, there is nothing you need to finish and no one you need to answer. Let's let the weight of work slide off your shoulders.",
+    },
+    "sleep": {
+        "keywords": ["sleep", "tired", "exhausted", "bed"],
+        "guidance": "Address fatigue and the balance between rest and gentle alertness.",
+        "passage": "Your body has been carrying you a long way. Let's allow it to feel heavy and supported, resting fully, while a soft thread of awareness stays with the breath.",
+    },
+    "relationship": {
+        "keywords": ["relationship", "partner", "friend", "family"],
+        "guidance": "Acknowledge interpersonal challenges with compassion for all involved.",
+        "passage": "Let's bring to mind the people in your life with gentleness, including yourself. Everyone involved is doing their best with what they carry, and you can hold that with kindness.",
+    },
+    "pain": {
+        "keywords": ["pain", "hurt", "ache", "sick"],
+        "guidance": "Offer gentle comfort for physical discomfort without medical advice.",
+        "passage": "If there is discomfort in your body, let's simply notice it without fighting it. Breathe softly around that area, as if giving it a little more room.",
+    },
+}
+
+# Locally written passages used when the script cannot be generated by DeepSeek
+FALLBACK_MOOD_PASSAGES = {
+    "anxious": "Let's feel the ground beneath you, solid and steady. Right here, right now, you are safe. Notice five slow breaths, each one a little longer than the last.",
+    "stressed": "Let's notice where tension is gathering, perhaps in your jaw, your shoulders or your hands. With each exhale, allow that tightness to soften and let go.",
+    "sad": "Let's make room for whatever you are feeling, without needing to change it. Place a hand over your heart if that feels right, and offer yourself the same kindness you would offer a friend.",
+    "overwhelmed": "Let's set everything down for a moment. There is only one thing to do right now, and that is this breath. Just this one, and then the next.",
+    "angry": "Let's imagine the heat in your body cooling with every breath out, like a warm day giving way to a cool evening breeze. There is nothing you need to do with this feeling right now.",
+    "tired": "Let's honor your tiredness. Allow your body to rest, and with each inhale, invite in a small, gentle spark of renewed energy.",
+    "lonely": "Let's remember that, right now, many people around the world are breathing just as you are. You are part of something larger, and you are worthy of warmth and connection.",
+    "frustrated": "Let's acknowledge that things have not gone the way you hoped. Breathe into that frustration, and on each exhale, allow a little more patience to settle in.",
+    "worried": "Let's gently bring your attention back from tomorrow to this moment. Right now, in this breath, notice what is actually okay.",
+    "restless": "Let's notice the energy moving through you without needing to follow it. Feel your weight settle downward, and let stillness grow little by little.",
+}
+
+DEFAULT_FALLBACK_PASSAGE = "Let's meet whatever you are feeling with acceptance. There is no right or wrong way to feel, and you are allowed to simply be here as you are."
+
+FALLBACK_BREATHING_PASSAGE = "Now, let's breathe deeply together. Breathe in slowly through the nose, counting to four, hold gently for a moment, and breathe out through the mouth, counting to six. Let's repeat this a few more times, and then sit in silence for a little while, resting in the calm you have created."
+
+
+def match_mood(mood: str) -> Optional[str]:
+    """Return the canonical mood key contained in the given mood, if any"""
+    mood_lower = mood.lower()
+    for mood_key in MOOD_GUIDANCE:
+        if mood_key in mood_lower:
+            return mood_key
+    return None
+
+
+def match_contexts(description: str) -> List[str]:
+    """Return the context categories whose keywords appear in the description"""
+    description_lower = description.lower()
+    return [
+        category
+        for category, context in CONTEXT_GUIDANCE.items()
+        if any(word in description_lower for word in context["keywords"])
+    ]
+
+
+# Descriptions used to pre-generate warm pool scripts for each context category
+WARM_POOL_DESCRIPTIONS = {
+    "general": "I would like a few calm minutes to reset.",
+    "work": "Work has been a lot lately.",
+    "sleep": "I have not been sleeping well.",
+    "relationship": "Things with my family feel heavy.",
+    "pain": "My body has been in pain.",
+}
+
+
 # DeepSeek API wrapper for generating meditation scripts
 class DeepSeekMeditationAPI:
 
-    def __init__(self, api_key: str, base_url: str = "https://api.deepseek.com"):
+    # Bump whenever the prompt or payload changes so cached scripts are not reused
+    PROMPT_TEMPLATE_VERSION = "1"
+
+    def __init__(self, api_key: str, client=deepseek_client):
         self.api_key = api_key
-        self.base_url = base_url
-        self.headers = {
-            "Authorization": f"Bearer {api_key}",
-            "Content-Type": "application/json"
-        }
+        self.client = client
 
     def _get_prompt_template(self, request: SimpleMeditationRequest) -> str:
         """Generate prompt template based on user's mood and description"""
@@ -70,88 +169,142 @@ Generate a complete meditation script that directly addresses their current emot
     def _get_mood_specific_guidance(self, request: SimpleMeditationRequest) -> str:
         """Get mood-specific guidance for the meditation script"""
         
-        mood_lower = request.mood.lower()
-        description_lower = request.description.lower()
-        
-        # Mood-specific guidance
-        mood_guidance = {
-            "anxious": "Focus on grounding techniques, slow breathing, and present-moment awareness. Use reassuring language about safety and control.",
-            "stressed": "Emphasize releasing tension, letting go, and finding calm. Include body relaxation and mental decluttering.",
-            "sad": "Provide gentle companionship, self-compassion, and emotional acceptance. Avoid forcing positivity.",
-            "overwhelmed": "Focus on simplifying, one breath at a time. Create space and mental clarity.",
-            "angry": "Guide toward cooling down, releasing heat, and finding inner peace. Use calming imagery.",
-            "tired": "Offer gentle energy renewal while honoring their need for rest. Balance restoration with gentle awakening.",
-            "lonely": "Provide warm, connecting language. Focus on self-love and universal connection.",
-            "frustrated": "Help release tension and find patience. Guide toward acceptance and letting go.",
-            "worried": "Address future-focused anxiety. Bring attention to the present moment and what's actually okay right now.",
-            "restless": "Provide grounding and settling techniques. Help find stillness within movement."
-        }
-        
-        # Default guidance for unrecognized moods
-        default_guidance = "Acknowledge their current emotional state with acceptance and provide gentle guidance toward inner calm and balance."
-        
         # Find matching guidance
-        guidance = default_guidance
-        for mood_key, mood_advice in mood_guidance.items():
-            if mood_key in mood_lower:
-                guidance = mood_advice
-                break
+        mood_key = match_mood(request.mood)
+        guidance = MOOD_GUIDANCE[mood_key] if mood_key else DEFAULT_GUIDANCE
         
         # Add context from description
-        context_additions = []
-        
-        if any(word in description_lower for word in ["work", "job", "office", "meeting"]):
-            context_additions.append("Reference work-related stress and the need to find calm amidst professional demands.")
-        
-        if any(word in description_lower for word in ["sleep", "tired", "exhausted", "bed"]):
-            context_additions.append("Address fatigue and the balance between rest and gentle alertness.")
-        
-        if any(word in description_lower for word in ["relationship", "partner", "friend", "family"]):
-            context_additions.append("Acknowledge interpersonal challenges with compassion for all involved.")
-        
-        if any(word in description_lower for word in ["pain", "hurt", "ache", "sick"]):
-            context_additions.append("Offer gentle comfort for physical discomfort without medical advice.")
+        context_additions = [
+            CONTEXT_GUIDANCE[category]["guidance"]
+            for category in match_contexts(request.description)
+        ]
         
         if context_additions:
             guidance += " Additionally: " + " ".join(context_additions)
         
         return guidance
 
+    def build_fallback_script(self, request: SimpleMeditationRequest) -> Dict[str, Any]:
+        """Assemble a script locally from the guidance tables, without calling DeepSeek"""
+
+        mood_key = match_mood(request.mood)
+        passages = [
+            f"Let's take a moment together to find some peace. Wherever you are, let's settle in and notice that you are feeling {request.mood.strip().lower()} right now, and that this is okay.",
+            FALLBACK_MOOD_PASSAGES[mood_key] if mood_key else DEFAULT_FALLBACK_PASSAGE,
+        ]
+        passages.extend(
+            CONTEXT_GUIDANCE[category]["passage"]
+            for category in match_contexts(request.description)
+        )
+        passages.append(FALLBACK_BREATHING_PASSAGE)
+
+        script = self._post_process_script("\n\n".join(passages), request)
+
+        return {
+            "success": True,
+            "script": script,
+            "metadata": {
+                "mood": request.mood,
+                "description": request.description,
+                "estimated_duration": "2-3 minutes",
+                "generated_at": time.time(),
+                "token_usage": {},
+                "fallback": True,
+            }
+        }
+
+    def _build_payload(self, request: SimpleMeditationRequest, stream: bool = False) -> Dict[str, Any]:
+        """Build the DeepSeek chat completion payload"""
+
+        # Build the prompt
+        prompt = self._get_prompt_template(request)
+
+        return {
+            "model": "deepseek-chat",
+            "messages": [
+                {
+                    "role": "system",
+                    "content": "You are an expert meditation guide who creates personalized, compassionate meditation scripts. Your responses should be warm, practical, and immediately helpful for the user's current emotional state."
+                },
+                {
+                    "role": "user", 
+                    "content": prompt
+                }
+            ],
+            "temperature": 0.8,  # Slightly higher for more personalized responses
+            "max_tokens": 256,  # Appropriate for 2-3 minute scripts
+            "top_p": 0.9,
+            "frequency_penalty": 0.2,
+            "presence_penalty": 0.1,
+            "stream": stream
+        }
+
+    def _build_result(self, script_content: str, request: SimpleMeditationRequest,
+                      usage: Dict[str, Any]) -> Dict[str, Any]:
+        """Post-process the generated script and wrap it in a success result"""
+
+        processed_script = self._post_process_script(script_content, request)
+
+        return {
+            "success": True,
+            "script": processed_script,
+            "metadata": {
+                "mood": request.mood,
+                "description": request.description,
+                "estimated_duration": "2-3 minutes",
+                "generated_at": time.time(),
+                "token_usage": usage
+            }
+        }
+
+    def _error_result(self, error: Exception) -> Dict[str, Any]:
+        """Map a request exception to an error result"""
+
+        if isinstance(error, SchedulerTimeout):
+            return {
+                "success": False,
+                "error": "Meditation service is busy, please try again shortly",
+                "details": str(error)
+            }
+        if isinstance(error, httpx.TimeoutException):
+            return {
+                "success": False,
+                "error": "API request timeout",
+                "details": f"Request took longer than {self.client.timeout.read} seconds"
+            }
+        if isinstance(error, httpx.HTTPStatusError):
+            return {
+                "success": False,
+                "error": f"API request failed: {error.response.status_code}",
+                "details": error.response.text
+            }
+        if isinstance(error, httpx.RequestError):
+            return {
+                "success": False,
+                "error": "Network request error",
+                "details": str(error)
+            }
+        if isinstance(error, json.JSONDecodeError):
+            return {
+                "success": False,
+                "error": "JSON parsing error",
+                "details": str(error)
+            }
+        return {
+            "success": False,
+            "error": "Unknown error",
+            "details": str(error)
+        }
+
     async def generate_meditation_script(self, request: SimpleMeditationRequest) -> Dict[str, Any]:
         """Generate meditation script based on mood and description"""
         
         try:
-            # Build the prompt
-            prompt = self._get_prompt_template(request)
-            
             # API request payload
-            payload = {
-                "model": "deepseek-chat",
-                "messages": [
-                    {
-                        "role": "system",
-                        "content": "You are an expert meditation guide who creates personalized, compassionate meditation scripts. Your responses should be warm, practical, and immediately helpful for the user's current emotional state."
-                    },
-                    {
-                        "role": "user", 
-                        "content": prompt
-                    }
-                ],
-                "temperature": 0.8,  # Slightly higher for more personalized responses
-                "max_tokens": 256,  # Appropriate for 2-3 minute scripts
-                "top_p": 0.9,
-                "frequency_penalty": 0.2,
-                "presence_penalty": 0.1,
-                "stream": False
-            }
+            payload = self._build_payload(request)
             
-            # Send API request
-            response = requests.post(
-                f"{self.base_url}/v1/chat/completions",
-                headers=self.headers,
-                json=payload,
-                timeout=30
-            )
+            # Send API request over the shared connection pool
+            response = await self.client.chat_completions(self.api_key, payload)
             
             # Check response status
             if response.status_code != 200:
@@ -174,45 +327,53 @@ Generate a complete meditation script that directly addresses their current emot
             # Extract generated script
             script_content = result["choices"][0]["message"]["content"]
             
-            # Post-process the script
-            processed_script = self._post_process_script(script_content, request)
+            return self._build_result(script_content, request, result.get("usage", {}))
+
+        except CircuitOpenError:
+            # DeepSeek is degraded: answer instantly with a locally assembled script
+            return self.build_fallback_script(request)
             
-            return {
-                "success": True,
-                "script": processed_script,
-                "metadata": {
-                    "mood": request.mood,
-                    "description": request.description,
-                    "estimated_duration": "2-3 minutes",
-                    "generated_at": time.time(),
-                    "token_usage": result.get("usage", {})
+        except Exception as e:
+            return self._error_result(e)
+
+    async def stream_meditation_script(self, request: SimpleMeditationRequest) -> AsyncIterator[Tuple[str, Any]]:
+        """Stream meditation script tokens as they arrive
+
+        Yields ("token", text) for each content delta, then exactly one
+        ("result", result) carrying the same dict generate_meditation_script returns.
+        """
+
+        parts = []
+        usage = {}
+        try:
+            payload = self._build_payload(request, stream=True)
+
+            async for chunk in self.client.stream_chat_completions(self.api_key, payload):
+                if chunk.get("usage"):
+                    usage = chunk["usage"]
+                for choice in chunk.get("choices") or []:
+                    text = (choice.get("delta") or {}).get("content")
+                    if text:
+                        parts.append(text)
+                        yield "token", text
+
+            if not parts:
+                yield "result", {
+                    "success": False,
+                    "error": "Invalid API response format",
+                    "details": "Stream ended without content"
                 }
-            }
-            
-        except requests.exceptions.Timeout:
-            return {
-                "success": False,
-                "error": "API request timeout",
-                "details": "Request took longer than 30 seconds"
-            }
-        except requests.exceptions.RequestException as e:
-            return {
-                "success": False,
-                "error": "Network request error",
-                "details": str(e)
-            }
-        except json.JSONDecodeError as e:
-            return {
-                "success": False,
-                "error": "JSON parsing error",
-                "details": str(e)
-            }
+                return
+
+            yield "result", self._build_result("".join(parts), request, usage)
+
+        except CircuitOpenError:
+            fallback = self.build_fallback_script(request)
+            yield "token", fallback["script"]
+            yield "result", fallback
+
         except Exception as e:
-            return {
-                "success": False,
-                "error": "Unknown error",
-                "details": str(e)
-            }
+            yield "result", self._error_result(e)
         
     def _post_process_script(self, script: str, request: SimpleMeditationRequest) -> str:
         """Post-process the meditation script"""
@@ -232,52 +393,224 @@ Generate a complete meditation script that directly addresses their current emot
 # Service layer
 class MeditationService:
 
-    def __init__(self, deepseek_api_key: str):
+    def __init__(self, deepseek_api_key: str, cache: ScriptCache = script_cache):
         self.api = DeepSeekMeditationAPI(deepseek_api_key)
+        self.cache = cache
+        self.flight = SingleFlight("meditation_script")
 
-    async def create_meditation_for_mood(self, mood: str, description: str) -> Dict[str, Any]:
+    def _cache_key(self, request: SimpleMeditationRequest) -> str:
+        return self.cache.make_key(
+            request.mood, request.description, self.api.PROMPT_TEMPLATE_VERSION
+        )
+
+    def _from_cache(self, cached: Dict[str, Any]) -> Dict[str, Any]:
+        cached["metadata"]["cached"] = True
+        return cached
+
+    async def create_meditation_for_mood(self, mood: str, description: str,
+                                         use_cache: bool = True) -> Dict[str, Any]:
         
         # Create request object
         request = SimpleMeditationRequest(
             mood=mood.strip(),
             description=description.strip()
         )
+
+        if not use_cache:
+            return await self.api.generate_meditation_script(request)
+
+        cache_key = self._cache_key(request)
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            return self._from_cache(cached)
         
-        # Generate script
+        # Generate script, sharing one upstream call between identical concurrent requests
+        return await self.flight.do(cache_key, lambda: self._generate_and_cache(request, cache_key))
+
+    async def _generate_and_cache(self, request: SimpleMeditationRequest, cache_key: str) -> Dict[str, Any]:
         result = await self.api.generate_meditation_script(request)
+
+        if result["success"] and not result["metadata"].get("fallback"):
+            self.cache.set(cache_key, result)
         
         return result
+
+    async def stream_meditation_for_mood(self, mood: str, description: str,
+                                         use_cache: bool = True) -> AsyncIterator[Tuple[str, Any]]:
+
+        request = SimpleMeditationRequest(
+            mood=mood.strip(),
+            description=description.strip()
+        )
+
+        cache_key = self._cache_key(request)
+        if use_cache:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                yield "token", cached["script"]
+                yield "result", self._from_cache(cached)
+                return
+
+        async for event, data in self.api.stream_meditation_script(request):
+            if use_cache and event == "result" and data["success"] and not data["metadata"].get("fallback"):
+                self.cache.set(cache_key, data)
+            yield event, data
     
 
 class MoodMeditationRequest(BaseModel):
     user_id: str
     mood: str
     description: str
+    use_cache: bool = True  # Set False to neither read nor populate the script cache
+    async_audio: bool = False  # Return before audio exists; poll /{record_id}/audio-status
+    audio_profile: str = DEFAULT_AUDIO_PROFILE  # One of AUDIO_PROFILES, e.g. "mobile-low" for metered connections
+    hls: bool = False  # Also package the audio as HLS (playlist_url); ignores audio_profile
 
 
 meditation_service = MeditationService(deepseek_api_key)
 
+
+def _classify_for_warm_pool(mood: str, description: str) -> Optional[Tuple[str, str]]:
+    """Pool key for requests with a canonical mood and at most one recognised context"""
+    mood_key = match_mood(mood)
+    contexts = match_contexts(description)
+    if mood_key is None or len(contexts) > 1:
+        return None
+    return mood_key, contexts[0] if contexts else "general"
+
+
+async def _produce_warm_meditation(key: Tuple[str, str]) -> Optional[WarmPoolItem]:
+    """Generate one pooled meditation: script plus uploaded audio"""
+    mood, category = key
+    request = SimpleMeditationRequest(mood=mood, description=WARM_POOL_DESCRIPTIONS[category])
+
+    result = await meditation_service.api.generate_meditation_script(request)
+    if not result["success"] or result["metadata"].get("fallback"):
+        return None
+
+    audio_url = await TTSService().generate_and_store_speech_async(result["script"], str(uuid.uuid4()))
+    return WarmPoolItem(script=result["script"], audio_url=audio_url, metadata=result["metadata"])
+
+
+warm_pool = MeditationWarmPool(
+    keys=[(mood, category) for mood in MOOD_GUIDANCE for category in WARM_POOL_DESCRIPTIONS],
+    classify=_classify_for_warm_pool,
+    produce=_produce_warm_meditation,
+)
+
+
+def _take_warm_meditation(request: MoodMeditationRequest) -> Optional[Dict[str, Any]]:
+    """Serve a pre-generated meditation when the request is generic enough"""
+    # Pooled audio is always synthesized with the default profile
+    if not request.use_cache or request.hls or request.audio_profile != DEFAULT_AUDIO_PROFILE:
+        return None
+
+    item = warm_pool.take(request.mood, request.description)
+    if item is None:
+        return None
+
+    return {
+        "success": True,
+        "script": item.script,
+        "audio_url": item.audio_url,
+        "metadata": {
+            **item.metadata,
+            "mood": request.mood,
+            "description": request.description,
+            "warm_pool": True,
+        }
+    }
+
+
+def _validate_generate_request(request: MoodMeditationRequest):
+    if not deepseek_api_key:
+        raise HTTPException(status_code=500, detail="DEEPSEEK_API_KEY is missing")
+    
+    if not request.user_id.strip():
+        raise HTTPException(status_code=400, detail="User ID cannot be empty")
+    
+    if not request.mood.strip():
+        raise HTTPException(status_code=400, detail="Mood cannot be empty")
+    
+    if not request.description.strip():
+        raise HTTPException(status_code=400, detail="Description cannot be empty")
+
+    if request.audio_profile not in AUDIO_PROFILES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown audio profile, expected one of: {', '.join(AUDIO_PROFILES)}"
+        )
+
+
+async def _persist_meditation(request: MoodMeditationRequest, script: str,
+                              audio_url: Optional[str] = None) -> Dict[str, Any]:
+    """Generate audio for the script (unless already available) and save the meditation record
+
+    With `async_audio` the record is saved straight away and the audio is
+    produced by the background audio pipeline.
+    """
+    defer_audio = audio_url is None and request.async_audio and audio_pipeline.running
+    playlist_url = None
+
+    # Generate audio and save to storage
+    if audio_url is None and not defer_audio:
+        try:
+            tts_service = TTSService()
+            if request.hls:
+                urls = await tts_service.generate_and_store_hls_async(script, str(uuid.uuid4()))
+                audio_url, playlist_url = urls["audio_url"], urls["playlist_url"]
+            else:
+                audio_url = await tts_service.generate_and_store_speech_async(
+                    script, 
+                    str(uuid.uuid4()),  # Generate a temporary ID for TTS
+                    request.audio_profile
+                )
+        except Exception as e:
+            print(f"TTS generation failed: {e}")
+            audio_url = None
+
+    if defer_audio:
+        audio_status = AUDIO_PENDING
+    else:
+        audio_status = AUDIO_READY if audio_url else AUDIO_FAILED
+
+    # Save meditation record with audio URL
+    saved = db_service.save_meditation_record(
+        user_id=request.user_id,
+        mood=request.mood,
+        context=request.description,
+        script=script,
+        audio_url=audio_url,
+        audio_status=audio_status,
+        audio_profile=request.audio_profile,
+        playlist_url=playlist_url,
+    )
+
+    if defer_audio:
+        audio_pipeline.submit(saved["record_id"], script, request.audio_profile, request.hls)
+
+    return storage_backend.resolve_urls({
+        "record_id": saved["record_id"],
+        "audio_url": audio_url,
+        "audio_status": audio_status,
+        "playlist_url": playlist_url,
+    })
+
+
 @medi.post("/generate-meditation")
 async def generate_meditation(request: MoodMeditationRequest):
 
     try:
-        if not deepseek_api_key:
-            raise HTTPException(status_code=500, detail="DEEPSEEK_API_KEY is missing")
-        
-        if not request.user_id.strip():
-            raise HTTPException(status_code=400, detail="User ID cannot be empty")
-        
-        if not request.mood.strip():
-            raise HTTPException(status_code=400, detail="Mood cannot be empty")
+        _validate_generate_request(request)
         
-        if not request.description.strip():
-            raise HTTPException(status_code=400, detail="Description cannot be empty")
-        
-        # Generate script
-        result = await meditation_service.create_meditation_for_mood(
-            request.mood, 
-            request.description
-        )
+        # Serve a pre-generated meditation when possible, otherwise generate script
+        result = _take_warm_meditation(request)
+        if result is None:
+            result = await meditation_service.create_meditation_for_mood(
+                request.mood, 
+                request.description,
+                use_cache=request.use_cache
+            )
         
         if not result["success"]:
             raise HTTPException(
@@ -285,37 +618,256 @@ async def generate_meditation(request: MoodMeditationRequest):
             detail={"error": result["error"], "details": result.get("details")}
         )
 
-        # Generate audio and save to storage
-        audio_url = None
-        try:
-            from services.tts_service import TTSService
-            tts_service = TTSService()
-            audio_url = tts_service.generate_and_store_speech(
-                result["script"], 
-                str(uuid.uuid4())  # Generate a temporary ID for TTS
-            )
-        except Exception as e:
-            print(f"TTS generation failed: {e}")
-            audio_url = None
-
-        # Save meditation record with audio URL
-        saved = db_service.save_meditation_record(
-            user_id=request.user_id,
-            mood=request.mood,
-            context=request.description,
-            script=result["script"],
-            audio_url=audio_url,
-        )
+        saved = await _persist_meditation(request, result["script"], result.get("audio_url"))
         
         return {
             "status": "success",
             "record_id": saved["record_id"],
             "meditation_script": result["script"],
-            "audio_url": audio_url,
+            "audio_url": saved["audio_url"],
+            "audio_status": saved["audio_status"],
+            "playlist_url": saved["playlist_url"],
             "metadata": result["metadata"]
         }
       
     except HTTPException:
         raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Generation failed: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Generation failed: {str(e)}")
+
+
+@medi.post("/generate-meditation/stream")
+async def generate_meditation_stream(request: MoodMeditationRequest):
+    """Stream the meditation script as Server-Sent Events
+
+    Emits "token" events while the script is generated, then a single "done"
+    event with record_id, audio_url and metadata once the record is saved,
+    or an "error" event if generation fails.
+    """
+
+    _validate_generate_request(request)
+
+    async def generate_events():
+        pooled = _take_warm_meditation(request)
+        if pooled is not None:
+            yield "token", pooled["script"]
+            yield "result", pooled
+            return
+
+        async for event in meditation_service.stream_meditation_for_mood(
+            request.mood,
+            request.description,
+            use_cache=request.use_cache
+        ):
+            yield event
+
+    async def event_stream():
+        async for event, data in generate_events():
+            if event == "token":
+                yield format_sse("token", {"text": data})
+                continue
+
+            if not data["success"]:
+                yield format_sse("error", {"error": data["error"], "details": data.get("details")})
+                return
+
+            try:
+                saved = await _persist_meditation(request, data["script"], data.get("audio_url"))
+            except Exception as e:
+                yield format_sse("error", {"error": "Generation failed", "details": str(e)})
+                return
+
+            yield format_sse("done", {
+                "status": "success",
+                "record_id": saved["record_id"],
+                "meditation_script": data["script"],
+                "audio_url": saved["audio_url"],
+                "audio_status": saved["audio_status"],
+                "playlist_url": saved["playlist_url"],
+                "metadata": data["metadata"]
+            })
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+def _spoken_script(final_script: str, streamed: str) -> Tuple[str, str]:
+    """Split the post-processed script into what was already spoken and what is still to say
+
+    Post-processing may add an opening (which can no longer be spoken and is
+    dropped) and a closing (which is returned as the remainder to synthesize).
+    """
+    streamed = " ".join(streamed.split())
+    final = " ".join(final_script.split())
+    start = final.find(streamed)
+    if not streamed or start < 0:
+        return streamed, ""
+    return final[start:], final[start + len(streamed):].strip()
+
+
+# Audio stream producers outlive their response when the client disconnects; keep them referenced
+_stream_tasks = set()
+
+
+@medi.post("/generate-meditation/audio-stream")
+async def generate_meditation_audio_stream(request: MoodMeditationRequest):
+    """Stream spoken meditation audio (audio/mpeg) while the script is still being written
+
+    Complete sentences are cut from the DeepSeek token stream and synthesized
+    as they arrive, and their audio is sent as soon as it is ready. The
+    record ID is returned up front in the X-Record-Id header; the record,
+    with the full uploaded MP3, is saved when generation completes. That
+    happens in a background task, so it is saved even if the client
+    disconnects before the end of the stream.
+    """
+
+    _validate_generate_request(request)
+    if AUDIO_PROFILES[request.audio_profile].audio_encoding != "MP3":
+        raise HTTPException(status_code=400, detail="Streaming audio requires an MP3 audio profile")
+
+    record_id = str(uuid.uuid4())
+    tts_service = TTSService()
+    speech = SpeechStream(tts_service, request.audio_profile)
+    outcome: Dict[str, Any] = {}
+
+    async def script_tokens():
+        async for event, data in meditation_service.stream_meditation_for_mood(
+            request.mood,
+            request.description,
+            use_cache=request.use_cache
+        ):
+            if event == "token":
+                yield data
+            else:
+                outcome["result"] = data
+
+    audio = speech.synthesize(script_tokens())
+    # Wait for the first sentence so generation failures still get a proper status code
+    try:
+        first_chunk = await audio.__anext__()
+    except StopAsyncIteration:
+        first_chunk = None
+    except Exception as e:
+        raise HTTPException(status_code=502, detail={"error": "Speech synthesis failed", "details": str(e)})
+
+    if first_chunk is None:
+        result = outcome.get("result") or {"error": "Generation failed"}
+        raise HTTPException(
+            status_code=502,
+            detail={"error": result.get("error"), "details": result.get("details")}
+        )
+
+    chunks: asyncio.Queue = asyncio.Queue()
+
+    async def produce():
+        try:
+            try:
+                async for chunk in audio:
+                    chunks.put_nowait(chunk)
+            finally:
+                await audio.aclose()
+
+            result = outcome.get("result")
+            if not result or not result["success"]:
+                print(f"Audio stream for {record_id} ended without a script")
+                return
+
+            script, closing = _spoken_script(result["script"], speech.text)
+            async for chunk in speech.synthesize(once(closing)):
+                chunks.put_nowait(chunk)
+            chunks.put_nowait(None)
+
+            audio_url = None
+            try:
+                audio_url = await asyncio.to_thread(
+                    tts_service.store_speech, script, speech.audio_content, record_id, request.audio_profile
+                )
+            except Exception as e:
+                print(f"Audio upload failed: {e}")
+
+            await asyncio.to_thread(
+                db_service.save_meditation_record,
+                user_id=request.user_id,
+                mood=request.mood,
+                context=request.description,
+                script=script,
+                audio_url=audio_url,
+                audio_status=AUDIO_READY if audio_url else AUDIO_FAILED,
+                record_id=record_id,
+                audio_profile=request.audio_profile,
+            )
+        except Exception as e:
+            print(f"Audio stream for {record_id} failed: {e}")
+        finally:
+            chunks.put_nowait(None)
+
+    task = asyncio.create_task(produce())
+    _stream_tasks.add(task)
+    task.add_done_callback(_stream_tasks.discard)
+
+    async def audio_stream():
+        yield first_chunk
+        while True:
+            chunk = await chunks.get()
+            if chunk is None:
+                return
+            yield chunk
+
+    return StreamingResponse(
+        audio_stream(),
+        media_type="audio/mpeg",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no", "X-Record-Id": record_id}
+    )
+
+
+@medi.get("/cache/stats")
+async def get_script_cache_stats():
+    """Script and audio cache hit/miss, request coalescing and warm pool counters"""
+    from services.tts_service import tts_flight
+    from services.audio_cache import audio_cache
+    from services.tts_service import audio_profile_stats
+    return {
+        **meditation_service.cache.stats(),
+        "audio_cache": audio_cache.stats(),
+        "audio_storage": storage_backend.stats(),
+        "audio_profiles": audio_profile_stats.stats(),
+        "coalescing": [meditation_service.flight.stats(), tts_flight.stats()],
+        "warm_pool": warm_pool.stats(),
+    }
+
+
+@medi.get("/{record_id}/audio-status")
+async def get_audio_status(
+    record_id: str,
+    wait: float = Query(0, ge=0, le=30, description="Seconds to wait for pending audio (long-poll)")
+):
+    """Audio generation status of a meditation record
+
+    Returns immediately unless `wait` is given, in which case the request is
+    held until the audio is ready or has failed, or `wait` seconds elapsed.
+    """
+    job = await audio_pipeline.wait(record_id, wait)
+    if job is not None:
+        return storage_backend.resolve_urls(job.to_dict())
+
+    record = await asyncio.to_thread(db_service.get_meditation_record, record_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail="Meditation record not found")
+
+    audio_status = record.get("audio_status") or (AUDIO_READY if record.get("audio_url") else AUDIO_FAILED)
+    return storage_backend.resolve_urls({
+        "record_id": record_id,
+        "audio_status": audio_status,
+        "audio_url": record.get("audio_url"),
+        "playlist_url": record.get("playlist_url"),
+        "error": None,
+    })
+
+
+@medi.get("/audio-pipeline/stats")
+async def get_audio_pipeline_stats():
+    """Background audio worker counters"""
+    return audio_pipeline.stats()
@@ -1,9 +1,10 @@
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, HTTPException, Query, Response
 from pydantic import BaseModel, Field
 from typing import Optional, List
 from datetime import datetime
 
 from services.rating_service import RatingService
+from services.pagination import NEXT_CURSOR_HEADER
 from models.rating_model import (
     CreateRatingRequest,
     UpdateRatingRequest,
@@ -25,6 +26,7 @@ async def create_rating(request: CreateRatingRequest):
             rating_type=request.rating_type,
             score=request.score,
             comment=request.comment,
+            meditation_record_id=request.meditation_record_id,
         )
         return RatingResponse(**result)
     except Exception as e:
@@ -34,17 +36,24 @@ async def create_rating(request: CreateRatingRequest):
 @rating_router.get("/user/{user_id}", response_model=List[RatingResponse])
 async def get_user_ratings(
     user_id: str,
+    response: Response,
     rating_type: Optional[RatingType] = Query(None, description="评分类型过滤"),
-    limit: int = Query(50, ge=1, le=100, description="返回记录数量限制")
+    limit: int = Query(50, ge=1, le=100, description="返回记录数量限制"),
+    cursor: Optional[str] = Query(None, description="上一页响应头 X-Next-Cursor 中的游标")
 ):
-    """获取用户的所有评分记录"""
+    """获取用户的评分记录（按时间倒序分页）"""
     try:
-        ratings = rating_service.get_user_ratings(
+        ratings, next_cursor = rating_service.get_user_ratings_page(
             user_id=user_id,
             rating_type=rating_type,
-            limit=limit
+            limit=limit,
+            cursor=cursor
         )
+        if next_cursor:
+            response.headers[NEXT_CURSOR_HEADER] = next_cursor
         return [RatingResponse(**rating) for rating in ratings]
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"获取用户评分失败: {str(e)}")
 
@@ -140,16 +149,10 @@ async def get_rating_type_statistics(
     rating_type: RatingType,
     days: int = Query(30, ge=1, le=365, description="统计天数")
 ):
-    """获取特定类型评分的统计信息"""
+    """获取特定类型评分的统计信息（所有用户，最近 days 天）"""
     try:
-        # 这里可以扩展为获取特定类型的所有用户统计
-        # 目前返回空统计，可以根据需要实现
-        return RatingStatistics(
-            total_ratings=0,
-            average_score=0.0,
-            score_distribution={1: 0, 2: 0, 3: 0, 4: 0, 5: 0},
-            recent_ratings=[],
-        )
+        statistics = rating_service.get_all_ratings_statistics(rating_type=rating_type, days=days)
+        return statistics
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"获取评分类型统计失败: {str(e)}")
 
@@ -159,12 +162,14 @@ async def create_batch_ratings(requests: List[CreateRatingRequest]):
     """批量创建评分记录"""
     try:
         results = []
+        # 每条评分与其统计聚合在各自的事务中提交
         for request in requests:
             result = rating_service.create_rating(
                 user_id=request.user_id,
                 rating_type=request.rating_type,
                 score=request.score,
                 comment=request.comment,
+                meditation_record_id=request.meditation_record_id,
             )
             results.append(RatingResponse(**result))
         return results
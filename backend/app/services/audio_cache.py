@@ -0,0 +1,156 @@
+import os
+import time
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple
+
+AUDIO_CACHE_ENABLED = os.getenv("TTS_AUDIO_CACHE_ENABLED", "true").lower() == "true"
+AUDIO_CACHE_DIR = os.getenv("TTS_AUDIO_CACHE_DIR", "")  # empty keeps the index in memory only
+AUDIO_CACHE_MAX_ENTRIES = int(os.getenv("TTS_AUDIO_CACHE_MAX_ENTRIES", "2000"))
+AUDIO_CACHE_TTL = float(os.getenv("TTS_AUDIO_CACHE_TTL", str(24 * 3600)))
+
+
+class AudioCache:
+    """Content-addressed index of synthesized audio
+
+    Keys are hashes of the normalized script plus every synthesis setting,
+    so identical requests map to the same stored blob. Entries remember the
+    public URL and, when `directory` is set, the audio bytes on local disk
+    (which also survive restarts). Remote blob lookups are done by the
+    caller and reported through `record_remote_hit` for the hit ratio.
+    An index hit does not prove the blob still exists (the audio GC may
+    have removed it): callers confirm it with the storage backend and
+    `discard` stale keys. Entries also expire after `ttl` seconds. Safe to
+    use from the TTS worker threads.
+    """
+
+    def __init__(self, enabled: bool = AUDIO_CACHE_ENABLED, directory: str = AUDIO_CACHE_DIR,
+                 max_entries: int = AUDIO_CACHE_MAX_ENTRIES, ttl: float = AUDIO_CACHE_TTL):
+        self.enabled = enabled
+        self.directory = directory
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._urls: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        if self.enabled and self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+
+        self.local_hits = 0
+        self.remote_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        return " ".join(text.split())
+
+    def make_key(self, text: str, settings: Dict[str, Any]) -> str:
+        raw = json.dumps({"text": self.normalize(text), "settings": settings}, sort_keys=True)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str, suffix: str) -> str:
+        return os.path.join(self.directory, f"{key}{suffix}")
+
+    def get_url(self, key: str) -> Optional[str]:
+        """URL of previously stored audio for the key, from memory or the disk index"""
+        now = time.time()
+        url = None
+        with self._lock:
+            entry = self._urls.get(key)
+            if entry is not None:
+                url, stored_at = entry
+                if now - stored_at > self.ttl:
+                    del self._urls[key]
+                    url = None
+
+        if url is None and self.directory:
+            path = self._path(key, ".url")
+            try:
+                stored_at = os.path.getmtime(path)
+                if now - stored_at <= self.ttl:
+                    with open(path, "r", encoding="utf-8") as f:
+                        url = f.read().strip() or None
+            except OSError:
+                url = None
+            if url is not None:
+                self._remember(key, url, stored_at)
+
+        if url is not None:
+            with self._lock:
+                if key in self._urls:
+                    self._urls.move_to_end(key)
+                self.local_hits += 1
+        return url
+
+    def get_audio_path(self, key: str, extension: str = "mp3") -> Optional[str]:
+        """Local path of the cached audio bytes, if kept on disk"""
+        if not self.directory:
+            return None
+        path = self._path(key, f".{extension}")
+        return path if os.path.exists(path) else None
+
+    def record_remote_hit(self, key: str, url: str):
+        with self._lock:
+            self.remote_hits += 1
+        self.put(key, url)
+
+    def discard(self, key: str):
+        """Forget the URL of a key whose blob is gone"""
+        with self._lock:
+            self._urls.pop(key, None)
+        if self.directory:
+            try:
+                os.remove(self._path(key, ".url"))
+            except OSError:
+                pass
+
+    def record_miss(self):
+        with self._lock:
+            self.misses += 1
+
+    def put(self, key: str, url: str, audio_content: Optional[bytes] = None, extension: str = "mp3"):
+        self._remember(key, url)
+        if not self.directory:
+            return
+        try:
+            if audio_content is not None:
+                self._write(self._path(key, f".{extension}"), audio_content)
+            self._write(self._path(key, ".url"), url.encode("utf-8"))
+        except OSError as e:
+            print(f"Audio cache write failed: {e}")
+
+    @staticmethod
+    def _write(path: str, content: bytes):
+        # Write then rename so readers never see a partial file; concurrent writers use their own temp file
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+
+    def _remember(self, key: str, url: str, stored_at: Optional[float] = None):
+        with self._lock:
+            self._urls[key] = (url, stored_at if stored_at is not None else time.time())
+            self._urls.move_to_end(key)
+            while len(self._urls) > self.max_entries:
+                self._urls.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries = len(self._urls)
+        hits = self.local_hits + self.remote_hits
+        lookups = hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "disk_cache": bool(self.directory),
+            "entries_in_memory": entries,
+            "local_hits": self.local_hits,
+            "remote_hits": self.remote_hits,
+            "misses": self.misses,
+            "hit_ratio": hits / lookups if lookups else 0.0,
+        }
+
+
+# 创建全局实例
+audio_cache = AudioCache()
@@ -0,0 +1,236 @@
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Any, Optional, List, Set, Tuple
+
+from config.config import db
+from services.storage_backends import StorageBackend, StoredObject, storage_backend
+
+AUDIO_GC_GRACE_DAYS = float(os.getenv("AUDIO_GC_GRACE_DAYS", "7"))
+AUDIO_GC_WORKERS = int(os.getenv("AUDIO_GC_WORKERS", "8"))
+AUDIO_GC_PAGE_SIZE = int(os.getenv("AUDIO_GC_PAGE_SIZE", "500"))
+# Firestore caps the number of values in an `in` filter
+AUDIO_GC_IN_LIMIT = int(os.getenv("AUDIO_GC_IN_LIMIT", "10"))
+
+_HLS_PREFIX = "meditations/hls/"
+
+
+class AudioGarbageCollector:
+    """Sweep stored audio that no meditation record references any more
+
+    Objects under `prefix` are listed page by page in name order. Objects
+    not used within the grace period are checked against the `audio_url`
+    (or, for HLS packages, `playlist_url`) of both record collections with
+    batched `in` queries, and the unreferenced ones are deleted. Lookups
+    and deletes of a page run in parallel. After every page the position
+    and running metrics are checkpointed in Firestore, so an interrupted
+    sweep resumes where it stopped.
+
+    Age is measured from the object's `updated` time, which the TTS
+    service bumps whenever it hands out stored audio again (see
+    StorageBackend.find), and for HLS objects from their package's master
+    playlist. Deletes are conditional on the object being unchanged since
+    it was listed, so a reuse racing the sweep wins. The grace period must
+    exceed AUDIO_TOUCH_INTERVAL, the warm pool's item age limit and the
+    time a generated script can take to be saved.
+    """
+
+    def __init__(self, storage: StorageBackend = storage_backend,
+                 grace_days: float = AUDIO_GC_GRACE_DAYS, workers: int = AUDIO_GC_WORKERS,
+                 page_size: int = AUDIO_GC_PAGE_SIZE, in_limit: int = AUDIO_GC_IN_LIMIT,
+                 prefix: str = "meditations/", dry_run: bool = False):
+        self.db = db
+        self.storage = storage
+        self.grace = timedelta(days=grace_days)
+        self.workers = workers
+        self.page_size = page_size
+        self.in_limit = in_limit
+        self.prefix = prefix
+        self.dry_run = dry_run
+        self.record_collections = ["meditations", "meditation_history"]
+        self.checkpoint_ref = self.db.collection("maintenance_jobs").document("audio_gc")
+
+    @staticmethod
+    def _new_metrics() -> Dict[str, Any]:
+        return {
+            "pages": 0,
+            "listed": 0,
+            "listed_bytes": 0,
+            "skipped_recent": 0,
+            "referenced": 0,
+            "orphaned": 0,
+            "orphaned_bytes": 0,
+            "deleted": 0,
+            "changed": 0,
+            "errors": 0,
+            "elapsed_seconds": 0.0,
+        }
+
+    def _load_checkpoint(self) -> Optional[Dict[str, Any]]:
+        doc = self.checkpoint_ref.get()
+        if not doc.exists:
+            return None
+        checkpoint = doc.to_dict()
+        if checkpoint.get("status") != "running" or checkpoint.get("prefix") != self.prefix:
+            return None
+        if checkpoint.get("dry_run") != self.dry_run:
+            return None
+        return checkpoint
+
+    def _save_checkpoint(self, run_id: str, status: str, last_name: Optional[str], metrics: Dict[str, Any]):
+        self.checkpoint_ref.set({
+            "run_id": run_id,
+            "status": status,
+            "prefix": self.prefix,
+            "dry_run": self.dry_run,
+            "last_name": last_name,
+            "metrics": metrics,
+            "updated_at": datetime.now(timezone.utc),
+        })
+
+    @staticmethod
+    def _package(name: str) -> Optional[str]:
+        """Prefix of the HLS package an object belongs to, or None"""
+        if not name.startswith(_HLS_PREFIX):
+            return None
+        return _HLS_PREFIX + name[len(_HLS_PREFIX):].split("/", 1)[0] + "/"
+
+    def _reference(self, name: str) -> Tuple[str, str]:
+        """(record field, URL) under which a record would reference the object"""
+        package = self._package(name)
+        if package is not None:
+            return "playlist_url", self.storage.url_for(f"{package}master.m3u8")
+        return "audio_url", self.storage.url_for(name)
+
+    def _last_used(self, obj: StoredObject, masters: Dict[str, Optional[StoredObject]]) -> datetime:
+        package = self._package(obj.name)
+        if package is None:
+            return obj.updated
+        if package not in masters:
+            masters[package] = self.storage.stat(f"{package}master.m3u8")
+        master = masters[package]
+        return master.updated if master is not None else obj.updated
+
+    def _referenced_urls(self, field: str, urls: List[str]) -> Set[str]:
+        found = set()
+        for collection in self.record_collections:
+            query = self.db.collection(collection).where(field, "in", urls).select([field])
+            for doc in query.stream():
+                value = doc.to_dict().get(field)
+                if value:
+                    found.add(value)
+        return found
+
+    def _find_orphans(self, objects: List[StoredObject], executor: ThreadPoolExecutor) -> List[StoredObject]:
+        references = {obj.name: self._reference(obj.name) for obj in objects}
+
+        by_field: Dict[str, List[str]] = {}
+        for field, url in set(references.values()):
+            by_field.setdefault(field, []).append(url)
+
+        batches = [
+            (field, urls[i:i + self.in_limit])
+            for field, urls in by_field.items()
+            for i in range(0, len(urls), self.in_limit)
+        ]
+        referenced: Set[Tuple[str, str]] = set()
+        for (field, _), found in zip(batches, executor.map(lambda batch: self._referenced_urls(*batch), batches)):
+            referenced.update((field, url) for url in found)
+
+        return [obj for obj in objects if references[obj.name] not in referenced]
+
+    def _delete(self, obj: StoredObject) -> str:
+        try:
+            return "deleted" if self.storage.delete(obj.name, if_version=obj.version) else "changed"
+        except Exception as e:
+            print(f"❌ Failed to delete {obj.name}: {e}")
+            return "error"
+
+    def _delete_package(self, package: str, cutoff: datetime, executor: ThreadPoolExecutor) -> List[str]:
+        """Delete an orphaned HLS package, master playlist first
+
+        The master is deleted only if it has not been touched since it was
+        checked; once it is gone the package can no longer be reused, and
+        the remaining objects older than the cutoff are removed.
+        """
+        master = self.storage.stat(f"{package}master.m3u8")
+        if master is not None:
+            if master.updated >= cutoff:
+                return ["changed"]
+            result = self._delete(master)
+            if result != "deleted":
+                return [result]
+        objects = [
+            obj
+            for page in self.storage.list_pages(package)
+            for obj in page
+            if obj.updated < cutoff
+        ]
+        return (["deleted"] if master is not None else []) + list(executor.map(self._delete, objects))
+
+    def _delete_orphans(self, orphans: List[StoredObject], cutoff: datetime,
+                        executor: ThreadPoolExecutor, swept_packages: Set[str]) -> List[str]:
+        results = list(executor.map(self._delete, [obj for obj in orphans if self._package(obj.name) is None]))
+        for package in dict.fromkeys(self._package(obj.name) for obj in orphans):
+            if package is not None and package not in swept_packages:
+                swept_packages.add(package)
+                results += self._delete_package(package, cutoff, executor)
+        return results
+
+    def run(self, resume: bool = True) -> Dict[str, Any]:
+        """Sweep the bucket once (or finish an interrupted sweep) and return its metrics"""
+        checkpoint = self._load_checkpoint() if resume else None
+        if checkpoint:
+            run_id = checkpoint["run_id"]
+            last_name = checkpoint.get("last_name")
+            metrics = {**self._new_metrics(), **checkpoint.get("metrics", {})}
+            print(f"Resuming audio GC run {run_id} after {last_name}")
+        else:
+            run_id = str(uuid.uuid4())
+            last_name = None
+            metrics = self._new_metrics()
+
+        started = time.monotonic() - metrics["elapsed_seconds"]
+        cutoff = datetime.now(timezone.utc) - self.grace
+        masters: Dict[str, Optional[StoredObject]] = {}
+        swept_packages: Set[str] = set()
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            for page in self.storage.list_pages(self.prefix, start_after=last_name, page_size=self.page_size):
+                metrics["pages"] += 1
+                metrics["listed"] += len(page)
+                metrics["listed_bytes"] += sum(obj.size for obj in page)
+
+                if len(masters) > 1000:
+                    masters.clear()
+                # Objects of packages already deleted as a whole are not looked at again
+                active = [obj for obj in page if self._package(obj.name) not in swept_packages]
+                candidates = [
+                    obj for obj in active
+                    if obj.updated is not None and self._last_used(obj, masters) < cutoff
+                ]
+                metrics["skipped_recent"] += len(active) - len(candidates)
+
+                orphans = self._find_orphans(candidates, executor) if candidates else []
+                metrics["referenced"] += len(candidates) - len(orphans)
+                metrics["orphaned"] += len(orphans)
+                metrics["orphaned_bytes"] += sum(obj.size for obj in orphans)
+
+                if orphans and not self.dry_run:
+                    results = self._delete_orphans(orphans, cutoff, executor, swept_packages)
+                    metrics["deleted"] += results.count("deleted")
+                    metrics["changed"] += results.count("changed")
+                    metrics["errors"] += results.count("error")
+
+                last_name = page[-1].name
+                metrics["elapsed_seconds"] = time.monotonic() - started
+                self._save_checkpoint(run_id, "running", last_name, metrics)
+
+        metrics["elapsed_seconds"] = time.monotonic() - started
+        metrics["objects_per_second"] = (
+            metrics["listed"] / metrics["elapsed_seconds"] if metrics["elapsed_seconds"] else 0.0
+        )
+        self._save_checkpoint(run_id, "completed", last_name, metrics)
+        return {"run_id": run_id, "dry_run": self.dry_run, **metrics}
@@ -0,0 +1,175 @@
+import os
+import time
+import asyncio
+from dataclasses import dataclass, field
+from typing import Dict, Any, Optional, List
+
+from services.database_service import MeditationDatabaseService
+from services.tts_service import TTSService, DEFAULT_AUDIO_PROFILE
+
+AUDIO_PIPELINE_WORKERS = int(os.getenv("AUDIO_PIPELINE_WORKERS", "4"))
+AUDIO_JOB_RETENTION = float(os.getenv("AUDIO_JOB_RETENTION", "900"))  # seconds a finished job stays pollable in memory
+
+AUDIO_PENDING = "pending"
+AUDIO_PROCESSING = "processing"
+AUDIO_READY = "ready"
+AUDIO_FAILED = "failed"
+
+
+@dataclass
+class AudioJob:
+    """Synthesis and upload of one meditation record's audio"""
+    record_id: str
+    script: str
+    profile: str = DEFAULT_AUDIO_PROFILE
+    hls: bool = False
+    status: str = AUDIO_PENDING
+    audio_url: Optional[str] = None
+    playlist_url: Optional[str] = None
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    finished_at: Optional[float] = None
+    done: asyncio.Event = field(default_factory=asyncio.Event)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "record_id": self.record_id,
+            "audio_status": self.status,
+            "audio_url": self.audio_url,
+            "playlist_url": self.playlist_url,
+            "error": self.error,
+        }
+
+
+class AudioPipeline:
+    """Bounded background worker pool that produces audio for saved meditations
+
+    Generate endpoints save the record with `audio_status: pending`, submit a
+    job and return the script straight away. A fixed number of workers
+    synthesize and upload the audio, then write `audio_url` and the final
+    status back into the record. Job state is kept in memory for long-polling;
+    the record itself is the source of truth once the job has been pruned or
+    when another process handled it. Jobs still queued on shutdown are lost
+    and their records stay pending.
+    """
+
+    def __init__(self, workers: int = AUDIO_PIPELINE_WORKERS,
+                 retention: float = AUDIO_JOB_RETENTION):
+        self.workers = workers
+        self.retention = retention
+        self.db_service = MeditationDatabaseService()
+        self.tts_service = TTSService()
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._jobs: Dict[str, AudioJob] = {}
+
+        self.submitted = 0
+        self.completed = 0
+        self.failures = 0
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    async def start(self):
+        """Start the workers (called on application startup)"""
+        if self._tasks:
+            return
+        self._queue = asyncio.Queue()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        """Cancel the workers (called on application shutdown)"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def submit(self, record_id: str, script: str, profile: str = DEFAULT_AUDIO_PROFILE,
+               hls: bool = False) -> AudioJob:
+        """Queue audio generation for a saved record"""
+        if not self.running:
+            raise RuntimeError("Audio pipeline is not running")
+
+        self._prune()
+        job = AudioJob(record_id=record_id, script=script, profile=profile, hls=hls)
+        self._jobs[record_id] = job
+        self._queue.put_nowait(job)
+        self.submitted += 1
+        return job
+
+    def get(self, record_id: str) -> Optional[AudioJob]:
+        return self._jobs.get(record_id)
+
+    async def wait(self, record_id: str, timeout: float) -> Optional[AudioJob]:
+        """Wait up to `timeout` seconds for the record's job to finish"""
+        job = self._jobs.get(record_id)
+        if job is None or job.done.is_set() or timeout <= 0:
+            return job
+        try:
+            await asyncio.wait_for(job.done.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        return job
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            try:
+                await self._process(job)
+            except Exception as e:
+                print(f"❌ Audio job for {job.record_id} failed unexpectedly: {e}")
+            finally:
+                self._queue.task_done()
+
+    async def _process(self, job: AudioJob):
+        job.status = AUDIO_PROCESSING
+        try:
+            if job.hls:
+                urls = await self.tts_service.generate_and_store_hls_async(job.script, job.record_id)
+                job.audio_url, job.playlist_url = urls["audio_url"], urls["playlist_url"]
+            else:
+                job.audio_url = await self.tts_service.generate_and_store_speech_async(
+                    job.script, job.record_id, job.profile
+                )
+            job.status = AUDIO_READY
+            self.completed += 1
+        except Exception as e:
+            print(f"TTS generation failed: {e}")
+            job.error = str(e)
+            job.status = AUDIO_FAILED
+            self.failures += 1
+
+        try:
+            await asyncio.to_thread(
+                self.db_service.update_meditation_audio,
+                job.record_id, job.audio_url, job.status, job.playlist_url
+            )
+        finally:
+            job.finished_at = time.time()
+            job.done.set()
+
+    def _prune(self):
+        cutoff = time.time() - self.retention
+        expired = [
+            record_id for record_id, job in self._jobs.items()
+            if job.finished_at is not None and job.finished_at < cutoff
+        ]
+        for record_id in expired:
+            del self._jobs[record_id]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self.running,
+            "workers": self.workers,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "tracked_jobs": len(self._jobs),
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failures": self.failures,
+        }
+
+
+# 创建全局实例
+audio_pipeline = AudioPipeline()
@@ -0,0 +1,136 @@
+import os
+import re
+import asyncio
+from typing import AsyncIterator, List, Optional
+
+from services import mp3
+from services.tts_service import (
+    TTSService, split_script, TTS_CHUNK_MAX_BYTES, TTS_CHUNK_CONCURRENCY, DEFAULT_AUDIO_PROFILE
+)
+
+# After the first sentence (sent alone for time-to-first-audio), sentences are
+# grouped until they reach this length to keep the number of TTS calls down
+TTS_STREAM_MIN_CHARS = int(os.getenv("TTS_STREAM_MIN_CHARS", "120"))
+
+_BOUNDARY = re.compile(r"(?<=[.!?…])[\"')\]]*\s+|\n\s*\n")
+
+
+class SentenceSplitter:
+    """Cut streamed text into complete sentences as soon as they are available"""
+
+    def __init__(self, min_chars: int = TTS_STREAM_MIN_CHARS, max_bytes: int = TTS_CHUNK_MAX_BYTES):
+        self.min_chars = min_chars
+        self.max_bytes = max_bytes
+        self._buffer = ""
+        self._emitted = 0
+
+    def feed(self, text: str) -> List[str]:
+        self._buffer += text
+        chunks = []
+        search_from = 0
+        while True:
+            match = _BOUNDARY.search(self._buffer, search_from)
+            if match is None:
+                break
+            candidate = self._buffer[:match.end()].strip()
+            paragraph_end = "\n" in match.group()
+            if self._emitted == 0 or paragraph_end or len(candidate) >= self.min_chars:
+                chunks.extend(self._emit(candidate))
+                self._buffer = self._buffer[match.end():]
+                search_from = 0
+            else:
+                search_from = match.end()
+
+        # No boundary in sight: never let one request exceed the TTS input limit
+        if len(self._buffer.encode("utf-8")) > self.max_bytes:
+            pieces = split_script(self._buffer, self.max_bytes)
+            chunks.extend(self._emit_all(pieces[:-1]))
+            self._buffer = pieces[-1]
+        return chunks
+
+    def flush(self) -> List[str]:
+        remaining, self._buffer = self._buffer.strip(), ""
+        return self._emit(remaining) if remaining else []
+
+    def _emit(self, text: str) -> List[str]:
+        return self._emit_all(split_script(text, self.max_bytes))
+
+    def _emit_all(self, pieces: List[str]) -> List[str]:
+        self._emitted += len(pieces)
+        return pieces
+
+
+class SpeechStream:
+    """Synthesize text into MP3 audio while it is still being generated
+
+    Sentences are synthesized concurrently (up to `concurrency` at a time)
+    and their audio frames are yielded strictly in order. Everything yielded
+    is kept in `sentences` / `parts` so the complete file can be stored once
+    the stream ends. Only MP3 profiles can be streamed this way, since their
+    frames can be sent back to back.
+    """
+
+    def __init__(self, tts_service: TTSService, profile: str = DEFAULT_AUDIO_PROFILE,
+                 concurrency: int = TTS_CHUNK_CONCURRENCY):
+        self.tts_service = tts_service
+        self.profile = profile
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self.sentences: List[str] = []
+        self.parts: List[bytes] = []
+
+    @property
+    def audio_content(self) -> bytes:
+        return b"".join(self.parts)
+
+    @property
+    def text(self) -> str:
+        return " ".join(self.sentences)
+
+    async def _synthesize(self, sentence: str) -> bytes:
+        async with self._semaphore:
+            audio = await asyncio.to_thread(self.tts_service._synthesize_chunk, sentence, self.profile)
+        # Bare frames, so the parts can be played back to back as one stream
+        return mp3.concat([audio])
+
+    async def synthesize(self, texts: AsyncIterator[str]) -> AsyncIterator[bytes]:
+        queue: asyncio.Queue = asyncio.Queue()
+        pending: List[asyncio.Future] = []
+
+        def schedule(sentences: List[str]):
+            for sentence in sentences:
+                task = asyncio.ensure_future(self._synthesize(sentence))
+                pending.append(task)
+                queue.put_nowait((sentence, task))
+
+        async def produce():
+            try:
+                splitter = SentenceSplitter()
+                async for text in texts:
+                    schedule(splitter.feed(text))
+                schedule(splitter.flush())
+            finally:
+                queue.put_nowait(None)
+
+        producer = asyncio.create_task(produce())
+        try:
+            while True:
+                item = await queue.get()
+                if item is None:
+                    break
+                sentence, task = item
+                audio = await task
+                self.sentences.append(sentence)
+                self.parts.append(audio)
+                yield audio
+            await producer
+        finally:
+            producer.cancel()
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(producer, *pending, return_exceptions=True)
+
+
+async def once(text: Optional[str]) -> AsyncIterator[str]:
+    """Async iterator over a single piece of text"""
+    if text:
+        yield text
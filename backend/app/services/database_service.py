@@ -1,10 +1,25 @@
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Iterator, Tuple
 from datetime import datetime, timezone
 from config.config import db
 from models.meditation_model import MeditationRecord, MeditationHistoryItem
+from services.unit_of_work import UnitOfWork
+from services.pagination import fetch_page, iter_pages
 
+import os
 import uuid
 
+HISTORY_EXCERPT_CHARS = int(os.getenv("HISTORY_EXCERPT_CHARS", "80"))
+# 历史列表摘要模式只读取这些字段（Firestore select 投影）
+HISTORY_SUMMARY_FIELDS = [
+    "record_id", "mood", "created_at", "score", "is_regenerated", "audio_status", "script_excerpt",
+]
+
+
+def make_script_excerpt(script: str, max_chars: int = HISTORY_EXCERPT_CHARS) -> str:
+    text = " ".join(script.split())
+    return text if len(text) <= max_chars else text[:max_chars].rstrip() + "…"
+
+
 class MeditationDatabaseService:
     def __init__(self):
         self.db = db
@@ -24,8 +39,12 @@ class MeditationDatabaseService:
         score: Optional[int] = None,
         audio_url: Optional[str] = None,
         feedback_optimized: bool = False,
+        audio_status: Optional[str] = None,
+        record_id: Optional[str] = None,
+        audio_profile: Optional[str] = None,
+        playlist_url: Optional[str] = None,
     ) -> Dict[str, Any]:
-        record_id = str(uuid.uuid4())
+        record_id = record_id or str(uuid.uuid4())
         now = datetime.now(timezone.utc)
 
         rec = MeditationRecord(
@@ -39,26 +58,35 @@ class MeditationDatabaseService:
             previous_script=previous_script,
             feedback=feedback,
             audio_url=audio_url,
+            audio_status=audio_status,
+            audio_profile=audio_profile,
+            playlist_url=playlist_url,
             feedback_optimized=feedback_optimized,
             created_at=now,
             updated_at=now,
         )
-        self.db.collection(self.meditation_collection).document(record_id).set(rec.dict())
-
         hist = MeditationHistoryItem(
             record_id=record_id,
             user_id=user_id,
             mood=mood,
             context=context,
             script=script,
+            script_excerpt=make_script_excerpt(script),
             is_regenerated=is_regenerated,
             score=score,
             audio_url=audio_url,
+            audio_status=audio_status,
+            audio_profile=audio_profile,
+            playlist_url=playlist_url,
             feedback_optimized=feedback_optimized,
             created_at=now,
             updated_at=now,
         )
-        self.db.collection(self.history_collection).document(record_id).set(hist.dict())
+
+        # 两个集合的记录在同一个批次中提交，一次往返且不会只写入一半
+        with UnitOfWork(self.db) as uow:
+            uow.set(self.db.collection(self.meditation_collection).document(record_id), rec.dict())
+            uow.set(self.db.collection(self.history_collection).document(record_id), hist.dict())
 
         return {
             "record_id": record_id,
@@ -67,73 +95,109 @@ class MeditationDatabaseService:
             "is_regenerated": is_regenerated,
         }
 
+    def _format_record(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        """将历史记录文档整理为统一的返回格式"""
+        # 确保created_at是datetime对象
+        if isinstance(data.get("created_at"), str):
+            data["created_at"] = datetime.fromisoformat(data["created_at"].replace("Z", "+00:00"))
+        
+        # 确保记录包含所有必要字段
+        return {
+            "record_id": data.get("record_id", ""),
+            "user_id": data.get("user_id", ""),
+            "mood": data.get("mood", ""),
+            "context": data.get("context", ""),
+            "script": data.get("script", ""),
+            "script_excerpt": data.get("script_excerpt"),
+            "created_at": data.get("created_at"),
+            "updated_at": data.get("updated_at"),
+            "is_regenerated": data.get("is_regenerated", False),
+            "score": data.get("score"),
+            "feedback": data.get("feedback"),
+            "audio_url": data.get("audio_url"),
+            "audio_status": data.get("audio_status"),
+            "audio_profile": data.get("audio_profile"),
+            "playlist_url": data.get("playlist_url"),
+        }
+
+    def _format_summary(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        """摘要模式的返回格式，只包含 HISTORY_SUMMARY_FIELDS"""
+        if isinstance(data.get("created_at"), str):
+            data["created_at"] = datetime.fromisoformat(data["created_at"].replace("Z", "+00:00"))
+        return {
+            "record_id": data.get("record_id", ""),
+            "mood": data.get("mood", ""),
+            "created_at": data.get("created_at"),
+            "score": data.get("score"),
+            "is_regenerated": data.get("is_regenerated", False),
+            "audio_status": data.get("audio_status"),
+            "script_excerpt": data.get("script_excerpt"),
+        }
+
+    def _history_query(self, user_id: str, summary: bool = False):
+        query = self.db.collection(self.history_collection).where("user_id", "==", user_id)
+        if summary:
+            query = query.select(HISTORY_SUMMARY_FIELDS)
+        return query
+
     def get_user_meditation_history(self, user_id: str, limit: int = 50) -> List[Dict[str, Any]]:
         """获取用户的冥想历史记录"""
         try:
-            # 从历史记录集合中查询
-            query = self.db.collection(self.history_collection).where("user_id", "==", user_id)
-            query = query.order_by("created_at", direction="DESCENDING").limit(limit)
-            
-            docs = query.stream()
-            records = []
-            
-            for doc in docs:
-                data = doc.to_dict()
-                # 确保created_at是datetime对象
-                if isinstance(data.get("created_at"), str):
-                    data["created_at"] = datetime.fromisoformat(data["created_at"].replace("Z", "+00:00"))
-                
-                # 确保记录包含所有必要字段
-                formatted_record = {
-                    "record_id": data.get("record_id", ""),
-                    "user_id": data.get("user_id", ""),
-                    "mood": data.get("mood", ""),
-                    "context": data.get("context", ""),
-                    "script": data.get("script", ""),
-                    "created_at": data.get("created_at"),
-                    "updated_at": data.get("updated_at"),
-                    "is_regenerated": data.get("is_regenerated", False),
-                    "score": data.get("score"),
-                    "feedback": data.get("feedback"),
-                    "audio_url": data.get("audio_url"),
-                }
-                records.append(formatted_record)
-            
+            records, _ = self.get_user_meditation_history_page(user_id, limit)
             return records
         except Exception as e:
             print(f"Error getting meditation history: {e}")
             return []
 
+    def get_user_meditation_history_page(
+        self, user_id: str, limit: int = 50, cursor: Optional[str] = None, summary: bool = False
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """获取一页冥想历史记录（按时间倒序）及下一页的游标，最后一页游标为 None
+
+        summary=True 时只投影列表所需字段（不含完整脚本），完整记录通过
+        get_meditation_record 按需读取。游标无效时抛出 ValueError
+        """
+        docs, next_cursor = fetch_page(self._history_query(user_id, summary), limit, cursor)
+        format_record = self._format_summary if summary else self._format_record
+        return [format_record(doc.to_dict()) for doc in docs], next_cursor
+
+    def iter_user_meditation_history(
+        self, user_id: str, page_size: int = 50, cursor: Optional[str] = None, summary: bool = False
+    ) -> Iterator[List[Dict[str, Any]]]:
+        """逐页遍历用户的冥想历史记录，每页只读取 page_size + 1 个文档"""
+        format_record = self._format_summary if summary else self._format_record
+        for docs in iter_pages(self._history_query(user_id, summary), page_size, cursor):
+            yield [format_record(doc.to_dict()) for doc in docs]
+
     def get_meditation_record(self, record_id: str) -> Optional[Dict[str, Any]]:
         """根据记录ID获取单个冥想记录"""
         try:
             doc = self.db.collection(self.history_collection).document(record_id).get()
             if doc.exists:
-                data = doc.to_dict()
-                # 确保created_at是datetime对象
-                if isinstance(data.get("created_at"), str):
-                    data["created_at"] = datetime.fromisoformat(data["created_at"].replace("Z", "+00:00"))
-                
-                # 确保记录包含所有必要字段
-                formatted_record = {
-                    "record_id": data.get("record_id", ""),
-                    "user_id": data.get("user_id", ""),
-                    "mood": data.get("mood", ""),
-                    "context": data.get("context", ""),
-                    "script": data.get("script", ""),
-                    "created_at": data.get("created_at"),
-                    "updated_at": data.get("updated_at"),
-                    "is_regenerated": data.get("is_regenerated", False),
-                    "score": data.get("score"),
-                    "feedback": data.get("feedback"),
-                    "audio_url": data.get("audio_url"),
-                }
-                return formatted_record
+                return self._format_record(doc.to_dict())
             return None
         except Exception as e:
             print(f"Error getting meditation record: {e}")
             return None
 
+    def get_meditation_records_by_ids(self, record_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """批量获取冥想记录，一次 get_all 往返，返回以记录ID为键的字典"""
+        unique_ids = list(dict.fromkeys(record_id for record_id in record_ids if record_id))
+        if not unique_ids:
+            return {}
+        try:
+            collection = self.db.collection(self.history_collection)
+            refs = [collection.document(record_id) for record_id in unique_ids]
+            
+            records = {}
+            for doc in self.db.get_all(refs):
+                if doc.exists:
+                    records[doc.id] = self._format_record(doc.to_dict())
+            return records
+        except Exception as e:
+            print(f"Error getting meditation records: {e}")
+            return {}
+
     def update_meditation_record(self, record_id: str, score: int, feedback: Optional[str] = None) -> bool:
         """更新冥想记录的评价和反馈"""
         try:
@@ -150,12 +214,32 @@ class MeditationDatabaseService:
             print(f"Error updating meditation record: {e}")
             return False
 
+    def update_meditation_audio(self, record_id: str, audio_url: Optional[str], audio_status: str,
+                                playlist_url: Optional[str] = None) -> bool:
+        """写回后台生成的音频地址和状态"""
+        try:
+            update_data = {
+                "audio_url": audio_url,
+                "audio_status": audio_status,
+                "updated_at": datetime.now(timezone.utc)
+            }
+            if playlist_url:
+                update_data["playlist_url"] = playlist_url
+            with UnitOfWork(self.db) as uow:
+                uow.update(self.db.collection(self.meditation_collection).document(record_id), update_data)
+                uow.update(self.db.collection(self.history_collection).document(record_id), update_data)
+            return True
+        except Exception as e:
+            print(f"Error updating meditation audio: {e}")
+            return False
+
     def delete_meditation_record(self, record_id: str) -> bool:
         """删除冥想记录"""
         try:
-            # 同时删除meditations和meditation_history中的记录
-            self.db.collection(self.meditation_collection).document(record_id).delete()
-            self.db.collection(self.history_collection).document(record_id).delete()
+            # 同时删除meditations和meditation_history中的记录（同一批次提交）
+            with UnitOfWork(self.db) as uow:
+                uow.delete(self.db.collection(self.meditation_collection).document(record_id))
+                uow.delete(self.db.collection(self.history_collection).document(record_id))
             return True
         except Exception as e:
             print(f"Error deleting meditation record: {e}")
@@ -166,36 +250,45 @@ class MeditationDatabaseService:
         try:
             # 获取原始记录
             records = self.get_user_meditation_history(user_id, limit)
-            grouped_records = {}
-            
-            for record in records:
-                # 确保 created_at 是 datetime 对象
-                created_at = record.get("created_at")
-                if isinstance(created_at, str):
-                    created_at = datetime.fromisoformat(created_at.replace("Z", "+00:00"))
-                
-                # 格式化日期为 YYYY-MM-DD 格式
-                date_str = created_at.strftime("%Y-%m-%d")
-                if date_str not in grouped_records:
-                    grouped_records[date_str] = []
-                
-                # 确保记录包含所有必要字段
-                formatted_record = {
-                    "record_id": record.get("record_id", ""),
-                    "user_id": record.get("user_id", ""),
-                    "mood": record.get("mood", ""),
-                    "context": record.get("context", ""),
-                    "script": record.get("script", ""),
-                    "created_at": created_at.isoformat(),
-                    "updated_at": record.get("updated_at", ""),
-                    "is_regenerated": record.get("is_regenerated", False),
-                    "score": record.get("score"),
-                    "feedback": record.get("feedback"),
-                    "audio_url": record.get("audio_url"),
-                }
-                grouped_records[date_str].append(formatted_record)
-            
-            return grouped_records
+            return self.group_records_by_date(records)
         except Exception as e:
             print(f"Error getting meditation history by date: {e}")
             return {}
+
+    @staticmethod
+    def group_records_by_date(records: List[Dict[str, Any]], summary: bool = False) -> Dict[str, List[Dict[str, Any]]]:
+        """将历史记录按日期（YYYY-MM-DD）分组；summary=True 时保留摘要字段"""
+        grouped_records = {}
+
+        for record in records:
+            # 确保 created_at 是 datetime 对象
+            created_at = record.get("created_at")
+            if isinstance(created_at, str):
+                created_at = datetime.fromisoformat(created_at.replace("Z", "+00:00"))
+
+            # 格式化日期为 YYYY-MM-DD 格式
+            date_str = created_at.strftime("%Y-%m-%d")
+            if date_str not in grouped_records:
+                grouped_records[date_str] = []
+
+            if summary:
+                grouped_records[date_str].append({**record, "created_at": created_at.isoformat()})
+                continue
+
+            # 确保记录包含所有必要字段
+            formatted_record = {
+                "record_id": record.get("record_id", ""),
+                "user_id": record.get("user_id", ""),
+                "mood": record.get("mood", ""),
+                "context": record.get("context", ""),
+                "script": record.get("script", ""),
+                "created_at": created_at.isoformat(),
+                "updated_at": record.get("updated_at", ""),
+                "is_regenerated": record.get("is_regenerated", False),
+                "score": record.get("score"),
+                "feedback": record.get("feedback"),
+                "audio_url": record.get("audio_url"),
+            }
+            grouped_records[date_str].append(formatted_record)
+
+        return grouped_records
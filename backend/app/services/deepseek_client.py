@@ -0,0 +1,216 @@
+import os
+import json
+import asyncio
+from contextlib import aclosing
+from typing import Dict, Any, Optional, AsyncIterator
+
+import httpx
+
+from services.llm_scheduler import LLMScheduler, SchedulerTimeout, llm_scheduler
+from services.circuit_breaker import CircuitBreaker, CircuitOpenError
+
+DEEPSEEK_BASE_URL = os.getenv("DEEPSEEK_BASE_URL", "https://api.deepseek.com")
+DEEPSEEK_MAX_CONNECTIONS = int(os.getenv("DEEPSEEK_MAX_CONNECTIONS", "50"))
+DEEPSEEK_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("DEEPSEEK_MAX_KEEPALIVE_CONNECTIONS", "20"))
+DEEPSEEK_KEEPALIVE_EXPIRY = float(os.getenv("DEEPSEEK_KEEPALIVE_EXPIRY", "30"))
+DEEPSEEK_CONNECT_TIMEOUT = float(os.getenv("DEEPSEEK_CONNECT_TIMEOUT", "5"))
+DEEPSEEK_READ_TIMEOUT = float(os.getenv("DEEPSEEK_READ_TIMEOUT", "30"))
+DEEPSEEK_RETRY_AFTER_DEFAULT = float(os.getenv("DEEPSEEK_RETRY_AFTER_DEFAULT", "1"))
+
+
+class DeepSeekClient:
+    """Shared async HTTP client for DeepSeek, pooled across all requests of a worker"""
+
+    def __init__(
+        self,
+        base_url: str = DEEPSEEK_BASE_URL,
+        max_connections: int = DEEPSEEK_MAX_CONNECTIONS,
+        max_keepalive_connections: int = DEEPSEEK_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry: float = DEEPSEEK_KEEPALIVE_EXPIRY,
+        connect_timeout: float = DEEPSEEK_CONNECT_TIMEOUT,
+        read_timeout: float = DEEPSEEK_READ_TIMEOUT,
+        scheduler: LLMScheduler = llm_scheduler,
+        breaker: Optional[CircuitBreaker] = None,
+    ):
+        self.base_url = base_url
+        self.scheduler = scheduler
+        self.breaker = breaker if breaker is not None else CircuitBreaker("deepseek")
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.timeout = httpx.Timeout(read_timeout, connect=connect_timeout)
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """Return the pooled client, creating it lazily outside of the app lifespan (scripts, tests)"""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                limits=self.limits,
+                timeout=self.timeout,
+            )
+        return self._client
+
+    async def start(self):
+        """Open the connection pool (called on application startup)"""
+        _ = self.client
+
+    async def close(self):
+        """Close the connection pool (called on application shutdown)"""
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+        self._client = None
+
+    def _headers(self, api_key: str) -> Dict[str, str]:
+        return {
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json"
+        }
+
+    @staticmethod
+    def _estimate_tokens(payload: Dict[str, Any]) -> int:
+        """Rough upper bound of a call's token cost, reserved against the budget until usage is known"""
+        prompt_chars = sum(len(str(m.get("content", ""))) for m in payload.get("messages", []))
+        return prompt_chars // 4 + int(payload.get("max_tokens", 1024))
+
+    @staticmethod
+    def _retry_after(response: httpx.Response) -> float:
+        try:
+            return float(response.headers.get("Retry-After", DEEPSEEK_RETRY_AFTER_DEFAULT))
+        except ValueError:
+            return DEEPSEEK_RETRY_AFTER_DEFAULT
+
+    def _check_circuit(self):
+        if not self.breaker.allow_request():
+            raise CircuitOpenError("DeepSeek is temporarily unavailable (circuit open)")
+
+    def _record_status(self, status_code: int):
+        if status_code == 429 or status_code >= 500:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+
+    async def chat_completions(self, api_key: str, payload: Dict[str, Any],
+                               queue_timeout: Optional[float] = None) -> httpx.Response:
+        """POST a chat completion request over the shared pool
+
+        The call is admitted by the shared scheduler first; 429 responses are
+        retried after Retry-After while the request's queue deadline allows.
+        Raises CircuitOpenError without calling DeepSeek while the circuit is
+        open, and SchedulerTimeout when the request cannot be admitted in time.
+        """
+        self._check_circuit()
+        try:
+            response = await self._post_chat_completions(api_key, payload, queue_timeout)
+        except SchedulerTimeout:
+            raise
+        except Exception:
+            self.breaker.record_failure()
+            raise
+
+        self._record_status(response.status_code)
+        return response
+
+    async def _post_chat_completions(self, api_key: str, payload: Dict[str, Any],
+                                     queue_timeout: Optional[float]) -> httpx.Response:
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + (self.scheduler.queue_timeout if queue_timeout is None else queue_timeout)
+        estimated_tokens = self._estimate_tokens(payload)
+
+        while True:
+            ticket = await self.scheduler.acquire(estimated_tokens, deadline - loop.time())
+            status_code = None
+            total_tokens = None
+            try:
+                response = await self.client.post(
+                    "/v1/chat/completions", headers=self._headers(api_key), json=payload
+                )
+                status_code = response.status_code
+                if status_code == 200:
+                    total_tokens = response.json().get("usage", {}).get("total_tokens")
+            finally:
+                await self.scheduler.release(ticket, status_code, total_tokens)
+
+            retry_after = self._retry_after(response)
+            if status_code != 429 or loop.time() + retry_after >= deadline:
+                return response
+            await asyncio.sleep(retry_after)
+
+    async def stream_chat_completions(self, api_key: str, payload: Dict[str, Any],
+                                      queue_timeout: Optional[float] = None) -> AsyncIterator[Dict[str, Any]]:
+        """Stream a chat completion, yielding each parsed chunk as it arrives
+
+        Raises httpx.HTTPStatusError when DeepSeek rejects the request,
+        CircuitOpenError while the circuit is open and SchedulerTimeout when
+        it cannot be admitted in time.
+        """
+        self._check_circuit()
+        try:
+            async with aclosing(self._stream_chat_completions(api_key, payload, queue_timeout)) as chunks:
+                async for chunk in chunks:
+                    yield chunk
+        except (SchedulerTimeout, GeneratorExit):
+            raise
+        except httpx.HTTPStatusError as e:
+            self._record_status(e.response.status_code)
+            raise
+        except Exception:
+            self.breaker.record_failure()
+            raise
+        else:
+            self.breaker.record_success()
+
+    async def _stream_chat_completions(self, api_key: str, payload: Dict[str, Any],
+                                       queue_timeout: Optional[float]) -> AsyncIterator[Dict[str, Any]]:
+        payload = {**payload, "stream": True, "stream_options": {"include_usage": True}}
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + (self.scheduler.queue_timeout if queue_timeout is None else queue_timeout)
+        estimated_tokens = self._estimate_tokens(payload)
+
+        while True:
+            ticket = await self.scheduler.acquire(estimated_tokens, deadline - loop.time())
+            status_code = None
+            total_tokens = None
+            retry_after = None
+            try:
+                async with self.client.stream(
+                    "POST", "/v1/chat/completions", headers=self._headers(api_key), json=payload
+                ) as response:
+                    if response.status_code != 200:
+                        status_code = response.status_code
+                        await response.aread()
+                        wait = self._retry_after(response)
+                        if status_code == 429 and loop.time() + wait < deadline:
+                            retry_after = wait
+                        else:
+                            response.raise_for_status()
+                    else:
+                        async for line in response.aiter_lines():
+                            ticket.mark_first_byte()
+                            if not line.startswith("data:"):
+                                continue
+                            data = line[len("data:"):].strip()
+                            if data == "[DONE]":
+                                break
+                            chunk = json.loads(data)
+                            if chunk.get("usage"):
+                                total_tokens = chunk["usage"].get("total_tokens")
+                            yield chunk
+                        status_code = response.status_code
+            except (GeneratorExit, asyncio.CancelledError):
+                # The consumer stopped reading or was cancelled; that is not a provider failure
+                status_code = 200
+                raise
+            finally:
+                await self.scheduler.release(ticket, status_code, total_tokens)
+
+            if retry_after is None:
+                return
+            await asyncio.sleep(retry_after)
+
+
+# 创建全局实例
+deepseek_client = DeepSeekClient()
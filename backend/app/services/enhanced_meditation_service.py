@@ -1,10 +1,11 @@
 import json
 import time
 import uuid
-from typing import Dict, List, Any, Optional
+import asyncio
+from typing import Dict, List, Any, Optional, AsyncIterator, Tuple
 from dataclasses import dataclass
 from datetime import datetime
-import requests
+import httpx
 from config.config import DEEPSEEK_API_KEY
 
 from services.feedback_analysis_service import (
@@ -13,6 +14,13 @@ from services.feedback_analysis_service import (
     FeedbackAnalysis
 )
 from services.database_service import MeditationDatabaseService
+from services.feedback_profile_service import FeedbackProfileService
+from services.deepseek_client import deepseek_client
+from services.llm_scheduler import SchedulerTimeout
+from services.storage_backends import storage_backend
+from services.circuit_breaker import CircuitOpenError
+from services.audio_pipeline import audio_pipeline, AUDIO_PENDING, AUDIO_READY, AUDIO_FAILED
+from services.tts_service import DEFAULT_AUDIO_PROFILE
 
 @dataclass
 class EnhancedMeditationRequest:
@@ -21,29 +29,25 @@ class EnhancedMeditationRequest:
     mood: str
     description: str
     feedback_analysis: Optional[FeedbackAnalysis] = None
+    async_audio: bool = False
+    audio_profile: str = DEFAULT_AUDIO_PROFILE
+    hls: bool = False
 
 class EnhancedMeditationService:
     """Enhanced Meditation Generation Service, supports content optimization based on user feedback"""
 
-    def __init__(self, deepseek_api_key: str):
+    def __init__(self, deepseek_api_key: str, client=deepseek_client):
         self.api_key = deepseek_api_key
-        self.base_url = "https://api.deepseek.com"
-        self.headers = {
-            "Authorization": f"Bearer {deepseek_api_key}",
-            "Content-Type": "application/json"
-        }
-        self.feedback_analysis_service = FeedbackAnalysisService(deepseek_api_key)
+        self.client = client
+        self.feedback_analysis_service = FeedbackAnalysisService(deepseek_api_key, client)
         self.db_service = MeditationDatabaseService()
+        self.profile_service = FeedbackProfileService()
     
     async def generate_enhanced_meditation(self, request: EnhancedMeditationRequest) -> Dict[str, Any]:
         """Generate enhanced meditation content based on user feedback"""
-        self.feedback_analysis_service.analyze_feedback(request.feedback_analysis)
         try:
-            # Get user feedback history
-            user_feedbacks = self._get_user_feedback_history(request.user_id)
-            
-            # Build enhanced prompt
-            enhanced_prompt = self._build_enhanced_prompt(request, user_feedbacks)
+            # Get user feedback history and build enhanced prompt
+            enhanced_prompt, user_feedbacks = await self._prepare_prompt(request)
             
             # Generate meditation content
             result = await self._generate_meditation_content(enhanced_prompt, request)
@@ -51,47 +55,130 @@ class EnhancedMeditationService:
             if not result["success"]:
                 return result
             
-            # Generate audio
-            audio_url = None
-            try:
-                from services.tts_service import TTSService
-                tts_service = TTSService()
-                audio_url = tts_service.generate_and_store_speech(
-                    result["script"], 
-                    str(uuid.uuid4())
-                )
-            except Exception as e:
-                print(f"TTS generation failed: {e}")
-                audio_url = None
-            
-            # Save meditation record
-            saved = self.db_service.save_meditation_record(
-                user_id=request.user_id,
-                mood=request.mood,
-                context=request.description,
-                script=result["script"],
-                audio_url=audio_url,
-                feedback_optimized=True
-            )
+            # Generate audio and save meditation record
+            saved = await self._persist_meditation(request, result["script"])
             
-            return {
-                "status": "success",
-                "record_id": saved["record_id"],
-                "meditation_script": result["script"],
-                "audio_url": audio_url,
-                "metadata": {
-                    **result["metadata"],
-                    "feedback_optimized": True,
-                    "user_feedback_count": len(user_feedbacks)
-                }
-            }
+            return self._build_response(result, saved, user_feedbacks)
             
         except Exception as e:
             return {
                 "success": False,
                 "error": f"Failed to generate enhanced meditation: {str(e)}"
             }
+
+    async def stream_enhanced_meditation(self, request: EnhancedMeditationRequest) -> AsyncIterator[Tuple[str, Any]]:
+        """Stream enhanced meditation content as it is generated
+
+        Yields ("token", text) for each content delta, then exactly one
+        ("done", response) with the saved record, or ("error", details).
+        """
+        try:
+            enhanced_prompt, user_feedbacks = await self._prepare_prompt(request)
+
+            result = None
+            async for event, data in self._stream_meditation_content(enhanced_prompt, request):
+                if event == "token":
+                    yield "token", data
+                else:
+                    result = data
+
+            if not result["success"]:
+                yield "error", {"error": result["error"], "details": result.get("details")}
+                return
+
+            saved = await self._persist_meditation(request, result["script"])
+
+            yield "done", self._build_response(result, saved, user_feedbacks)
+
+        except Exception as e:
+            yield "error", {"error": f"Failed to generate enhanced meditation: {str(e)}"}
+
+    async def _prepare_prompt(self, request: EnhancedMeditationRequest) -> Tuple[str, List[UserFeedback]]:
+        """Load the user's feedback history and precomputed profile, then build the enhanced prompt"""
+        # Both are blocking Firestore reads; keep them off the event loop
+        user_feedbacks = await asyncio.to_thread(self._get_user_feedback_history, request.user_id)
+        if request.feedback_analysis is None and user_feedbacks:
+            # Computed off the request path by the feedback worker
+            request.feedback_analysis = await asyncio.to_thread(self.profile_service.get_profile, request.user_id)
+        enhanced_prompt = self._build_enhanced_prompt(request, user_feedbacks)
+        return enhanced_prompt, user_feedbacks
+
+    async def _persist_meditation(self, request: EnhancedMeditationRequest, script: str) -> Dict[str, Any]:
+        """Generate audio for the script and save the meditation record
+
+        With `async_audio` the record is saved straight away and the audio is
+        produced by the background audio pipeline.
+        """
+        defer_audio = request.async_audio and audio_pipeline.running
+        
+        # Generate audio
+        audio_url = None
+        playlist_url = None
+        if not defer_audio:
+            try:
+                from services.tts_service import TTSService
+                tts_service = TTSService()
+                if request.hls:
+                    urls = await tts_service.generate_and_store_hls_async(script, str(uuid.uuid4()))
+                    audio_url, playlist_url = urls["audio_url"], urls["playlist_url"]
+                else:
+                    audio_url = await tts_service.generate_and_store_speech_async(
+                        script, 
+                        str(uuid.uuid4()),
+                        request.audio_profile
+                    )
+            except Exception as e:
+                print(f"TTS generation failed: {e}")
+                audio_url = None
+
+        if defer_audio:
+            audio_status = AUDIO_PENDING
+        else:
+            audio_status = AUDIO_READY if audio_url else AUDIO_FAILED
+        
+        # Save meditation record
+        saved = self.db_service.save_meditation_record(
+            user_id=request.user_id,
+            mood=request.mood,
+            context=request.description,
+            script=script,
+            audio_url=audio_url,
+            feedback_optimized=True,
+            audio_status=audio_status,
+            audio_profile=request.audio_profile,
+            playlist_url=playlist_url
+        )
+
+        if defer_audio:
+            audio_pipeline.submit(saved["record_id"], script, request.audio_profile, request.hls)
+
+        return storage_backend.resolve_urls({
+            "record_id": saved["record_id"],
+            "audio_url": audio_url,
+            "audio_status": audio_status,
+            "playlist_url": playlist_url,
+        })
+
+    def _build_response(self, result: Dict[str, Any], saved: Dict[str, Any],
+                        user_feedbacks: List[UserFeedback]) -> Dict[str, Any]:
+        return {
+            "status": "success",
+            "record_id": saved["record_id"],
+            "meditation_script": result["script"],
+            "audio_url": saved["audio_url"],
+            "audio_status": saved["audio_status"],
+            "playlist_url": saved["playlist_url"],
+            "metadata": {
+                **result["metadata"],
+                "feedback_optimized": True,
+                "user_feedback_count": len(user_feedbacks)
+            }
+        }
     
+    @staticmethod
+    def _rated_record_id(rating: Dict[str, Any]) -> str:
+        return rating.get('meditation_record_id') or rating.get('meditation_id') or ''
+
     def _get_user_feedback_history(self, user_id: str) -> List[UserFeedback]:
         """Get user feedback history"""
         try:
@@ -100,19 +187,27 @@ class EnhancedMeditationService:
             
             ratings = rating_service.get_user_ratings(user_id=user_id, limit=20)
             
+            # Resolve every rated record in a single multi-document read
+            record_ids = [self._rated_record_id(rating) for rating in ratings]
+            meditation_records = self.db_service.get_meditation_records_by_ids(record_ids)
+            
             feedbacks = []
-            for rating in ratings:
-                meditation_record = self.db_service.get_meditation_by_id(rating.get('meditation_id', ''))
+            for rating, record_id in zip(ratings, record_ids):
+                meditation_record = meditation_records.get(record_id)
                 
                 if meditation_record:
+                    created_at = rating['created_at']
+                    if isinstance(created_at, str):
+                        created_at = datetime.fromisoformat(created_at)
                     feedback = UserFeedback(
                         user_id=rating['user_id'],
                         rating_score=rating['score'],
                         rating_comment=rating.get('comment'),
-                        meditation_id=rating.get('meditation_id', ''),
+                        meditation_id=record_id,
                         mood=meditation_record.get('mood', ''),
                         context=meditation_record.get('context', ''),
-                        created_at=datetime.fromisoformat(rating['created_at'])
+                        created_at=created_at,
+                        rating_id=rating.get('rating_id')
                     )
                     feedbacks.append(feedback)
             
@@ -126,12 +221,7 @@ class EnhancedMeditationService:
                              user_feedbacks: List[UserFeedback]) -> str:
         """Build enhanced prompt, including user feedback analysis"""
         
-        feedback_analysis = None
-        if user_feedbacks:
-            latest_feedback = user_feedbacks[0]
-            feedback_analysis = self.feedback_analysis_service.analyze_user_feedback(
-                latest_feedback, user_feedbacks[1:]
-            )
+        feedback_analysis = request.feedback_analysis
         
         feedback_summary = ""
         if feedback_analysis:
@@ -192,37 +282,95 @@ Please generate a complete meditation script, starting directly with the guidanc
 
         return enhanced_prompt
     
+    def _build_payload(self, prompt: str, stream: bool = False) -> Dict[str, Any]:
+        return {
+            "model": "deepseek-chat",
+            "messages": [
+                {
+                    "role": "system",
+                    "content": "You are a professional meditation guide, and you need to generate personalized meditation content for a user."
+                },
+                {
+                    "role": "user",
+                    "content": prompt
+                }
+            ],
+            "temperature": 0.7,
+            "max_tokens": 800,
+            "top_p": 0.9,
+            "frequency_penalty": 0.2,
+            "presence_penalty": 0.1,
+            "stream": stream
+        }
+
+    def _build_result(self, script_content: str, request: EnhancedMeditationRequest,
+                      usage: Dict[str, Any]) -> Dict[str, Any]:
+        processed_script = self._post_process_script(script_content, request)
+        
+        return {
+            "success": True,
+            "script": processed_script,
+            "metadata": {
+                "mood": request.mood,
+                "description": request.description,
+                "estimated_duration": "2-3分钟",
+                "generated_at": time.time(),
+                "feedback_optimized": True,
+                "token_usage": usage
+            }
+        }
+
+    def _error_result(self, error: Exception) -> Dict[str, Any]:
+        if isinstance(error, CircuitOpenError):
+            return {
+                "success": False,
+                "error": "Meditation service is temporarily unavailable",
+                "details": str(error)
+            }
+        if isinstance(error, SchedulerTimeout):
+            return {
+                "success": False,
+                "error": "Meditation service is busy, please try again shortly",
+                "details": str(error)
+            }
+        if isinstance(error, httpx.TimeoutException):
+            return {
+                "success": False,
+                "error": "API request timed out",
+                "details": f"Request exceeded {self.client.timeout.read} seconds"
+            }
+        if isinstance(error, httpx.HTTPStatusError):
+            return {
+                "success": False,
+                "error": f"API request failed: {error.response.status_code}",
+                "details": error.response.text
+            }
+        if isinstance(error, httpx.RequestError):
+            return {
+                "success": False,
+                "error": "Network request error",
+                "details": str(error)
+            }
+        if isinstance(error, json.JSONDecodeError):
+            return {
+                "success": False,
+                "error": "JSON parsing error",
+                "details": str(error)
+            }
+        return {
+            "success": False,
+            "error": "Unknown error",
+            "details": str(error)
+        }
+
     async def _generate_meditation_content(self, prompt: str, 
                                          request: EnhancedMeditationRequest) -> Dict[str, Any]:
         """Generate meditation content"""
 
         try:
-            payload = {
-                "model": "deepseek-chat",
-                "messages": [
-                    {
-                        "role": "system",
-                        "content": "You are a professional meditation guide, and you need to generate personalized meditation content for a user."
-                    },
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
-                ],
-                "temperature": 0.7,
-                "max_tokens": 800,
-                "top_p": 0.9,
-                "frequency_penalty": 0.2,
-                "presence_penalty": 0.1,
-                "stream": False
-            }
+            payload = self._build_payload(prompt)
             
-            response = requests.post(
-                f"{self.base_url}/v1/chat/completions",
-                headers=self.headers,
-                json=payload,
-                timeout=30
-            )
+            response = await self.client.chat_completions(self.api_key, payload)
             
             if response.status_code != 200:
                 return {
@@ -241,45 +389,41 @@ Please generate a complete meditation script, starting directly with the guidanc
                 }
             
             script_content = result["choices"][0]["message"]["content"]
-            processed_script = self._post_process_script(script_content, request)
+            return self._build_result(script_content, request, result.get("usage", {}))
             
-            return {
-                "success": True,
-                "script": processed_script,
-                "metadata": {
-                    "mood": request.mood,
-                    "description": request.description,
-                    "estimated_duration": "2-3分钟",
-                    "generated_at": time.time(),
-                    "feedback_optimized": True,
-                    "token_usage": result.get("usage", {})
+        except Exception as e:
+            return self._error_result(e)
+
+    async def _stream_meditation_content(self, prompt: str,
+                                         request: EnhancedMeditationRequest) -> AsyncIterator[Tuple[str, Any]]:
+        """Stream meditation content, ending with a ("result", result) event"""
+
+        parts = []
+        usage = {}
+        try:
+            payload = self._build_payload(prompt, stream=True)
+
+            async for chunk in self.client.stream_chat_completions(self.api_key, payload):
+                if chunk.get("usage"):
+                    usage = chunk["usage"]
+                for choice in chunk.get("choices") or []:
+                    text = (choice.get("delta") or {}).get("content")
+                    if text:
+                        parts.append(text)
+                        yield "token", text
+
+            if not parts:
+                yield "result", {
+                    "success": False,
+                    "error": "Invalid API response format",
+                    "details": "Stream ended without content"
                 }
-            }
-            
-        except requests.exceptions.Timeout:
-            return {
-                "success": False,
-                "error": "API request timed out",
-                "details": "Request exceeded 30 seconds"
-            }
-        except requests.exceptions.RequestException as e:
-            return {
-                "success": False,
-                "error": "Network request error",
-                "details": str(e)
-            }
-        except json.JSONDecodeError as e:
-            return {
-                "success": False,
-                "error": "JSON parsing error",
-                "details": str(e)
-            }
+                return
+
+            yield "result", self._build_result("".join(parts), request, usage)
+
         except Exception as e:
-            return {
-                "success": False,
-                "error": "Unknown error",
-                "details": str(e)
-            }
+            yield "result", self._error_result(e)
     
     def _post_process_script(self, script: str, request: EnhancedMeditationRequest) -> str:
         """Post-process meditation script"""
@@ -1,10 +1,17 @@
+import os
 import json
 import time
 from typing import Dict, List, Any, Optional
 from dataclasses import dataclass
 from datetime import datetime, timedelta
-import requests
+from pydantic import BaseModel, Field, ValidationError
 from config.config import DEEPSEEK_API_KEY
+from services.deepseek_client import deepseek_client
+
+# "single": one JSON-mode call returns the whole analysis; "two_call": legacy analysis + guidance calls
+FEEDBACK_ANALYSIS_MODE = os.getenv("FEEDBACK_ANALYSIS_MODE", "single")
+# The single call returns the analysis and the guidance together; a truncated JSON object fails validation
+FEEDBACK_ANALYSIS_JSON_MAX_TOKENS = int(os.getenv("FEEDBACK_ANALYSIS_JSON_MAX_TOKENS", "2500"))
 
 @dataclass
 class UserFeedback:
@@ -16,6 +23,7 @@ class UserFeedback:
     mood: str  # 用户当时的心情
     context: str  # 用户当时的描述
     created_at: datetime
+    rating_id: Optional[str] = None  # 来源评分ID
 
 @dataclass
 class FeedbackAnalysis:
@@ -26,27 +34,36 @@ class FeedbackAnalysis:
     user_preferences: Dict[str, Any]  # 用户偏好
     next_meditation_guidance: str  # 下次冥想的指导建议
 
+class FeedbackAnalysisSchema(BaseModel):
+    """单次调用返回的结构化分析结果"""
+    overall_satisfaction: float = Field(..., ge=0, le=1)
+    key_issues: List[str]
+    improvement_suggestions: List[str]
+    user_preferences: Dict[str, Any]
+    next_meditation_guidance: str = Field(..., min_length=1)
+
 class FeedbackAnalysisService:
     """User feedback analysis service"""
     
-    def __init__(self, deepseek_api_key: str):
+    def __init__(self, deepseek_api_key: str, client=deepseek_client,
+                 single_call: bool = FEEDBACK_ANALYSIS_MODE != "two_call"):
         self.api_key = deepseek_api_key
-        self.base_url = "https://api.deepseek.com"
-        self.headers = {
-            "Authorization": f"Bearer {deepseek_api_key}",
-            "Content-Type": "application/json"
-        }
+        self.client = client
+        self.single_call = single_call
     
-    def analyze_user_feedback(self, feedback: UserFeedback, 
+    async def analyze_user_feedback(self, feedback: UserFeedback, 
                             previous_feedbacks: List[UserFeedback] = None) -> FeedbackAnalysis:
         """Analyze user feedback and generate optimization suggestions"""
         
         if previous_feedbacks is None:
             previous_feedbacks = []
+
+        if self.single_call:
+            return await self._analyze_single_call(feedback, previous_feedbacks)
         
         overall_satisfaction = self._calculate_satisfaction(feedback, previous_feedbacks)
-        analysis_result = self._analyze_feedback_content(feedback, previous_feedbacks)
-        next_meditation_guidance = self._generate_next_meditation_guidance(
+        analysis_result = await self._analyze_feedback_content(feedback, previous_feedbacks)
+        next_meditation_guidance = await self._generate_next_meditation_guidance(
             feedback, previous_feedbacks, analysis_result
         )
         
@@ -58,6 +75,32 @@ class FeedbackAnalysisService:
             next_meditation_guidance=next_meditation_guidance
         )
     
+    async def _analyze_single_call(self, feedback: UserFeedback,
+                                   previous_feedbacks: List[UserFeedback]) -> FeedbackAnalysis:
+        """Produce the whole analysis with one JSON-mode call, validated against FeedbackAnalysisSchema"""
+        
+        rating_satisfaction = self._calculate_satisfaction(feedback, previous_feedbacks)
+        prompt = self._build_analysis_prompt(feedback, previous_feedbacks, rating_satisfaction)
+        
+        result = None
+        try:
+            result = await self._call_deepseek_api(prompt, json_mode=True)
+            analysis = FeedbackAnalysisSchema.model_validate_json(result)
+            return FeedbackAnalysis(**analysis.model_dump())
+        except ValidationError as e:
+            print(f"❌ Feedback analysis for {feedback.user_id} did not match schema: {e}; response: {(result or '')[:500]}")
+        except Exception as e:
+            print(f"❌ Feedback analysis for {feedback.user_id} failed: {e}")
+        
+        basic = self._basic_analysis(feedback)
+        return FeedbackAnalysis(
+            overall_satisfaction=rating_satisfaction,
+            key_issues=basic["key_issues"],
+            improvement_suggestions=basic["improvement_suggestions"],
+            user_preferences=basic["user_preferences"],
+            next_meditation_guidance=basic["next_meditation_guidance"]
+        )
+    
     def _calculate_satisfaction(self, feedback: UserFeedback, 
                               previous_feedbacks: List[UserFeedback]) -> float:
         """Calculate user satisfaction"""
@@ -74,7 +117,7 @@ class FeedbackAnalysisService:
         
         return current_satisfaction
     
-    def _analyze_feedback_content(self, feedback: UserFeedback, 
+    async def _analyze_feedback_content(self, feedback: UserFeedback, 
                                 previous_feedbacks: List[UserFeedback]) -> Dict[str, Any]:
         """Analyze feedback content, extract key information and preferences"""
         
@@ -82,7 +125,7 @@ class FeedbackAnalysisService:
         analysis_prompt = self._build_analysis_prompt(feedback, previous_feedbacks)
         
         try:
-            result = self._call_deepseek_api(analysis_prompt)
+            result = await self._call_deepseek_api(analysis_prompt)
             return self._parse_analysis_result(result)
         except Exception as e:
             print(f"Feedback analysis failed: {e}")
@@ -90,8 +133,13 @@ class FeedbackAnalysisService:
             return self._basic_analysis(feedback)
     
     def _build_analysis_prompt(self, feedback: UserFeedback, 
-                             previous_feedbacks: List[UserFeedback]) -> str:
-        """Build analysis prompt"""
+                             previous_feedbacks: List[UserFeedback],
+                             rating_satisfaction: Optional[float] = None) -> str:
+        """Build analysis prompt
+
+        When rating_satisfaction is given, the prompt also asks for
+        overall_satisfaction so the response covers every FeedbackAnalysis field.
+        """
         
         # Build historical feedback summary
         history_summary = ""
@@ -104,6 +152,12 @@ class FeedbackAnalysisService:
                 if hist_feedback.rating_comment:
                     history_summary += f"Comment: {hist_feedback.rating_comment}, "
                 history_summary += f"Mood: {hist_feedback.mood}\n"
+
+        satisfaction_field = ""
+        if rating_satisfaction is not None:
+            history_summary += f"\nRating-based satisfaction (0-1, recent ratings weighted): {rating_satisfaction:.2f}\n"
+            satisfaction_field = """
+    "overall_satisfaction": 0.0 to 1.0, the rating-based satisfaction adjusted for what the comments reveal,"""
         
         prompt = f"""You are a professional meditation content analysis expert. Please analyze the following user feedback and provide detailed improvement suggestions.
 
@@ -139,7 +193,7 @@ Please analyze from the following perspectives:
    - Personalization element enhancement
 
 Please return analysis results in JSON format:
-{{
+{{{satisfaction_field}
     "key_issues": ["Issue 1", "Issue 2"],
     "improvement_suggestions": ["Suggestion 1", "Suggestion 2"],
     "user_preferences": {{
@@ -155,8 +209,11 @@ Please ensure the analysis is accurate, specific, and actionable."""
 
         return prompt
     
-    def _call_deepseek_api(self, prompt: str) -> str:
-        """Call DeepSeek API for analysis"""
+    async def _call_deepseek_api(self, prompt: str, json_mode: bool = False) -> str:
+        """Call DeepSeek API for analysis
+
+        json_mode asks the provider to return a single valid JSON object.
+        """
         
         payload = {
             "model": "deepseek-chat",
@@ -171,17 +228,14 @@ Please ensure the analysis is accurate, specific, and actionable."""
                 }
             ],
             "temperature": 0.3,  # 较低的温度确保分析的一致性
-            "max_tokens": 1000,
+            "max_tokens": FEEDBACK_ANALYSIS_JSON_MAX_TOKENS if json_mode else 1000,
             "top_p": 0.9,
             "stream": False
         }
+        if json_mode:
+            payload["response_format"] = {"type": "json_object"}
         
-        response = requests.post(
-            f"{self.base_url}/v1/chat/completions",
-            headers=self.headers,
-            json=payload,
-            timeout=30
-        )
+        response = await self.client.chat_completions(self.api_key, payload)
         
         if response.status_code != 200:
             raise Exception(f"API request failed: {response.status_code}")
@@ -189,6 +243,8 @@ Please ensure the analysis is accurate, specific, and actionable."""
         result = response.json()
         if "choices" not in result or len(result["choices"]) == 0:
             raise Exception("Invalid API response format")
+        if json_mode and result["choices"][0].get("finish_reason") == "length":
+            raise Exception(f"Analysis truncated at max_tokens ({payload['max_tokens']})")
         
         return result["choices"][0]["message"]["content"]
     
@@ -245,7 +301,7 @@ Please ensure the analysis is accurate, specific, and actionable."""
             "next_meditation_guidance": "Adjust content style and personalization level based on user rating"
         }
     
-    def _generate_next_meditation_guidance(self, feedback: UserFeedback, 
+    async def _generate_next_meditation_guidance(self, feedback: UserFeedback, 
                                          previous_feedbacks: List[UserFeedback],
                                          analysis_result: Dict[str, Any]) -> str:
         """Generate guidance suggestions for next meditation"""
@@ -272,7 +328,7 @@ Please generate detailed guidance suggestions for the next meditation, including
 Please answer in English, ensuring suggestions are specific and actionable."""
 
         try:
-            result = self._call_deepseek_api(guidance_prompt)
+            result = await self._call_deepseek_api(guidance_prompt)
             return result.strip()
         except Exception as e:
             print(f"Failed to generate guidance suggestions: {e}")
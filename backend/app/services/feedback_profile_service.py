@@ -0,0 +1,132 @@
+import hashlib
+from dataclasses import asdict
+from datetime import datetime, timezone
+from typing import Optional, Dict, Any, List
+
+from google.cloud import firestore
+
+from config.config import db
+from services.feedback_analysis_service import FeedbackAnalysis, UserFeedback
+from services.unit_of_work import UnitOfWork
+
+# Bump when the stored profile layout or the analysis that produces it changes
+PROFILE_SCHEMA_VERSION = 2
+
+_ANALYSIS_FIELDS = [
+    "overall_satisfaction", "key_issues", "improvement_suggestions",
+    "user_preferences", "next_meditation_guidance", "latest_feedback",
+]
+
+
+class FeedbackProfileService:
+    """Materialized per-user feedback analysis
+
+    Profiles are written by the feedback worker (or rebuilt on demand) and
+    record the ID of the latest rating they were computed from. Every
+    rating write bumps `ratings_version` on the profile document inside the
+    rating's transaction; a profile stores the version it was computed
+    from and is fresh only while the two match, so a rating changed while
+    the profile was being computed is never masked by the save.
+    """
+
+    def __init__(self):
+        self.db = db
+        self.profile_collection = "user_feedback_profiles"
+
+    def get_profile_document(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """Get the raw profile document"""
+        try:
+            doc = self._ref(user_id).get()
+            if doc.exists:
+                return doc.to_dict()
+            return None
+        except Exception as e:
+            print(f"❌ Failed to get feedback profile: {e}")
+            return None
+
+    def get_profile(self, user_id: str) -> Optional[FeedbackAnalysis]:
+        """Get the user's precomputed feedback analysis, if any"""
+        data = self.get_profile_document(user_id)
+        if not data or "overall_satisfaction" not in data:
+            return None
+
+        return FeedbackAnalysis(
+            overall_satisfaction=data.get("overall_satisfaction", 0.0),
+            key_issues=data.get("key_issues", []),
+            improvement_suggestions=data.get("improvement_suggestions", []),
+            user_preferences=data.get("user_preferences", {}),
+            next_meditation_guidance=data.get("next_meditation_guidance", ""),
+        )
+
+    def _ref(self, user_id: str):
+        return self.db.collection(self.profile_collection).document(user_id)
+
+    @staticmethod
+    def ratings_version(profile: Optional[Dict[str, Any]]) -> int:
+        """Current version of the user's ratings, as counted on the profile document"""
+        return (profile or {}).get("ratings_version", 0)
+
+    @classmethod
+    def is_fresh(cls, profile: Optional[Dict[str, Any]]) -> bool:
+        """Whether a stored profile can be served without recomputation"""
+        return bool(
+            profile
+            and profile.get("schema_version") == PROFILE_SCHEMA_VERSION
+            and profile.get("source_ratings_version") == cls.ratings_version(profile)
+        )
+
+    @staticmethod
+    def etag(profile: Dict[str, Any]) -> str:
+        """Strong ETag derived from the profile's version and source rating"""
+        computed_at = profile.get("computed_at")
+        if isinstance(computed_at, datetime):
+            computed_at = computed_at.isoformat()
+        raw = (f"{profile.get('schema_version')}:{profile.get('source_rating_id')}:"
+               f"{profile.get('source_ratings_version')}:{computed_at}")
+        return '"' + hashlib.sha1(raw.encode("utf-8")).hexdigest() + '"'
+
+    def save_profile(self, user_id: str, analysis: FeedbackAnalysis,
+                     user_feedbacks: List[UserFeedback], ratings_version: int) -> Dict[str, Any]:
+        """Store the user's feedback analysis, keyed by the latest rating it covers
+
+        `ratings_version` is the version read before the feedback history;
+        ratings_version itself is left alone, so later rating writes keep
+        the profile stale.
+        """
+        latest_feedback = user_feedbacks[0]
+        profile = {
+            "user_id": user_id,
+            **asdict(analysis),
+            "schema_version": PROFILE_SCHEMA_VERSION,
+            "source_rating_id": latest_feedback.rating_id,
+            "source_ratings_version": ratings_version,
+            "feedback_count": len(user_feedbacks),
+            "latest_feedback": {
+                "rating_score": latest_feedback.rating_score,
+                "rating_comment": latest_feedback.rating_comment,
+                "mood": latest_feedback.mood,
+                "context": latest_feedback.context,
+                "created_at": latest_feedback.created_at.isoformat()
+            },
+            "computed_at": datetime.now(timezone.utc),
+        }
+        self._ref(user_id).set(profile, merge=True)
+        return {**profile, "ratings_version": ratings_version}
+
+    def save_empty_profile(self, user_id: str, ratings_version: int) -> Dict[str, Any]:
+        """Record that the user has no rated meditations yet"""
+        profile = {
+            "user_id": user_id,
+            "schema_version": PROFILE_SCHEMA_VERSION,
+            "source_rating_id": None,
+            "source_ratings_version": ratings_version,
+            "feedback_count": 0,
+            "computed_at": datetime.now(timezone.utc),
+        }
+        self._ref(user_id).set({**profile, **{field: firestore.DELETE_FIELD for field in _ANALYSIS_FIELDS}},
+                               merge=True)
+        return {**profile, "ratings_version": ratings_version}
+
+    def mark_ratings_changed(self, uow: UnitOfWork, user_id: str):
+        """Bump the user's ratings version; call inside the rating write's transaction"""
+        uow.set(self._ref(user_id), {"user_id": user_id, "ratings_version": firestore.Increment(1)}, merge=True)
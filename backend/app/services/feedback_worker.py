@@ -0,0 +1,169 @@
+import os
+import asyncio
+from typing import Dict, Any, List, Optional
+
+from config.config import db
+from services.feedback_profile_service import FeedbackProfileService
+from services.enhanced_meditation_service import enhanced_meditation_service
+
+FEEDBACK_WORKER_ENABLED = os.getenv("FEEDBACK_WORKER_ENABLED", "true").lower() == "true"
+FEEDBACK_WORKER_POLL_INTERVAL = float(os.getenv("FEEDBACK_WORKER_POLL_INTERVAL", "10"))
+FEEDBACK_WORKER_BATCH_SIZE = int(os.getenv("FEEDBACK_WORKER_BATCH_SIZE", "50"))
+FEEDBACK_WORKER_MAX_ATTEMPTS = int(os.getenv("FEEDBACK_WORKER_MAX_ATTEMPTS", "5"))
+
+
+class FeedbackAnalysisWorker:
+    """Background worker that turns new ratings into precomputed feedback profiles
+
+    It polls `user_feedback` for documents with `processed: False`, runs the
+    feedback analysis once per affected user (covering all of that user's new
+    ratings in the batch), stores the result through FeedbackProfileService
+    and marks the documents processed. Documents without a user, and those
+    whose profile refresh failed `max_attempts` times, are marked processed
+    with an `error` so they cannot clog the queue. Run it in a single
+    process per deployment (FEEDBACK_WORKER_ENABLED=false elsewhere).
+    """
+
+    def __init__(
+        self,
+        enabled: bool = FEEDBACK_WORKER_ENABLED,
+        poll_interval: float = FEEDBACK_WORKER_POLL_INTERVAL,
+        batch_size: int = FEEDBACK_WORKER_BATCH_SIZE,
+        max_attempts: int = FEEDBACK_WORKER_MAX_ATTEMPTS,
+    ):
+        self.db = db
+        self.feedback_collection = "user_feedback"
+        self.enabled = enabled
+        self.poll_interval = poll_interval
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.profile_service = FeedbackProfileService()
+        self.meditation_service = enhanced_meditation_service
+        self._task: Optional[asyncio.Task] = None
+
+        self.profiles_computed = 0
+        self.feedback_processed = 0
+        self.failures = 0
+        self.feedback_dropped = 0
+
+    async def start(self):
+        """Start polling (called on application startup)"""
+        if self.enabled and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop polling (called on application shutdown)"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                processed = await self.process_pending()
+            except Exception as e:
+                print(f"❌ Feedback worker iteration failed: {e}")
+                processed = 0
+            # Keep draining without waiting while full batches are coming in
+            if processed < self.batch_size:
+                await asyncio.sleep(self.poll_interval)
+
+    def _fetch_pending(self) -> List[Any]:
+        query = (
+            self.db.collection(self.feedback_collection)
+            .where("processed", "==", False)
+            .limit(self.batch_size)
+        )
+        return list(query.stream())
+
+    def _mark_processed(self, docs: List[Any], error: Optional[str] = None):
+        batch = self.db.batch()
+        for doc in docs:
+            batch.update(doc.reference, {"processed": True, "error": error} if error else {"processed": True})
+        batch.commit()
+
+    def _record_failure(self, docs: List[Any], error: str) -> int:
+        """Count a failed attempt on each document; returns how many reached max_attempts and were given up"""
+        batch = self.db.batch()
+        dropped = 0
+        for doc in docs:
+            attempts = (doc.to_dict().get("attempts") or 0) + 1
+            update = {"attempts": attempts, "error": error}
+            if attempts >= self.max_attempts:
+                update["processed"] = True
+                dropped += 1
+            batch.update(doc.reference, update)
+        batch.commit()
+        return dropped
+
+    async def process_pending(self) -> int:
+        """Process one batch of unprocessed feedback, returning the number of documents marked processed"""
+        docs = await asyncio.to_thread(self._fetch_pending)
+        if not docs:
+            return 0
+
+        by_user: Dict[str, List[Any]] = {}
+        orphaned = []
+        for doc in docs:
+            user_id = doc.to_dict().get("user_id")
+            if user_id:
+                by_user.setdefault(user_id, []).append(doc)
+            else:
+                orphaned.append(doc)
+
+        handled = 0
+        if orphaned:
+            await asyncio.to_thread(self._mark_processed, orphaned, "missing user_id")
+            self.feedback_dropped += len(orphaned)
+            handled += len(orphaned)
+
+        for user_id, user_docs in by_user.items():
+            try:
+                await self.refresh_profile(user_id)
+            except Exception as e:
+                self.failures += 1
+                print(f"❌ Failed to compute feedback profile for {user_id}: {e}")
+                dropped = await asyncio.to_thread(self._record_failure, user_docs, str(e)[:500])
+                self.feedback_dropped += dropped
+                handled += dropped
+                continue
+            await asyncio.to_thread(self._mark_processed, user_docs)
+            self.feedback_processed += len(user_docs)
+            handled += len(user_docs)
+
+        return handled
+
+    async def refresh_profile(self, user_id: str) -> Dict[str, Any]:
+        """Recompute and store the feedback profile of one user"""
+        # Read before the history: a rating written meanwhile bumps the version past this one
+        current = await asyncio.to_thread(self.profile_service.get_profile_document, user_id)
+        ratings_version = self.profile_service.ratings_version(current)
+        user_feedbacks = await asyncio.to_thread(
+            self.meditation_service._get_user_feedback_history, user_id
+        )
+        if not user_feedbacks:
+            return await asyncio.to_thread(self.profile_service.save_empty_profile, user_id, ratings_version)
+
+        analysis = await self.meditation_service.feedback_analysis_service.analyze_user_feedback(
+            user_feedbacks[0], user_feedbacks[1:]
+        )
+        profile = await asyncio.to_thread(
+            self.profile_service.save_profile, user_id, analysis, user_feedbacks, ratings_version
+        )
+        self.profiles_computed += 1
+        return profile
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "running": self._task is not None and not self._task.done(),
+            "profiles_computed": self.profiles_computed,
+            "feedback_processed": self.feedback_processed,
+            "failures": self.failures,
+            "feedback_dropped": self.feedback_dropped,
+        }
+
+
+# 创建全局实例
+feedback_worker = FeedbackAnalysisWorker()
@@ -0,0 +1,85 @@
+import math
+import struct
+from typing import List, Tuple
+
+from services import mp3
+
+PLAYLIST_CONTENT_TYPE = "application/vnd.apple.mpegurl"
+SEGMENT_CONTENT_TYPE = "audio/mpeg"
+
+# RFC 8216 §3.4: packed audio segments start with an ID3 PRIV frame carrying
+# the 33-bit MPEG-2 timestamp (90 kHz) of their first sample
+_TIMESTAMP_OWNER = b"com.apple.streaming.transportStreamTimestamp\x00"
+_PTS_CLOCK = 90000
+
+
+def _synchsafe(size: int) -> bytes:
+    return bytes([(size >> 21) & 0x7F, (size >> 14) & 0x7F, (size >> 7) & 0x7F, size & 0x7F])
+
+
+def timestamp_tag(seconds: float) -> bytes:
+    """ID3v2.4 tag holding the transport stream timestamp of a packed audio segment"""
+    pts = round(seconds * _PTS_CLOCK) % (1 << 33)
+    frame_body = _TIMESTAMP_OWNER + struct.pack(">Q", pts)
+    frame = b"PRIV" + _synchsafe(len(frame_body)) + b"\x00\x00" + frame_body
+    return b"ID3\x04\x00\x00" + _synchsafe(len(frame)) + frame
+
+
+def segment_mp3(data: bytes, target_seconds: float) -> List[Tuple[bytes, float]]:
+    """Cut an MP3 file on frame boundaries into segments of about target_seconds
+
+    Returns (segment bytes, duration) pairs; every segment is a standalone
+    MP3 elementary stream preceded by its timestamp tag, as HLS packed-audio
+    segments require.
+    """
+    data = mp3.strip_tags(data)
+    segments = []
+    current = bytearray()
+    start = 0.0
+    duration = 0.0
+    for frame in mp3.audio_frames(data):
+        current += data[frame.offset:frame.offset + frame.length]
+        duration += frame.duration
+        if duration >= target_seconds:
+            segments.append((timestamp_tag(start) + bytes(current), duration))
+            current = bytearray()
+            start += duration
+            duration = 0.0
+    if current:
+        segments.append((timestamp_tag(start) + bytes(current), duration))
+    return segments
+
+
+def media_playlist(segments: List[Tuple[str, float]]) -> str:
+    """VOD media playlist for (segment URI, duration) pairs"""
+    target_duration = max([1] + [round(duration) for _, duration in segments])
+    lines = [
+        "#EXTM3U",
+        "#EXT-X-VERSION:3",
+        f"#EXT-X-TARGETDURATION:{target_duration}",
+        "#EXT-X-MEDIA-SEQUENCE:0",
+        "#EXT-X-PLAYLIST-TYPE:VOD",
+    ]
+    for uri, duration in segments:
+        lines.append(f"#EXTINF:{duration:.3f},")
+        lines.append(uri)
+    lines.append("#EXT-X-ENDLIST")
+    return "\n".join(lines) + "\n"
+
+
+def master_playlist(variants: List[Tuple[str, int]]) -> str:
+    """Master playlist for (media playlist URI, peak bandwidth in bits/s) pairs, lowest first"""
+    lines = ["#EXTM3U", "#EXT-X-VERSION:3"]
+    for uri, bandwidth in sorted(variants, key=lambda variant: variant[1]):
+        # The CODECS value Apple's HLS authoring spec gives for MP3
+        lines.append(f'#EXT-X-STREAM-INF:BANDWIDTH={bandwidth},CODECS="mp4a.40.34"')
+        lines.append(uri)
+    return "\n".join(lines) + "\n"
+
+
+def peak_bandwidth(segments: List[Tuple[bytes, float]]) -> int:
+    """Highest per-segment bitrate in bits per second, as EXT-X-STREAM-INF expects"""
+    return max(
+        (math.ceil(len(content) * 8 / duration) for content, duration in segments if duration > 0),
+        default=0,
+    )
@@ -0,0 +1,183 @@
+import os
+import time
+import asyncio
+from collections import deque
+from dataclasses import dataclass
+from typing import Dict, Any, Optional
+
+LLM_MIN_CONCURRENCY = int(os.getenv("LLM_MIN_CONCURRENCY", "1"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "32"))
+LLM_INITIAL_CONCURRENCY = int(os.getenv("LLM_INITIAL_CONCURRENCY", "8"))
+LLM_TOKENS_PER_MINUTE = int(os.getenv("LLM_TOKENS_PER_MINUTE", "200000"))
+LLM_TARGET_LATENCY = float(os.getenv("LLM_TARGET_LATENCY", "20"))
+LLM_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", "20"))
+
+TOKEN_WINDOW_SECONDS = 60.0
+
+
+class SchedulerTimeout(Exception):
+    """Raised when a request could not be admitted before its deadline"""
+
+
+@dataclass
+class SchedulerTicket:
+    estimated_tokens: int
+    admitted_at: float
+    first_byte_at: Optional[float] = None
+
+    def mark_first_byte(self):
+        """Record when a streamed response started arriving; its latency is measured up to here"""
+        if self.first_byte_at is None:
+            self.first_byte_at = time.monotonic()
+
+
+class LLMScheduler:
+    """Outbound scheduler for LLM calls: adaptive concurrency plus a tokens-per-minute budget
+
+    The concurrency limit follows AIMD: it grows by roughly one slot per
+    window of successful, fast responses and is halved on 429s, 5xx, transport
+    errors or responses slower than the target latency. Requests that cannot
+    be admitted wait in FIFO order until a slot and enough token budget are
+    free, or fail with SchedulerTimeout once their deadline passes.
+    """
+
+    def __init__(
+        self,
+        min_limit: int = LLM_MIN_CONCURRENCY,
+        max_limit: int = LLM_MAX_CONCURRENCY,
+        initial_limit: int = LLM_INITIAL_CONCURRENCY,
+        tokens_per_minute: int = LLM_TOKENS_PER_MINUTE,
+        target_latency: float = LLM_TARGET_LATENCY,
+        queue_timeout: float = LLM_QUEUE_TIMEOUT,
+    ):
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.limit = float(min(max(initial_limit, min_limit), max_limit))
+        self.tokens_per_minute = tokens_per_minute
+        self.target_latency = target_latency
+        self.queue_timeout = queue_timeout
+
+        self.in_flight = 0
+        self._reserved_tokens = 0
+        self._token_log: deque = deque()  # (timestamp, tokens) of finished calls
+        self._queue: deque = deque()
+        self._condition: Optional[asyncio.Condition] = None
+        self._last_decrease = 0.0
+
+        self.admitted = 0
+        self.timed_out = 0
+        self.throttled = 0
+        self.completed = 0
+
+    @property
+    def condition(self) -> asyncio.Condition:
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        return self._condition
+
+    def _tokens_used(self, now: float) -> int:
+        while self._token_log and self._token_log[0][0] <= now - TOKEN_WINDOW_SECONDS:
+            self._token_log.popleft()
+        return sum(tokens for _, tokens in self._token_log)
+
+    def _budget_wait(self, now: float) -> float:
+        """Seconds until the oldest token entry leaves the budget window"""
+        if not self._token_log:
+            return self.queue_timeout
+        return max(0.05, self._token_log[0][0] + TOKEN_WINDOW_SECONDS - now)
+
+    def _can_admit(self, estimated_tokens: int, now: float) -> bool:
+        if self.in_flight >= int(self.limit):
+            return False
+        used = self._tokens_used(now) + self._reserved_tokens
+        # A request larger than the whole budget could never fit; let it run alone on an empty window
+        if estimated_tokens > self.tokens_per_minute:
+            return used == 0 and self.in_flight == 0
+        return used + estimated_tokens <= self.tokens_per_minute
+
+    async def acquire(self, estimated_tokens: int, timeout: Optional[float] = None) -> SchedulerTicket:
+        loop = asyncio.get_running_loop()
+        timeout = self.queue_timeout if timeout is None else timeout
+        deadline = loop.time() + timeout
+        waiter = object()
+
+        async with self.condition:
+            self._queue.append(waiter)
+            try:
+                while True:
+                    now = time.monotonic()
+                    if self._queue[0] is waiter and self._can_admit(estimated_tokens, now):
+                        self.in_flight += 1
+                        self._reserved_tokens += estimated_tokens
+                        self.admitted += 1
+                        return SchedulerTicket(estimated_tokens, now)
+
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        self.timed_out += 1
+                        raise SchedulerTimeout(
+                            f"LLM request not admitted within {timeout:.1f}s "
+                            f"({self.in_flight} in flight, limit {int(self.limit)})"
+                        )
+                    try:
+                        await asyncio.wait_for(
+                            self.condition.wait(), min(remaining, self._budget_wait(now))
+                        )
+                    except asyncio.TimeoutError:
+                        pass
+            finally:
+                self._queue.remove(waiter)
+                self.condition.notify_all()
+
+    async def release(self, ticket: SchedulerTicket, status_code: Optional[int],
+                      total_tokens: Optional[int] = None):
+        """Return a slot and feed the outcome into the AIMD controller
+
+        status_code is None when the request failed before a response arrived.
+        For streamed responses (see SchedulerTicket.mark_first_byte) the
+        latency fed to the controller is the time to first byte, since the
+        length of the stream depends on the output, not on congestion.
+        """
+        now = time.monotonic()
+        latency = (ticket.first_byte_at or now) - ticket.admitted_at
+
+        async with self.condition:
+            self.in_flight -= 1
+            self._reserved_tokens -= ticket.estimated_tokens
+            self._token_log.append(
+                (now, total_tokens if total_tokens is not None else ticket.estimated_tokens)
+            )
+            self.completed += 1
+
+            congested = status_code is None or status_code == 429 or status_code >= 500
+            if status_code == 429:
+                self.throttled += 1
+
+            if congested or latency > self.target_latency:
+                # Back off at most once per target-latency window so one burst halves once
+                if now - self._last_decrease > self.target_latency:
+                    self.limit = max(float(self.min_limit), self.limit / 2)
+                    self._last_decrease = now
+            else:
+                self.limit = min(float(self.max_limit), self.limit + 1 / self.limit)
+
+            self.condition.notify_all()
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        return {
+            "concurrency_limit": int(self.limit),
+            "in_flight": self.in_flight,
+            "queued": len(self._queue),
+            "tokens_last_minute": self._tokens_used(now),
+            "tokens_reserved": self._reserved_tokens,
+            "tokens_per_minute": self.tokens_per_minute,
+            "admitted": self.admitted,
+            "completed": self.completed,
+            "timed_out": self.timed_out,
+            "throttled": self.throttled,
+        }
+
+
+# 创建全局实例
+llm_scheduler = LLMScheduler()
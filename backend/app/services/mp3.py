@@ -0,0 +1,112 @@
+from dataclasses import dataclass
+from typing import Iterator, List, Optional
+
+# Layer III bitrates in kbps, indexed by the header's bitrate index
+_BITRATES_MPEG1 = [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320]
+_BITRATES_MPEG2 = [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160]
+
+# Sample rates in Hz by version bits (3: MPEG1, 2: MPEG2, 0: MPEG2.5)
+_SAMPLE_RATES = {
+    3: [44100, 48000, 32000],
+    2: [22050, 24000, 16000],
+    0: [11025, 12000, 8000],
+}
+
+
+@dataclass
+class Mp3Frame:
+    """Location and timing of one MPEG audio Layer III frame"""
+    offset: int
+    length: int
+    sample_rate: int
+    samples: int
+
+    @property
+    def duration(self) -> float:
+        return self.samples / self.sample_rate
+
+
+def parse_frame_header(data: bytes, offset: int) -> Optional[Mp3Frame]:
+    """Parse the Layer III frame header at `offset`, or None if there is none"""
+    if offset + 4 > len(data):
+        return None
+
+    b1, b2, b3 = data[offset + 1], data[offset + 2], data[offset + 3]
+    if data[offset] != 0xFF or (b1 & 0xE0) != 0xE0:
+        return None
+
+    version = (b1 >> 3) & 0x03
+    layer = (b1 >> 1) & 0x03
+    bitrate_index = (b2 >> 4) & 0x0F
+    sample_rate_index = (b2 >> 2) & 0x03
+    padding = (b2 >> 1) & 0x01
+    if version == 1 or layer != 1 or bitrate_index in (0, 15) or sample_rate_index == 3:
+        return None
+
+    sample_rate = _SAMPLE_RATES[version][sample_rate_index]
+    if version == 3:
+        bitrate = _BITRATES_MPEG1[bitrate_index] * 1000
+        samples = 1152
+    else:
+        bitrate = _BITRATES_MPEG2[bitrate_index] * 1000
+        samples = 576
+
+    length = (samples // 8) * bitrate // sample_rate + padding
+    return Mp3Frame(offset=offset, length=length, sample_rate=sample_rate, samples=samples)
+
+
+def strip_tags(data: bytes) -> bytes:
+    """Remove a leading ID3v2 tag and a trailing ID3v1 tag"""
+    if data[:3] == b"ID3" and len(data) >= 10:
+        size = (data[6] << 21) | (data[7] << 14) | (data[8] << 7) | data[9]
+        footer = 10 if data[5] & 0x10 else 0
+        data = data[10 + size + footer:]
+    if len(data) >= 128 and data[-128:-125] == b"TAG":
+        data = data[:-128]
+    return data
+
+
+def iter_frames(data: bytes) -> Iterator[Mp3Frame]:
+    """Yield the audio frames of an untagged MP3 stream, resyncing over garbage"""
+    offset = 0
+    while offset < len(data):
+        frame = parse_frame_header(data, offset)
+        if frame is None or offset + frame.length > len(data):
+            offset += 1
+            continue
+        yield frame
+        offset += frame.length
+
+
+def _is_info_frame(data: bytes, frame: Mp3Frame) -> bool:
+    # Xing/Info (or VBRI) header frames carry stream-level metadata, not audio
+    head = data[frame.offset:frame.offset + min(frame.length, 64)]
+    return b"Xing" in head or b"Info" in head or b"VBRI" in head
+
+
+def audio_frames(data: bytes) -> List[Mp3Frame]:
+    """The playable frames of an MP3 file, without tags or Xing/Info header frames"""
+    frames = list(iter_frames(data))
+    if frames and _is_info_frame(data, frames[0]):
+        frames = frames[1:]
+    return frames
+
+
+def concat(parts: List[bytes]) -> bytes:
+    """Join MP3 files frame by frame, without re-encoding
+
+    Tags and per-file Xing/Info headers are dropped, since they would
+    otherwise describe only the first part or play as glitches mid-stream.
+    """
+    out = bytearray()
+    for part in parts:
+        data = strip_tags(part)
+        for frame in audio_frames(data):
+            out += data[frame.offset:frame.offset + frame.length]
+    return bytes(out)
+
+
+def duration(data: bytes) -> float:
+    """Playback length in seconds"""
+    data = strip_tags(data)
+    return sum(frame.duration for frame in audio_frames(data))
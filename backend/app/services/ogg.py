@@ -0,0 +1,155 @@
+import struct
+from dataclasses import dataclass
+from typing import Iterator, List, Tuple
+
+# capture pattern, version, header type, granule position, serial, page sequence, CRC, segment count
+_PAGE_HEADER = struct.Struct("<4sBBqIIIB")
+
+_BOS = 0x02
+_EOS = 0x04
+
+# Pages are filled up to about this many bytes, like libogg does
+_PAGE_TARGET_BYTES = 4096
+
+
+def _crc_table() -> List[int]:
+    table = []
+    for i in range(256):
+        r = i << 24
+        for _ in range(8):
+            r = ((r << 1) ^ 0x04C11DB7) if r & 0x80000000 else r << 1
+        table.append(r & 0xFFFFFFFF)
+    return table
+
+
+_CRC_TABLE = _crc_table()
+
+
+def _crc(data: bytes) -> int:
+    """Ogg page checksum (CRC-32, polynomial 0x04C11DB7, unreflected, no final XOR)"""
+    crc = 0
+    for byte in data:
+        crc = ((crc << 8) & 0xFFFFFFFF) ^ _CRC_TABLE[(crc >> 24) ^ byte]
+    return crc
+
+
+@dataclass
+class OggPage:
+    """One page of an Ogg bitstream"""
+    flags: int
+    granule: int
+    serial: int
+    lacing: bytes
+    body: bytes
+
+
+def iter_pages(data: bytes) -> Iterator[OggPage]:
+    """Yield the pages of an Ogg file; ValueError if it is not one"""
+    offset = 0
+    while offset < len(data):
+        if offset + _PAGE_HEADER.size > len(data):
+            raise ValueError(f"Truncated Ogg page at byte {offset}")
+        capture, _, flags, granule, serial, _, _, segments = _PAGE_HEADER.unpack_from(data, offset)
+        if capture != b"OggS":
+            raise ValueError(f"No Ogg page at byte {offset}")
+        lacing = data[offset + _PAGE_HEADER.size:offset + _PAGE_HEADER.size + segments]
+        body_start = offset + _PAGE_HEADER.size + segments
+        body_end = body_start + sum(lacing)
+        yield OggPage(flags, granule, serial, lacing, data[body_start:body_end])
+        offset = body_end
+
+
+def packets(data: bytes) -> Tuple[List[bytes], int]:
+    """(packets, final granule position) of a single logical Ogg stream"""
+    result = []
+    current = bytearray()
+    granule = 0
+    for page in iter_pages(data):
+        position = 0
+        for lace in page.lacing:
+            current += page.body[position:position + lace]
+            position += lace
+            if lace < 255:
+                result.append(bytes(current))
+                current = bytearray()
+        if page.granule >= 0:
+            granule = page.granule
+    return result, granule
+
+
+def opus_packet_samples(packet: bytes) -> int:
+    """Samples (at 48 kHz) an Opus packet decodes to, from its TOC byte (RFC 6716 §3.1)"""
+    if not packet:
+        return 0
+    config = packet[0] >> 3
+    if config < 12:
+        frame = (480, 960, 1920, 2880)[config % 4]  # SILK: 10 / 20 / 40 / 60 ms
+    elif config < 16:
+        frame = (480, 960)[config % 2]  # Hybrid: 10 / 20 ms
+    else:
+        frame = (120, 240, 480, 960)[config % 4]  # CELT: 2.5 / 5 / 10 / 20 ms
+
+    code = packet[0] & 0x03
+    if code == 0:
+        frames = 1
+    elif code in (1, 2):
+        frames = 2
+    else:
+        frames = packet[1] & 0x3F
+    return frame * frames
+
+
+def _page(flags: int, granule: int, serial: int, sequence: int, page_packets: List[bytes]) -> bytes:
+    lacing = bytearray()
+    for packet in page_packets:
+        lacing += b"\xff" * (len(packet) // 255) + bytes([len(packet) % 255])
+    header = _PAGE_HEADER.pack(b"OggS", 0, flags, granule, serial, sequence, 0, len(lacing))
+    page = bytearray(header + lacing + b"".join(page_packets))
+    struct.pack_into("<I", page, 22, _crc(page))
+    return bytes(page)
+
+
+def concat_opus(parts: List[bytes]) -> bytes:
+    """Join Ogg Opus files into one logical stream, without re-encoding
+
+    The first file's OpusHead and OpusTags are kept and the audio packets
+    of all files follow them with continuous granule positions, instead of
+    a chained stream (one logical stream per file) that many players stop
+    after or seek wrongly in. The later files' pre-skip samples are played
+    (a few ms of encoder warm-up) and only the last file's end trimming is
+    kept.
+    """
+    if len(parts) == 1:
+        return parts[0]
+
+    serial = next(iter_pages(parts[0])).serial
+    audio: List[Tuple[bytes, int]] = []
+    position = 0
+    head = tags = b""
+    for index, part in enumerate(parts):
+        part_packets, final_granule = packets(part)
+        if len(part_packets) < 2 or not part_packets[0].startswith(b"OpusHead"):
+            raise ValueError(f"Part {index} is not an Ogg Opus stream")
+        if index == 0:
+            head, tags = part_packets[0], part_packets[1]
+        start = position
+        for packet in part_packets[2:]:
+            position += opus_packet_samples(packet)
+            audio.append((packet, position))
+        if index == len(parts) - 1 and audio:
+            audio[-1] = (audio[-1][0], min(position, start + final_granule))
+
+    pages = [_page(_BOS, 0, serial, 0, [head]), _page(0, 0, serial, 1, [tags])]
+    batch: List[bytes] = []
+    segments = size = 0
+    for i, (packet, granule) in enumerate(audio):
+        batch.append(packet)
+        segments += len(packet) // 255 + 1
+        size += len(packet)
+        last = i == len(audio) - 1
+        following = 0 if last else len(audio[i + 1][0]) // 255 + 1
+        if last or size >= _PAGE_TARGET_BYTES or segments + following > 255:
+            pages.append(_page(_EOS if last else 0, granule, serial, len(pages), batch))
+            batch = []
+            segments = size = 0
+    return b"".join(pages)
@@ -0,0 +1,57 @@
+import base64
+import json
+from datetime import datetime
+from typing import Any, Iterator, List, Optional, Tuple
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+# Tie-breaker after created_at, so records with the same timestamp are neither skipped nor repeated
+_DOCUMENT_ID = "__name__"
+
+
+def encode_cursor(created_at: datetime, doc_id: str) -> str:
+    """Opaque cursor pointing just past the given document"""
+    raw = json.dumps({"t": created_at.isoformat(), "id": doc_id}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    """(created_at, document id) of a cursor; ValueError if it is malformed"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        return datetime.fromisoformat(data["t"]), str(data["id"])
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+def fetch_page(query, limit: int, cursor: Optional[str] = None) -> Tuple[List[Any], Optional[str]]:
+    """One page of `query`, newest first, and the cursor of the next page (None on the last page)
+
+    The query is ordered by created_at and document ID and resumed with
+    start_after, so every page costs `limit + 1` reads no matter how deep
+    it is. The extra document only tells whether another page exists.
+    Raises ValueError for a malformed cursor or a limit below 1.
+    """
+    if limit < 1:
+        raise ValueError(f"Page size must be at least 1, got {limit}")
+    query = query.order_by("created_at", direction="DESCENDING").order_by(_DOCUMENT_ID, direction="DESCENDING")
+    if cursor:
+        created_at, doc_id = decode_cursor(cursor)
+        query = query.start_after({"created_at": created_at, _DOCUMENT_ID: doc_id})
+
+    docs = list(query.limit(limit + 1).stream())
+    if len(docs) <= limit:
+        return docs, None
+    docs = docs[:limit]
+    return docs, encode_cursor(docs[-1].get("created_at"), docs[-1].id)
+
+
+def iter_pages(query, page_size: int, cursor: Optional[str] = None) -> Iterator[List[Any]]:
+    """Walk `query` page by page, starting at `cursor`"""
+    while True:
+        docs, cursor = fetch_page(query, page_size, cursor)
+        if docs:
+            yield docs
+        if cursor is None:
+            return
@@ -0,0 +1,214 @@
+from datetime import datetime, timedelta, timezone
+from typing import Optional, List, Dict, Any
+
+from google.cloud import firestore
+
+from config.config import db
+from models.rating_model import RatingType
+from services.unit_of_work import UnitOfWork
+from services.rating_periods import utc_day, rollup_periods, cover_window
+
+SCORES = [1, 2, 3, 4, 5]
+
+
+def empty_aggregate() -> Dict[str, Any]:
+    return {
+        "count": 0,
+        "sum": 0,
+        "histogram": {str(score): 0 for score in SCORES},
+    }
+
+
+def _add(total: Dict[str, Any], aggregate: Dict[str, Any]):
+    total["count"] += aggregate.get("count", 0)
+    total["sum"] += aggregate.get("sum", 0)
+    for score, n in aggregate.get("histogram", {}).items():
+        total["histogram"][score] = total["histogram"].get(score, 0) + n
+
+
+class RatingAggregates:
+    """Pre-computed rating statistics (count, sum, 1-5 histogram), one document per scope
+
+    Scopes are per rating type, per user and per user and type, so each
+    statistics query reads one document; statistics across all users add
+    up the per-type documents. Alongside the all-time aggregates, rollup
+    documents count ratings per scope and UTC day, week and month for
+    windowed statistics. Every rating write updates the affected documents
+    inside the same transaction (see RatingService) with increments only,
+    so concurrent ratings never contend on them; `rebuild` recomputes all
+    of them from the ratings collection.
+    """
+
+    def __init__(self):
+        self.db = db
+        self.collection = "rating_aggregates"
+        self.rollup_collection = "rating_rollups"
+        self.ratings_collection = "ratings"
+
+    @staticmethod
+    def doc_id(user_id: Optional[str] = None, rating_type: Optional[str] = None) -> str:
+        if user_id and rating_type:
+            return f"user_{user_id}_type_{rating_type}"
+        if user_id:
+            return f"user_{user_id}"
+        if rating_type:
+            return f"type_{rating_type}"
+        raise ValueError("Aggregates are kept per user and / or rating type")
+
+    def _scope_ids(self, user_id: Optional[str], rating_type: Optional[str]) -> List[str]:
+        """Aggregate documents that together cover a query; all users means every rating type"""
+        if user_id or rating_type:
+            return [self.doc_id(user_id, rating_type)]
+        return [self.doc_id(rating_type=t.value) for t in RatingType]
+
+    def _scopes(self, rating: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+        """doc id -> scope fields of every aggregate a rating counts towards"""
+        user_id = rating["user_id"]
+        rating_type = getattr(rating["rating_type"], "value", rating["rating_type"])
+        scopes = [
+            {"scope": "type", "rating_type": rating_type},
+            {"scope": "user", "user_id": user_id},
+            {"scope": "user_type", "user_id": user_id, "rating_type": rating_type},
+        ]
+        return {self.doc_id(s.get("user_id"), s.get("rating_type")): s for s in scopes}
+
+    def _ref(self, doc_id: str):
+        return self.db.collection(self.collection).document(doc_id)
+
+    def _rollup_ref(self, rollup_id: str):
+        return self.db.collection(self.rollup_collection).document(rollup_id)
+
+    @staticmethod
+    def rollup_id(scope_id: str, tier: str, period: str) -> str:
+        return f"{scope_id}_{tier}_{period}"
+
+    def _rollups(self, rating: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+        """rollup id -> fields of every rollup bucket a rating counts towards"""
+        periods = rollup_periods(utc_day(rating["created_at"]))
+        return {
+            self.rollup_id(doc_id, tier, period): {
+                **scope,
+                "tier": tier,
+                "period": period,
+                "period_start": datetime.combine(start, datetime.min.time(), tzinfo=timezone.utc),
+            }
+            for doc_id, scope in self._scopes(rating).items()
+            for tier, period, start in periods
+        }
+
+    def get(self, user_id: Optional[str] = None, rating_type: Optional[str] = None) -> Dict[str, Any]:
+        total = empty_aggregate()
+        for doc in self.db.get_all([self._ref(doc_id) for doc_id in self._scope_ids(user_id, rating_type)]):
+            if doc.exists:
+                _add(total, doc.to_dict())
+        return total
+
+    def get_window(self, user_id: Optional[str] = None, rating_type: Optional[str] = None,
+                   days: int = 30, now: Optional[datetime] = None) -> Dict[str, Any]:
+        """count / sum / histogram of the ratings in the last `days` UTC days, today included"""
+        end = utc_day(now or datetime.now(timezone.utc))
+        start = end - timedelta(days=days - 1)
+        scope_ids = self._scope_ids(user_id, rating_type)
+        refs = [
+            self._rollup_ref(self.rollup_id(scope_id, tier, period))
+            for scope_id in scope_ids
+            for tier, period in cover_window(start, end)
+        ]
+
+        window = empty_aggregate()
+        for doc in self.db.get_all(refs):
+            if doc.exists:
+                _add(window, doc.to_dict())
+        return window
+
+    def apply(self, uow: UnitOfWork, old: Optional[Dict[str, Any]] = None,
+              new: Optional[Dict[str, Any]] = None):
+        """Move a rating from `old` to `new` (None for create / delete) in every affected aggregate
+
+        Aggregates and rollup buckets are updated with increments, so this
+        reads nothing and the documents never become a transaction hotspot.
+        """
+        changes: Dict[Any, List] = {}
+        for rating, sign in ((old, -1), (new, 1)):
+            if rating is None:
+                continue
+            for doc_id, scope in self._scopes(rating).items():
+                changes.setdefault(self._ref(doc_id), [scope, []])[1].append((sign, rating["score"]))
+            if rating.get("created_at"):
+                for rollup_id, fields in self._rollups(rating).items():
+                    changes.setdefault(self._rollup_ref(rollup_id), [fields, []])[1].append((sign, rating["score"]))
+
+        now = datetime.now(timezone.utc)
+        for ref, (fields, deltas) in changes.items():
+            count = sum(sign for sign, _ in deltas)
+            total = sum(sign * score for sign, score in deltas)
+            histogram: Dict[str, int] = {}
+            for sign, score in deltas:
+                histogram[str(score)] = histogram.get(str(score), 0) + sign
+            histogram = {score: n for score, n in histogram.items() if n}
+            if not count and not histogram:
+                continue
+            uow.set(ref, {
+                **fields,
+                "count": firestore.Increment(count),
+                "sum": firestore.Increment(total),
+                "histogram": {score: firestore.Increment(n) for score, n in histogram.items()},
+                "updated_at": now,
+            }, merge=True)
+
+    def rebuild(self) -> Dict[str, int]:
+        """Recompute every aggregate from the ratings collection
+
+        Ratings written while this runs may be counted twice or not at all;
+        run it when rating traffic is quiet.
+        """
+        aggregates: Dict[str, Dict[str, Any]] = {}
+        rollups: Dict[str, Dict[str, Any]] = {}
+        ratings = 0
+        query = self.db.collection(self.ratings_collection).select(
+            ["user_id", "rating_type", "score", "created_at"]
+        )
+        for doc in query.stream():
+            rating = doc.to_dict()
+            if not rating.get("user_id") or not rating.get("rating_type") or rating.get("score") not in SCORES:
+                continue
+            ratings += 1
+            for doc_id, scope in self._scopes(rating).items():
+                aggregate = aggregates.setdefault(doc_id, {**scope, **empty_aggregate()})
+                aggregate["count"] += 1
+                aggregate["sum"] += rating["score"]
+                aggregate["histogram"][str(rating["score"])] += 1
+            if rating.get("created_at"):
+                for rollup_id, fields in self._rollups(rating).items():
+                    rollup = rollups.setdefault(rollup_id, {**fields, **empty_aggregate()})
+                    rollup["count"] += 1
+                    rollup["sum"] += rating["score"]
+                    rollup["histogram"][str(rating["score"])] += 1
+
+        now = datetime.now(timezone.utc)
+        stale = [doc.id for doc in self.db.collection(self.collection).select([]).stream()
+                 if doc.id not in aggregates]
+        stale_rollups = [doc.id for doc in self.db.collection(self.rollup_collection).select([]).stream()
+                         if doc.id not in rollups]
+        with UnitOfWork(self.db) as uow:
+            for doc_id, aggregate in aggregates.items():
+                aggregate["updated_at"] = now
+                uow.set(self._ref(doc_id), aggregate)
+            for rollup_id, rollup in rollups.items():
+                rollup["updated_at"] = now
+                uow.set(self._rollup_ref(rollup_id), rollup)
+            for doc_id in stale:
+                uow.delete(self._ref(doc_id))
+            for rollup_id in stale_rollups:
+                uow.delete(self._rollup_ref(rollup_id))
+
+        return {
+            "ratings": ratings,
+            "aggregates": len(aggregates),
+            "rollups": len(rollups),
+            "removed": len(stale) + len(stale_rollups),
+        }
+
+
+# 创建全局实例
+rating_aggregates = RatingAggregates()
@@ -0,0 +1,47 @@
+from datetime import date, datetime, timedelta, timezone
+from typing import List, Tuple
+
+
+def utc_day(value: datetime) -> date:
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc).date()
+
+
+def _next_month(day: date) -> date:
+    return (day.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def rollup_periods(day: date) -> List[Tuple[str, str, date]]:
+    """(tier, period key, period start) of the day, week (from Monday) and month buckets containing a UTC day"""
+    week_start = day - timedelta(days=day.weekday())
+    return [
+        ("day", day.isoformat(), day),
+        ("week", week_start.isoformat(), week_start),
+        ("month", day.strftime("%Y-%m"), day.replace(day=1)),
+    ]
+
+
+def cover_window(start: date, end: date) -> List[Tuple[str, str]]:
+    """Fewest (tier, period key) buckets that exactly cover the UTC days start..end
+
+    Whole months inside the window are read as one bucket, then whole
+    weeks, then single days, so a 365-day window needs about 30 buckets.
+    """
+    buckets = []
+    day = start
+    while day <= end:
+        next_month = _next_month(day)
+        if day.day == 1 and next_month - timedelta(days=1) <= end:
+            buckets.append(("month", day.strftime("%Y-%m")))
+            day = next_month
+        elif day.weekday() == 0 and day + timedelta(days=6) <= end and (
+            # A week running into a month the window covers whole would split that month up
+            day + timedelta(days=6) < next_month or _next_month(next_month) - timedelta(days=1) > end
+        ):
+            buckets.append(("week", day.isoformat()))
+            day += timedelta(days=7)
+        else:
+            buckets.append(("day", day.isoformat()))
+            day += timedelta(days=1)
+    return buckets
@@ -1,9 +1,13 @@
 import uuid
-from datetime import datetime, timezone
-from typing import Optional, List, Dict, Any
+from datetime import datetime, timedelta, timezone
+from typing import Optional, List, Dict, Any, Iterator, Tuple
 
 from models.rating_model import RatingRecord, RatingType, RatingStatistics
 from config.config import db
+from services.feedback_profile_service import FeedbackProfileService
+from services.unit_of_work import UnitOfWork, run_in_transaction
+from services.rating_aggregates import rating_aggregates
+from services.pagination import fetch_page, iter_pages
 
 
 class RatingService:
@@ -14,6 +18,7 @@ class RatingService:
         self.ratings_collection = "ratings"
         self.feedback_collection = "user_feedback"
         self.meditation_records_collection = "meditation_records"
+        self.profile_service = FeedbackProfileService()
 
     def create_rating(
         self, 
@@ -40,16 +45,28 @@ class RatingService:
             updated_at=now,
         )
 
-        # Store rating record
-        self.db.collection(self.ratings_collection).document(rating_id).set(rating_record.dict())
+        rating_data = rating_record.dict()
 
-        # Update meditation record if linked
-        if meditation_record_id:
-            self._update_meditation_record_rating(meditation_record_id, score, comment, feedback_tags)
+        # The rating, its aggregates, the linked meditation record and the feedback entry commit in one transaction
+        def write(transaction, uow):
+            record_doc = None
+            if meditation_record_id:
+                record_doc = self.db.collection(self.meditation_records_collection).document(
+                    meditation_record_id
+                ).get(transaction=transaction)
 
-        # Store feedback for optimization
-        if feedback_tags and len(feedback_tags) > 0:
-            self._store_feedback_for_optimization(user_id, score, feedback_tags, comment)
+            rating_aggregates.apply(uow, new=rating_data)
+            uow.set(self.db.collection(self.ratings_collection).document(rating_id), rating_data)
+
+            # Update meditation record if linked
+            if record_doc is not None:
+                self._update_meditation_record_rating(uow, record_doc, score, comment, feedback_tags)
+
+            # Store feedback for optimization; the feedback worker picks it up to refresh the user's profile
+            self._store_feedback_for_optimization(user_id, score, feedback_tags or [], comment, rating_id)
+            self.profile_service.mark_ratings_changed(uow, user_id)
+
+        run_in_transaction(write, self.db)
 
         return {
             "rating_id": rating_id,
@@ -65,43 +82,44 @@ class RatingService:
 
     def _update_meditation_record_rating(
         self, 
-        record_id: str, 
+        uow: UnitOfWork,
+        record_doc,
         score: int, 
         comment: Optional[str] = None,
         feedback_tags: Optional[List[str]] = None
     ):
-        """Update meditation record with rating information"""
-        try:
-            doc_ref = self.db.collection(self.meditation_records_collection).document(record_id)
-            doc = doc_ref.get()
-            
-            if doc.exists:
-                update_data = {
-                    "score": score,
-                    "feedback": comment,
-                    "is_rated": True,
-                    "rated_at": datetime.now(timezone.utc),
-                    "feedback_tags": feedback_tags
-                }
-                doc_ref.update(update_data)
-                print(f"✅ Updated meditation record {record_id} with rating")
-            else:
-                print(f"⚠️ Meditation record {record_id} not found")
-        except Exception as e:
-            print(f"❌ Failed to update meditation record: {e}")
+        """Update meditation record with rating information
+
+        `record_doc` is the record as read through the rating's transaction;
+        the update commits with it, so a failure fails the whole rating.
+        """
+        if not record_doc.exists:
+            print(f"⚠️ Meditation record {record_doc.id} not found")
+            return
+
+        update_data = {
+            "score": score,
+            "feedback": comment,
+            "is_rated": True,
+            "rated_at": datetime.now(timezone.utc),
+            "feedback_tags": feedback_tags
+        }
+        uow.update(record_doc.reference, update_data)
 
     def _store_feedback_for_optimization(
         self, 
         user_id: str, 
         score: int, 
         feedback_tags: List[str], 
-        comment: Optional[str] = None
+        comment: Optional[str] = None,
+        rating_id: Optional[str] = None
     ):
         """Store user feedback for generation quality optimization"""
         try:
             feedback_id = str(uuid.uuid4())
             feedback_data = {
                 "feedback_id": feedback_id,
+                "rating_id": rating_id,
                 "user_id": user_id,
                 "score": score,
                 "feedback_tags": feedback_tags,
@@ -110,7 +128,8 @@ class RatingService:
                 "processed": False
             }
             
-            self.db.collection(self.feedback_collection).document(feedback_id).set(feedback_data)
+            with UnitOfWork(self.db) as uow:
+                uow.set(self.db.collection(self.feedback_collection).document(feedback_id), feedback_data)
             print(f"✅ Stored feedback for optimization: {feedback_tags}")
         except Exception as e:
             print(f"❌ Failed to store feedback: {e}")
@@ -123,25 +142,49 @@ class RatingService:
     ) -> List[Dict[str, Any]]:
         """Get user ratings with optional filtering"""
         try:
-            query = self.db.collection(self.ratings_collection).where("user_id", "==", user_id)
-            
-            if rating_type:
-                query = query.where("rating_type", "==", rating_type.value)
-            
-            query = query.order_by("created_at", direction="DESCENDING").limit(limit)
-            docs = query.stream()
-            
-            ratings = []
-            for doc in docs:
-                rating_data = doc.to_dict()
-                rating_data["rating_id"] = doc.id
-                ratings.append(rating_data)
-            
+            ratings, _ = self.get_user_ratings_page(user_id, rating_type, limit)
             return ratings
         except Exception as e:
             print(f"❌ Failed to get user ratings: {e}")
             return []
 
+    def _user_ratings_query(self, user_id: str, rating_type: Optional[RatingType] = None):
+        query = self.db.collection(self.ratings_collection).where("user_id", "==", user_id)
+        if rating_type:
+            query = query.where("rating_type", "==", rating_type.value)
+        return query
+
+    @staticmethod
+    def _rating_from_doc(doc) -> Dict[str, Any]:
+        rating_data = doc.to_dict()
+        rating_data["rating_id"] = doc.id
+        return rating_data
+
+    def get_user_ratings_page(
+        self,
+        user_id: str,
+        rating_type: Optional[RatingType] = None,
+        limit: int = 50,
+        cursor: Optional[str] = None
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """One page of user ratings, newest first, and the next page's cursor (None on the last page)
+
+        Raises ValueError for a malformed cursor.
+        """
+        docs, next_cursor = fetch_page(self._user_ratings_query(user_id, rating_type), limit, cursor)
+        return [self._rating_from_doc(doc) for doc in docs], next_cursor
+
+    def iter_user_ratings(
+        self,
+        user_id: str,
+        rating_type: Optional[RatingType] = None,
+        page_size: int = 50,
+        cursor: Optional[str] = None
+    ) -> Iterator[List[Dict[str, Any]]]:
+        """Walk all of a user's ratings page by page"""
+        for docs in iter_pages(self._user_ratings_query(user_id, rating_type), page_size, cursor):
+            yield [self._rating_from_doc(doc) for doc in docs]
+
     def get_rating_by_id(self, rating_id: str) -> Optional[Dict[str, Any]]:
         """Get rating by ID"""
         try:
@@ -165,26 +208,24 @@ class RatingService:
         """Update existing rating"""
         try:
             doc_ref = self.db.collection(self.ratings_collection).document(rating_id)
-            doc = doc_ref.get()
-            
-            if not doc.exists:
-                return None
-            
             update_data = {
                 "score": score,
                 "comment": comment,
                 "feedback_tags": feedback_tags,
                 "updated_at": datetime.now(timezone.utc)
             }
-            
-            doc_ref.update(update_data)
-            
-            # Get updated document
-            updated_doc = doc_ref.get()
-            rating_data = updated_doc.to_dict()
-            rating_data["rating_id"] = updated_doc.id
-            
-            return rating_data
+
+            def write(transaction, uow):
+                doc = doc_ref.get(transaction=transaction)
+                if not doc.exists:
+                    return None
+                old = doc.to_dict()
+                rating_aggregates.apply(uow, old=old, new={**old, "score": score})
+                uow.update(doc_ref, update_data)
+                self.profile_service.mark_ratings_changed(uow, old["user_id"])
+                return {**old, **update_data, "rating_id": rating_id}
+
+            return run_in_transaction(write, self.db)
         except Exception as e:
             print(f"❌ Failed to update rating: {e}")
             return None
@@ -192,67 +233,96 @@ class RatingService:
     def delete_rating(self, rating_id: str) -> bool:
         """Delete rating"""
         try:
-            self.db.collection(self.ratings_collection).document(rating_id).delete()
+            doc_ref = self.db.collection(self.ratings_collection).document(rating_id)
+
+            def write(transaction, uow):
+                doc = doc_ref.get(transaction=transaction)
+                if not doc.exists:
+                    return None
+                rating = doc.to_dict()
+                rating_aggregates.apply(uow, old=rating)
+                uow.delete(doc_ref)
+                self.profile_service.mark_ratings_changed(uow, rating["user_id"])
+
+            run_in_transaction(write, self.db)
             return True
         except Exception as e:
             print(f"❌ Failed to delete rating: {e}")
             return False
 
+    @staticmethod
+    def _empty_statistics() -> Dict[str, Any]:
+        return {
+            "total_ratings": 0,
+            "average_score": 0.0,
+            "score_distribution": {1: 0, 2: 0, 3: 0, 4: 0, 5: 0},
+            "recent_ratings": []
+        }
+
+    def _recent_ratings(
+        self,
+        user_id: Optional[str] = None,
+        rating_type: Optional[RatingType] = None,
+        since: Optional[datetime] = None,
+        limit: int = 10
+    ) -> List[Dict[str, Any]]:
+        query = self.db.collection(self.ratings_collection)
+        if user_id:
+            query = query.where("user_id", "==", user_id)
+        if rating_type:
+            query = query.where("rating_type", "==", rating_type.value)
+        if since is not None:
+            query = query.where("created_at", ">=", since)
+        query = query.order_by("created_at", direction="DESCENDING").limit(limit)
+        return [self._rating_from_doc(doc) for doc in query.stream()]
+
+    @staticmethod
+    def _statistics(aggregate: Dict[str, Any], recent_ratings: List[Dict[str, Any]]) -> Dict[str, Any]:
+        count = aggregate["count"]
+        return {
+            "total_ratings": count,
+            "average_score": aggregate["sum"] / count if count else 0.0,
+            "score_distribution": {int(score): n for score, n in aggregate["histogram"].items()},
+            "recent_ratings": recent_ratings
+        }
+
     def get_rating_statistics(
         self, 
         user_id: Optional[str] = None,
-        rating_type: Optional[RatingType] = None
+        rating_type: Optional[RatingType] = None,
+        days: Optional[int] = None
     ) -> Dict[str, Any]:
-        """Get rating statistics"""
+        """Get rating statistics from the pre-computed aggregates
+
+        With `days`, only ratings from the last `days` UTC days (today
+        included) are counted, summed from the day / week / month rollups.
+        """
         try:
-            query = self.db.collection(self.ratings_collection)
-            
-            if user_id:
-                query = query.where("user_id", "==", user_id)
-            if rating_type:
-                query = query.where("rating_type", "==", rating_type.value)
-            
-            docs = list(query.stream())
-            
-            if not docs:
-                return {
-                    "total_ratings": 0,
-                    "average_score": 0.0,
-                    "score_distribution": {},
-                    "recent_ratings": []
-                }
-            
-            scores = []
-            score_distribution = {1: 0, 2: 0, 3: 0, 4: 0, 5: 0}
+            type_value = rating_type.value if rating_type else None
+            if days is None:
+                aggregate = rating_aggregates.get(user_id, type_value)
+                recent_ratings = self._recent_ratings(user_id, rating_type) if aggregate["count"] else []
+                return self._statistics(aggregate, recent_ratings)
+
+            now = datetime.now(timezone.utc)
+            aggregate = rating_aggregates.get_window(user_id, type_value, days, now)
+            window_start = datetime.combine(now.date() - timedelta(days=days - 1), datetime.min.time(),
+                                            tzinfo=timezone.utc)
             recent_ratings = []
-            
-            for doc in docs:
-                data = doc.to_dict()
-                scores.append(data["score"])
-                score_distribution[data["score"]] += 1
-                
-                # Add to recent ratings (limit to 10)
-                if len(recent_ratings) < 10:
-                    data["rating_id"] = doc.id
-                    recent_ratings.append(data)
-            
-            # Sort recent ratings by created_at
-            recent_ratings.sort(key=lambda x: x.get("created_at", datetime.min), reverse=True)
-            
-            return {
-                "total_ratings": len(scores),
-                "average_score": sum(scores) / len(scores) if scores else 0.0,
-                "score_distribution": score_distribution,
-                "recent_ratings": recent_ratings[:10]
-            }
+            if aggregate["count"]:
+                recent_ratings = self._recent_ratings(user_id, rating_type, window_start)
+            return self._statistics(aggregate, recent_ratings)
         except Exception as e:
             print(f"❌ Failed to get rating statistics: {e}")
-            return {
-                "total_ratings": 0,
-                "average_score": 0.0,
-                "score_distribution": {},
-                "recent_ratings": []
-            }
+            return self._empty_statistics()
+
+    def get_all_ratings_statistics(
+        self,
+        rating_type: Optional[RatingType] = None,
+        days: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """Statistics across all users, optionally for one rating type and the last `days` days"""
+        return self.get_rating_statistics(rating_type=rating_type, days=days)
 
     def get_user_feedback_preferences(self, user_id: str) -> Dict[str, Any]:
         """Get user's feedback preferences for generation optimization"""
@@ -0,0 +1,149 @@
+import os
+import re
+import time
+import copy
+import hashlib
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple
+
+SCRIPT_CACHE_ENABLED = os.getenv("SCRIPT_CACHE_ENABLED", "true").lower() == "true"
+SCRIPT_CACHE_MAX_ENTRIES = int(os.getenv("SCRIPT_CACHE_MAX_ENTRIES", "1000"))
+SCRIPT_CACHE_TTL_SECONDS = float(os.getenv("SCRIPT_CACHE_TTL_SECONDS", "3600"))
+
+
+class ScriptCacheBackend(ABC):
+    """Storage interface for cached scripts
+
+    Implement this for a shared store (e.g. Redis or Firestore) so that all
+    workers see the same entries; values are plain JSON-serializable dicts.
+    """
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    def set(self, key: str, value: Dict[str, Any], ttl: float):
+        ...
+
+    @abstractmethod
+    def delete(self, key: str):
+        ...
+
+    @abstractmethod
+    def clear(self):
+        ...
+
+    @abstractmethod
+    def __len__(self) -> int:
+        ...
+
+
+class InMemoryScriptCacheBackend(ScriptCacheBackend):
+    """In-process LRU backend with per-entry TTL"""
+
+    def __init__(self, max_entries: int = SCRIPT_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                return None
+
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Dict[str, Any], ttl: float):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class ScriptCache:
+    """Cache of generated meditation scripts keyed on normalized user input"""
+
+    def __init__(
+        self,
+        backend: Optional[ScriptCacheBackend] = None,
+        ttl: float = SCRIPT_CACHE_TTL_SECONDS,
+        enabled: bool = SCRIPT_CACHE_ENABLED,
+    ):
+        self.backend = backend if backend is not None else InMemoryScriptCacheBackend()
+        self.ttl = ttl
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        """Lowercase, drop punctuation and collapse whitespace"""
+        text = re.sub(r"[^\w\s]", " ", text.lower())
+        return " ".join(text.split())
+
+    def make_key(self, mood: str, description: str, template_version: str) -> str:
+        raw = "\x1f".join([template_version, self.normalize(mood), self.normalize(description)])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        if not self.enabled:
+            return None
+
+        value = self.backend.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return copy.deepcopy(value)
+
+    def set(self, key: str, value: Dict[str, Any]):
+        if not self.enabled:
+            return
+        self.backend.set(key, copy.deepcopy(value), self.ttl)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        stats = {
+            "enabled": self.enabled,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "entries": len(self.backend),
+            "ttl_seconds": self.ttl,
+        }
+        if isinstance(self.backend, InMemoryScriptCacheBackend):
+            stats["max_entries"] = self.backend.max_entries
+            stats["evictions"] = self.backend.evictions
+            stats["expirations"] = self.backend.expirations
+        return stats
+
+
+# 创建全局实例
+script_cache = ScriptCache()
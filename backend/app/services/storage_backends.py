@@ -0,0 +1,415 @@
+import os
+import time
+import tempfile
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Any, Optional, List, Iterator
+
+AUDIO_STORAGE_BACKEND = os.getenv("AUDIO_STORAGE_BACKEND", "gcs")  # gcs / local / memory
+AUDIO_STORAGE_CONCURRENCY = int(os.getenv("AUDIO_STORAGE_CONCURRENCY", "8"))
+AUDIO_BUCKET_NAME = os.getenv("AUDIO_BUCKET_NAME", "mindtuner-8804e.firebasestorage.app")
+AUDIO_SIGNED_URLS = os.getenv("AUDIO_SIGNED_URLS", "false").lower() == "true"
+AUDIO_SIGNED_URL_TTL = int(os.getenv("AUDIO_SIGNED_URL_TTL", str(7 * 24 * 3600)))  # v4 signed URLs max out at 7 days
+AUDIO_LOCAL_DIR = os.getenv("AUDIO_LOCAL_DIR", "audio_storage")
+AUDIO_LOCAL_BASE_URL = os.getenv("AUDIO_LOCAL_BASE_URL", "")  # empty uses file:// URLs
+# Reused objects get their updated time bumped at most this often (per process); must stay
+# well below the audio GC grace period, which measures age from the last bump
+AUDIO_TOUCH_INTERVAL = float(os.getenv("AUDIO_TOUCH_INTERVAL", str(24 * 3600)))
+_TOUCHED_MAX = 10000
+
+
+@dataclass
+class StoredObject:
+    name: str
+    size: int
+    updated: datetime
+    version: Any = None  # changes whenever the object is rewritten or touched
+
+
+class StorageBackend(ABC):
+    """Where synthesized audio is stored and how it is addressed
+
+    Implementations are synchronous (they are called from worker threads);
+    at most `concurrency` operations run against the backend at once.
+    """
+
+    name = "base"
+
+    def __init__(self, concurrency: int = AUDIO_STORAGE_CONCURRENCY,
+                 touch_interval: float = AUDIO_TOUCH_INTERVAL):
+        self.concurrency = concurrency
+        self.touch_interval = touch_interval
+        self._slots = threading.BoundedSemaphore(concurrency)
+        self._touched: "OrderedDict[str, float]" = OrderedDict()
+        self._touched_lock = threading.Lock()
+        self._counters_lock = threading.Lock()
+        self.uploads = 0
+        self.uploaded_bytes = 0
+        self.lookups = 0
+        self.touches = 0
+
+    def upload(self, name: str, content: bytes, content_type: str) -> str:
+        """Store the object and return the URL clients should use"""
+        with self._slots:
+            url = self._upload(name, content, content_type)
+        with self._counters_lock:
+            self.uploads += 1
+            self.uploaded_bytes += len(content)
+        return url
+
+    def find(self, name: str, touch: bool = False) -> Optional[str]:
+        """URL of the object if it is already stored, otherwise None
+
+        With `touch` the object is being reused, and its updated time is
+        bumped (at most once per touch_interval) so the audio GC, which
+        measures age from it, does not delete it while it is handed out.
+        """
+        with self._counters_lock:
+            self.lookups += 1
+        with self._slots:
+            if not touch or not self._touch_due(name):
+                return self._find(name)
+            url = self._touch(name)
+        if url is not None:
+            with self._counters_lock:
+                self.touches += 1
+            with self._touched_lock:
+                self._touched[name] = time.monotonic()
+                while len(self._touched) > _TOUCHED_MAX:
+                    self._touched.popitem(last=False)
+        return url
+
+    def _touch_due(self, name: str) -> bool:
+        with self._touched_lock:
+            touched_at = self._touched.get(name)
+        return touched_at is None or time.monotonic() - touched_at >= self.touch_interval
+
+    def stat(self, name: str) -> Optional[StoredObject]:
+        """Listing entry of a single object, or None if it does not exist"""
+        with self._slots:
+            return self._stat(name)
+
+    def delete(self, name: str, if_version: Any = None) -> bool:
+        """Delete the object; with `if_version`, only if it is unchanged since it was listed
+
+        Returns False when the object was changed (e.g. touched) or is already gone.
+        """
+        with self._slots:
+            deleted = self._delete(name, if_version)
+        if deleted:
+            with self._touched_lock:
+                self._touched.pop(name, None)
+        return deleted
+
+    @abstractmethod
+    def list_pages(self, prefix: str, start_after: Optional[str] = None,
+                   page_size: int = 1000) -> Iterator[List[StoredObject]]:
+        """Objects under prefix in name order, one page at a time, optionally resuming after a name"""
+
+    @abstractmethod
+    def url_for(self, name: str) -> str:
+        """The URL upload() returns for the object, without touching the network"""
+
+    def resolve_url(self, url: Optional[str]) -> Optional[str]:
+        """URL a client can fetch for a URL returned by upload() / find()
+
+        Those are what records store; backends whose stored URLs are not
+        directly fetchable (signed GCS mode) translate them here, at read time.
+        """
+        return url
+
+    def resolve_urls(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        """Copy of a record / response dict with its audio_url and playlist_url resolved"""
+        resolved = dict(data)
+        for field in ("audio_url", "playlist_url"):
+            if resolved.get(field):
+                resolved[field] = self.resolve_url(resolved[field])
+        return resolved
+
+    @abstractmethod
+    def _upload(self, name: str, content: bytes, content_type: str) -> str:
+        ...
+
+    @abstractmethod
+    def _find(self, name: str) -> Optional[str]:
+        ...
+
+    @abstractmethod
+    def _touch(self, name: str) -> Optional[str]:
+        """Bump the object's updated time and return its URL, or None if it does not exist"""
+
+    @abstractmethod
+    def _stat(self, name: str) -> Optional[StoredObject]:
+        ...
+
+    @abstractmethod
+    def _delete(self, name: str, if_version: Any = None) -> bool:
+        ...
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": self.name,
+            "concurrency": self.concurrency,
+            "uploads": self.uploads,
+            "uploaded_bytes": self.uploaded_bytes,
+            "lookups": self.lookups,
+            "touches": self.touches,
+        }
+
+
+class GCSStorageBackend(StorageBackend):
+    """Google Cloud Storage, one request per upload
+
+    Objects are written with a publicRead predefined ACL (instead of a
+    separate make_public call) or, with `signed_urls`, kept private. In
+    that mode upload() / find() return a stable gs://bucket/name reference,
+    which is what records store, and resolve_url() turns it into a V4
+    signed URL each time it is served, so saved audio never expires.
+    """
+
+    name = "gcs"
+
+    def __init__(self, client=None, bucket_name: str = AUDIO_BUCKET_NAME,
+                 signed_urls: bool = AUDIO_SIGNED_URLS, signed_url_ttl: int = AUDIO_SIGNED_URL_TTL,
+                 concurrency: int = AUDIO_STORAGE_CONCURRENCY):
+        super().__init__(concurrency)
+        if client is None:
+            from config.config import storage_client
+            client = storage_client
+        self.client = client
+        self.bucket_name = bucket_name
+        self.signed_urls = signed_urls
+        self.signed_url_ttl = signed_url_ttl
+
+    def _blob(self, name: str):
+        return self.client.bucket(self.bucket_name).blob(name)
+
+    def _url(self, blob) -> str:
+        return self.url_for(blob.name)
+
+    def _upload(self, name: str, content: bytes, content_type: str) -> str:
+        blob = self._blob(name)
+        if self.signed_urls:
+            blob.upload_from_string(content, content_type=content_type)
+        else:
+            blob.upload_from_string(content, content_type=content_type, predefined_acl="publicRead")
+        return self._url(blob)
+
+    def _find(self, name: str) -> Optional[str]:
+        blob = self._blob(name)
+        return self._url(blob) if blob.exists() else None
+
+    def _touch(self, name: str) -> Optional[str]:
+        from google.api_core.exceptions import NotFound
+
+        blob = self._blob(name)
+        blob.metadata = {"last_used": datetime.now(timezone.utc).isoformat()}
+        try:
+            # A metadata patch bumps `updated` and the metageneration
+            blob.patch()
+        except NotFound:
+            return None
+        return self._url(blob)
+
+    @staticmethod
+    def _stored_object(blob) -> StoredObject:
+        return StoredObject(blob.name, blob.size or 0, blob.updated, blob.metageneration)
+
+    def _stat(self, name: str) -> Optional[StoredObject]:
+        blob = self.client.bucket(self.bucket_name).get_blob(name)
+        return self._stored_object(blob) if blob is not None else None
+
+    def _delete(self, name: str, if_version: Any = None) -> bool:
+        from google.api_core.exceptions import NotFound, PreconditionFailed
+
+        try:
+            self._blob(name).delete(if_metageneration_match=if_version)
+            return True
+        except (NotFound, PreconditionFailed):
+            return False
+
+    def list_pages(self, prefix: str, start_after: Optional[str] = None,
+                   page_size: int = 1000) -> Iterator[List[StoredObject]]:
+        # start_offset is inclusive, so the resume point itself is skipped below
+        blobs = self.client.list_blobs(
+            self.bucket_name, prefix=prefix, start_offset=start_after, page_size=page_size
+        )
+        for page in blobs.pages:
+            objects = [self._stored_object(blob) for blob in page if blob.name != start_after]
+            if objects:
+                yield objects
+
+    def url_for(self, name: str) -> str:
+        if self.signed_urls:
+            return f"gs://{self.bucket_name}/{name}"
+        return self._blob(name).public_url
+
+    def resolve_url(self, url: Optional[str]) -> Optional[str]:
+        prefix = f"gs://{self.bucket_name}/"
+        if not self.signed_urls or not url or not url.startswith(prefix):
+            return url
+        return self._blob(url[len(prefix):]).generate_signed_url(
+            version="v4", expiration=timedelta(seconds=self.signed_url_ttl), method="GET"
+        )
+
+
+class LocalStorageBackend(StorageBackend):
+    """Files under a local directory, for offline runs and benchmarks"""
+
+    name = "local"
+
+    def __init__(self, directory: str = AUDIO_LOCAL_DIR, base_url: str = AUDIO_LOCAL_BASE_URL,
+                 concurrency: int = AUDIO_STORAGE_CONCURRENCY):
+        super().__init__(concurrency)
+        self.directory = os.path.abspath(directory)
+        self.base_url = base_url.rstrip("/")
+
+    def path(self, name: str) -> str:
+        path = os.path.abspath(os.path.join(self.directory, name))
+        if not path.startswith(self.directory + os.sep):
+            raise ValueError(f"Invalid object name: {name}")
+        return path
+
+    def _url(self, name: str) -> str:
+        if self.base_url:
+            return f"{self.base_url}/{name}"
+        return f"file://{self.path(name)}"
+
+    def _upload(self, name: str, content: bytes, content_type: str) -> str:
+        path = self.path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Each writer gets its own temp file, so concurrent uploads of one name cannot interleave
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(content)
+            os.chmod(tmp_path, 0o644)  # mkstemp creates 0600; the files are served
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except FileNotFoundError:
+                pass
+            raise
+        return self._url(name)
+
+    def _find(self, name: str) -> Optional[str]:
+        return self._url(name) if os.path.exists(self.path(name)) else None
+
+    def _touch(self, name: str) -> Optional[str]:
+        try:
+            os.utime(self.path(name))
+        except FileNotFoundError:
+            return None
+        return self._url(name)
+
+    def _stat(self, name: str) -> Optional[StoredObject]:
+        try:
+            stat_result = os.stat(self.path(name))
+        except FileNotFoundError:
+            return None
+        updated = datetime.fromtimestamp(stat_result.st_mtime, tz=timezone.utc)
+        return StoredObject(name, stat_result.st_size, updated, stat_result.st_mtime_ns)
+
+    def _delete(self, name: str, if_version: Any = None) -> bool:
+        path = self.path(name)
+        try:
+            if if_version is not None and os.stat(path).st_mtime_ns != if_version:
+                return False
+            os.remove(path)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def list_pages(self, prefix: str, start_after: Optional[str] = None,
+                   page_size: int = 1000) -> Iterator[List[StoredObject]]:
+        names = []
+        for root, _, files in os.walk(self.directory):
+            for file_name in files:
+                if file_name.endswith(".tmp"):
+                    continue
+                name = os.path.relpath(os.path.join(root, file_name), self.directory).replace(os.sep, "/")
+                if name.startswith(prefix) and (start_after is None or name > start_after):
+                    names.append(name)
+        names.sort()
+
+        for i in range(0, len(names), page_size):
+            page = [obj for obj in map(self._stat, names[i:i + page_size]) if obj is not None]
+            if page:
+                yield page
+
+    def url_for(self, name: str) -> str:
+        return self._url(name)
+
+
+class InMemoryStorageBackend(StorageBackend):
+    """Process-local dictionary, for tests and benchmarks"""
+
+    name = "memory"
+
+    def __init__(self, concurrency: int = AUDIO_STORAGE_CONCURRENCY):
+        super().__init__(concurrency)
+        self.objects: Dict[str, bytes] = {}
+        self.content_types: Dict[str, str] = {}
+        self.updated: Dict[str, datetime] = {}
+
+    def _upload(self, name: str, content: bytes, content_type: str) -> str:
+        self.objects[name] = content
+        self.content_types[name] = content_type
+        self.updated[name] = datetime.now(timezone.utc)
+        return self.url_for(name)
+
+    def _find(self, name: str) -> Optional[str]:
+        return self.url_for(name) if name in self.objects else None
+
+    def _touch(self, name: str) -> Optional[str]:
+        if name not in self.objects:
+            return None
+        self.updated[name] = datetime.now(timezone.utc)
+        return self.url_for(name)
+
+    def _stat(self, name: str) -> Optional[StoredObject]:
+        if name not in self.objects:
+            return None
+        return StoredObject(name, len(self.objects[name]), self.updated[name], self.updated[name])
+
+    def _delete(self, name: str, if_version: Any = None) -> bool:
+        if name not in self.objects:
+            return False
+        if if_version is not None and self.updated[name] != if_version:
+            return False
+        self.objects.pop(name, None)
+        self.content_types.pop(name, None)
+        self.updated.pop(name, None)
+        return True
+
+    def list_pages(self, prefix: str, start_after: Optional[str] = None,
+                   page_size: int = 1000) -> Iterator[List[StoredObject]]:
+        names = sorted(
+            name for name in self.objects
+            if name.startswith(prefix) and (start_after is None or name > start_after)
+        )
+        for i in range(0, len(names), page_size):
+            page = [obj for obj in map(self._stat, names[i:i + page_size]) if obj is not None]
+            if page:
+                yield page
+
+    def url_for(self, name: str) -> str:
+        return f"memory://{name}"
+
+
+def create_storage_backend(kind: str = AUDIO_STORAGE_BACKEND) -> StorageBackend:
+    if kind == "gcs":
+        return GCSStorageBackend()
+    if kind == "local":
+        return LocalStorageBackend()
+    if kind == "memory":
+        return InMemoryStorageBackend()
+    raise ValueError(f"Unknown AUDIO_STORAGE_BACKEND: {kind}")
+
+
+# 创建全局实例
+storage_backend = create_storage_backend()
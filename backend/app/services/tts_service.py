@@ -1,43 +1,419 @@
 import os
-from google.cloud import texttospeech, storage
+import re
+import html
+import time
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import List, Dict, Any, Optional, Tuple
+from google.cloud import texttospeech
 from datetime import datetime
-from config.config import tts_client, storage_client
+from config.config import tts_client
+from services.single_flight import SingleFlight
+from services import mp3, ogg, hls
+from services.audio_cache import AudioCache, audio_cache
+from services.storage_backends import StorageBackend, storage_backend
+
+# Google TTS rejects inputs over 5000 bytes; smaller chunks also synthesize in parallel
+TTS_CHUNK_MAX_BYTES = int(os.getenv("TTS_CHUNK_MAX_BYTES", "1500"))
+# Ogg Opus parts have to be remuxed into one stream, so those scripts use as few requests as possible
+TTS_REQUEST_MAX_BYTES = int(os.getenv("TTS_REQUEST_MAX_BYTES", "5000"))
+# Pause spoken between paragraphs packed into one SSML request
+TTS_PARAGRAPH_PAUSE = os.getenv("TTS_PARAGRAPH_PAUSE", "1s")
+TTS_CHUNK_CONCURRENCY = int(os.getenv("TTS_CHUNK_CONCURRENCY", "4"))
+TTS_CHUNK_RETRIES = int(os.getenv("TTS_CHUNK_RETRIES", "2"))
+TTS_CHUNK_RETRY_DELAY = float(os.getenv("TTS_CHUNK_RETRY_DELAY", "0.5"))
+
+# Synthesis settings; all of them (with the profile's) are part of the audio cache key
+VOICE_SETTINGS = {
+    "language_code": "en-US",
+    "name": "en-US-Standard-A",
+    "ssml_gender": "FEMALE",
+}
+SPEAKING_RATE = 0.9
+
+
+@dataclass(frozen=True)
+class AudioProfile:
+    """Named AudioConfig encoding settings a client can ask for"""
+    name: str
+    audio_encoding: str
+    extension: str
+    content_type: str
+    sample_rate_hertz: Optional[int] = None  # None lets the voice pick its native rate
+    effects_profile_id: Tuple[str, ...] = ()
+
+    def settings(self) -> Dict[str, Any]:
+        return {
+            "audio_encoding": self.audio_encoding,
+            "sample_rate_hertz": self.sample_rate_hertz,
+            "effects_profile_id": list(self.effects_profile_id),
+            "speaking_rate": SPEAKING_RATE,
+        }
+
+
+AUDIO_PROFILES = {
+    # Opus at 16 kHz is plenty for a single speaking voice and a fraction of the MP3 size
+    "mobile-low": AudioProfile("mobile-low", "OGG_OPUS", "ogg", "audio/ogg", sample_rate_hertz=16000,
+                               effects_profile_id=("handset-class-device",)),
+    "standard": AudioProfile("standard", "MP3", "mp3", "audio/mpeg"),
+    "hq": AudioProfile("hq", "MP3", "mp3", "audio/mpeg", sample_rate_hertz=44100,
+                       effects_profile_id=("headphone-class-device",)),
+}
+DEFAULT_AUDIO_PROFILE = os.getenv("TTS_DEFAULT_AUDIO_PROFILE", "standard")
+if DEFAULT_AUDIO_PROFILE not in AUDIO_PROFILES:
+    raise ValueError(
+        f"TTS_DEFAULT_AUDIO_PROFILE={DEFAULT_AUDIO_PROFILE!r} is not one of: {', '.join(AUDIO_PROFILES)}"
+    )
+
+
+class AudioProfileStats:
+    """Output size and synthesis time per encoding profile, recorded from the TTS worker threads"""
 
-class TTSService:
     def __init__(self):
+        self._stats: Dict[str, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, profile: str, size: int, seconds: float):
+        with self._lock:
+            entry = self._stats.setdefault(profile, {"syntheses": 0, "bytes": 0, "seconds": 0.0})
+            entry["syntheses"] += 1
+            entry["bytes"] += size
+            entry["seconds"] += seconds
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                profile: {
+                    **entry,
+                    "avg_bytes": entry["bytes"] / entry["syntheses"],
+                    "avg_seconds": entry["seconds"] / entry["syntheses"],
+                }
+                for profile, entry in self._stats.items()
+            }
+
+
+audio_profile_stats = AudioProfileStats()
+
+# HLS packaging: one rendition per MP3 profile, cut into segments of about this length. Google TTS
+# encodes MP3 at a fixed 32 kbps whatever the sample rate, so extra MP3 renditions would not give
+# players a lower or higher bitrate to switch to; only one is packaged until we can re-encode.
+HLS_RENDITIONS = [name.strip() for name in os.getenv("HLS_RENDITIONS", "standard").split(",") if name.strip()]
+HLS_SEGMENT_SECONDS = float(os.getenv("HLS_SEGMENT_SECONDS", "6"))
+
+# Shared across TTSService instances so identical concurrent scripts are synthesized once
+tts_flight = SingleFlight("tts")
+
+_PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+_SENTENCE_END = re.compile(r"(?<=[.!?…])[\"')\]]*\s+")
+_CLAUSE_END = re.compile(r"(?<=[,;:—])\s+")
+
+
+def _utf8_len(text: str) -> int:
+    return len(text.encode("utf-8"))
+
+
+def _split_oversized(text: str, max_bytes: int) -> List[str]:
+    """Split one over-long sentence on clause boundaries, then on words"""
+    pieces = []
+    for separator in (_CLAUSE_END, re.compile(r"\s+")):
+        parts = [part for part in separator.split(text) if part]
+        if len(parts) > 1:
+            pieces = parts
+            break
+    if not pieces:
+        # A single unbreakable token: cut it on character boundaries
+        encoded = text.encode("utf-8")
+        return [encoded[i:i + max_bytes].decode("utf-8", "ignore") for i in range(0, len(encoded), max_bytes)]
+
+    chunks = []
+    for piece in _pack(pieces, max_bytes):
+        if _utf8_len(piece) > max_bytes:
+            chunks.extend(_split_oversized(piece, max_bytes))
+        else:
+            chunks.append(piece)
+    return chunks
+
+
+def _pack(units: List[str], max_bytes: int) -> List[str]:
+    """Greedily join units with spaces into strings of at most max_bytes"""
+    chunks = []
+    current = ""
+    for unit in units:
+        candidate = f"{current} {unit}" if current else unit
+        if current and _utf8_len(candidate) > max_bytes:
+            chunks.append(current)
+            current = unit
+        else:
+            current = candidate
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def _paragraph_chunks(text: str, max_bytes: int) -> List[List[str]]:
+    """Each paragraph's text as whole sentences packed into pieces of at most max_bytes"""
+    paragraphs = []
+    for paragraph in _PARAGRAPH_BREAK.split(text.strip()):
+        paragraph = " ".join(paragraph.split())
+        if not paragraph:
+            continue
+
+        sentences = []
+        for sentence in _SENTENCE_END.split(paragraph):
+            if _utf8_len(sentence) > max_bytes:
+                sentences.extend(_split_oversized(sentence, max_bytes))
+            elif sentence:
+                sentences.append(sentence)
+        paragraphs.append(_pack(sentences, max_bytes))
+    return paragraphs
+
+
+def split_script(text: str, max_bytes: int = TTS_CHUNK_MAX_BYTES) -> List[str]:
+    """Split a script into TTS requests of at most max_bytes
+
+    Paragraph breaks (the script's pauses) always end a chunk; within a
+    paragraph, whole sentences are packed together so prosody stays natural.
+    """
+    return [piece for paragraph in _paragraph_chunks(text, max_bytes) for piece in paragraph]
+
+
+_SSML_WRAPPER = "<speak></speak>"
+
+
+def pack_script_ssml(text: str, max_bytes: int = TTS_REQUEST_MAX_BYTES,
+                     pause: str = TTS_PARAGRAPH_PAUSE) -> List[str]:
+    """Pack a script into as few SSML requests of at most max_bytes as possible
+
+    Unlike split_script, paragraphs share a request, with their pause
+    spoken as an SSML break, so a typical script is a single request.
+    """
+    separator = f'<break time="{pause}"/>'
+    # Headroom for escaping and the markup around each piece
+    piece_bytes = max(max_bytes // 2, 1)
+    requests = []
+    current = ""
+    for paragraph in _paragraph_chunks(text, piece_bytes):
+        for position, piece in enumerate(paragraph):
+            piece = html.escape(piece, quote=False)
+            candidate = f"{current}{' ' if position else separator}{piece}" if current else piece
+            if current and _utf8_len(candidate) + len(_SSML_WRAPPER) > max_bytes:
+                requests.append(current)
+                current = piece
+            else:
+                current = candidate
+    if current:
+        requests.append(current)
+    return [f"<speak>{body}</speak>" for body in requests]
+
+
+class TTSService:
+    def __init__(self, cache: AudioCache = audio_cache, storage: StorageBackend = storage_backend):
         self.client = tts_client
-        self.storage_client = storage_client
-        self.bucket_name = "mindtuner-8804e.firebasestorage.app"
+        self.storage = storage
+        self.cache = cache
+
+    def audio_cache_key(self, text: str, profile: str = DEFAULT_AUDIO_PROFILE) -> str:
+        settings = {
+            "voice": VOICE_SETTINGS,
+            "profile": profile,
+            "audio": AUDIO_PROFILES[profile].settings(),
+            "chunk_max_bytes": TTS_CHUNK_MAX_BYTES,
+        }
+        if AUDIO_PROFILES[profile].audio_encoding != "MP3":
+            settings["ssml"] = {"request_max_bytes": TTS_REQUEST_MAX_BYTES, "paragraph_pause": TTS_PARAGRAPH_PAUSE}
+        return self.cache.make_key(text, settings)
+
+    def generate_and_store_speech(self, text: str, record_id: str,
+                                  profile: str = DEFAULT_AUDIO_PROFILE) -> str:
+        """Synthesize and upload the script, reusing audio already stored for the same content
+
+        With the audio cache enabled, audio is stored content-addressed under
+        meditations/by-hash/{profile}/ and `record_id` is not part of the blob name.
+        """
+        if not self.cache.enabled:
+            audio_content = self._generate_speech(text, profile)
+            return self.store_speech(text, audio_content, record_id, profile)
+
+        key = self.audio_cache_key(text, profile)
+        blob_name = self._blob_name(key, profile, content_addressed=True)
+        if self.cache.get_url(key) is not None:
+            # The index may outlive the blob (audio GC), so confirm it; this also marks the blob as reused
+            audio_url = self._find_in_storage(blob_name, touch=True)
+            if audio_url is not None:
+                return audio_url
+            self.cache.discard(key)
+        else:
+            audio_url = self._find_in_storage(blob_name, touch=True)
+            if audio_url is not None:
+                self.cache.record_remote_hit(key, audio_url)
+                return audio_url
+
+        self.cache.record_miss()
+        audio_content = self._generate_speech(text, profile)
+        return self.store_speech(text, audio_content, record_id, profile)
 
-    def generate_and_store_speech(self, text: str, record_id: str) -> str:
-        audio_content = self._generate_speech(text)
-        audio_url = self._upload_to_storage(audio_content, record_id)
+    def store_speech(self, text: str, audio_content: bytes, record_id: str,
+                     profile: str = DEFAULT_AUDIO_PROFILE) -> str:
+        """Upload audio synthesized elsewhere for the script and add it to the audio cache"""
+        audio_profile = AUDIO_PROFILES[profile]
+        if not self.cache.enabled:
+            return self._upload_to_storage(audio_content, self._blob_name(record_id, profile), audio_profile.content_type)
+
+        key = self.audio_cache_key(text, profile)
+        audio_url = self._upload_to_storage(
+            audio_content, self._blob_name(key, profile, content_addressed=True), audio_profile.content_type
+        )
+        self.cache.put(key, audio_url, audio_content, audio_profile.extension)
         return audio_url
-    
-    def _generate_speech(self, text: str) -> bytes:
-        synthesis_input = texttospeech.SynthesisInput(text=text)
+
+    async def generate_and_store_speech_async(self, text: str, record_id: str,
+                                              profile: str = DEFAULT_AUDIO_PROFILE) -> str:
+        """Non-blocking generate_and_store_speech, coalescing identical in-flight scripts"""
+        key = self.audio_cache_key(text, profile)
+        return await tts_flight.do(
+            key, lambda: asyncio.to_thread(self.generate_and_store_speech, text, record_id, profile)
+        )
+
+    def generate_and_store_hls(self, text: str, record_id: str) -> Dict[str, str]:
+        """Synthesize the script once per HLS rendition and store it as segments plus playlists
+
+        Returns the master playlist URL and, as `audio_url`, the complete file
+        of the first rendition for clients without HLS support. Playlists
+        reference their segments by relative URI, so this needs a backend
+        serving plain (unsigned) URLs.
+        """
+        if getattr(self.storage, "signed_urls", False):
+            raise ValueError("HLS packages need a storage backend serving unsigned URLs")
+        for profile in HLS_RENDITIONS:
+            if AUDIO_PROFILES[profile].audio_encoding != "MP3":
+                raise ValueError(f"HLS renditions must be MP3 profiles, got {profile}")
+
+        key = self.cache.make_key(text, {
+            "voice": VOICE_SETTINGS,
+            "hls": {profile: AUDIO_PROFILES[profile].settings() for profile in HLS_RENDITIONS},
+            "segment_seconds": HLS_SEGMENT_SECONDS,
+            # Packages made before segments carried their timestamp tag are not reused
+            "segment_tags": "id3-timestamp",
+            "chunk_max_bytes": TTS_CHUNK_MAX_BYTES,
+        })
+        prefix = f"meditations/hls/{key if self.cache.enabled else record_id}"
+        primary = HLS_RENDITIONS[0]
+
+        if self.cache.enabled:
+            # Touching the master playlist marks the whole package as reused for the audio GC
+            playlist_url = self._find_in_storage(f"{prefix}/master.m3u8", touch=True)
+            audio_key = self.audio_cache_key(text, primary)
+            audio_url = self._find_in_storage(self._blob_name(audio_key, primary, content_addressed=True), touch=True)
+            if playlist_url and audio_url:
+                return {"playlist_url": playlist_url, "audio_url": audio_url}
+
+        with ThreadPoolExecutor(max_workers=len(HLS_RENDITIONS)) as executor:
+            renditions = list(executor.map(lambda profile: self._generate_speech(text, profile), HLS_RENDITIONS))
+
+        uploads = []
+        variants = []
+        for profile, audio_content in zip(HLS_RENDITIONS, renditions):
+            segments = hls.segment_mp3(audio_content, HLS_SEGMENT_SECONDS)
+            names = [f"seg{index:04d}.mp3" for index in range(len(segments))]
+            uploads += [
+                (content, f"{prefix}/{profile}/{name}", hls.SEGMENT_CONTENT_TYPE)
+                for name, (content, _) in zip(names, segments)
+            ]
+            playlist = hls.media_playlist([(name, duration) for name, (_, duration) in zip(names, segments)])
+            uploads.append((playlist.encode("utf-8"), f"{prefix}/{profile}/index.m3u8", hls.PLAYLIST_CONTENT_TYPE))
+            variants.append((f"{profile}/index.m3u8", hls.peak_bandwidth(segments)))
+
+        with ThreadPoolExecutor(max_workers=self.storage.concurrency) as executor:
+            list(executor.map(lambda upload: self._upload_to_storage(*upload), uploads))
+
+        # Written last: its presence means the whole package is in place
+        playlist_url = self._upload_to_storage(
+            hls.master_playlist(variants).encode("utf-8"), f"{prefix}/master.m3u8", hls.PLAYLIST_CONTENT_TYPE
+        )
+        audio_url = self.store_speech(text, renditions[0], record_id, primary)
+        return {"playlist_url": playlist_url, "audio_url": audio_url}
+
+    async def generate_and_store_hls_async(self, text: str, record_id: str) -> Dict[str, str]:
+        """Non-blocking generate_and_store_hls, coalescing identical in-flight scripts"""
+        key = "hls:" + self.audio_cache_key(text)
+        return await tts_flight.do(
+            key, lambda: asyncio.to_thread(self.generate_and_store_hls, text, record_id)
+        )
+
+    @staticmethod
+    def _blob_name(name: str, profile: str, content_addressed: bool = False) -> str:
+        extension = AUDIO_PROFILES[profile].extension
+        if content_addressed:
+            return f"meditations/by-hash/{profile}/{name}.{extension}"
+        return f"meditations/{profile}/{name}.{extension}"
+
+    def _generate_speech(self, text: str, profile: str = DEFAULT_AUDIO_PROFILE) -> bytes:
+        """Synthesize the script chunk by chunk in parallel and join the parts in order
+
+        MP3 frames concatenate cleanly, so MP3 scripts are cut into small
+        chunks for parallelism. Ogg Opus parts must be remuxed and play a few
+        ms of encoder warm-up at each join, so those are packed, paragraphs
+        and their pauses included, into as few SSML requests as the TTS input
+        limit allows (one for a typical script).
+        """
+        started = time.perf_counter()
+        is_mp3 = AUDIO_PROFILES[profile].audio_encoding == "MP3"
+        chunks = (split_script(text) if is_mp3 else pack_script_ssml(text)) or [text]
+        if len(chunks) == 1:
+            audio_content = self._synthesize_chunk(chunks[0], profile)
+        else:
+            with ThreadPoolExecutor(max_workers=min(TTS_CHUNK_CONCURRENCY, len(chunks))) as executor:
+                parts = list(executor.map(lambda chunk: self._synthesize_chunk(chunk, profile), chunks))
+            audio_content = mp3.concat(parts) if is_mp3 else ogg.concat_opus(parts)
+
+        audio_profile_stats.record(profile, len(audio_content), time.perf_counter() - started)
+        return audio_content
+
+    def _synthesize_chunk(self, text: str, profile: str = DEFAULT_AUDIO_PROFILE) -> bytes:
+        """Synthesize one chunk, retrying transient failures with backoff"""
+        for attempt in range(TTS_CHUNK_RETRIES + 1):
+            try:
+                return self._synthesize(text, profile)
+            except Exception as e:
+                if attempt == TTS_CHUNK_RETRIES:
+                    raise
+                print(f"TTS chunk failed (attempt {attempt + 1}), retrying: {e}")
+                time.sleep(TTS_CHUNK_RETRY_DELAY * (2 ** attempt))
+
+    def _synthesize(self, text: str, profile: str = DEFAULT_AUDIO_PROFILE) -> bytes:
+        audio_profile = AUDIO_PROFILES[profile]
+        if text.startswith("<speak>"):
+            synthesis_input = texttospeech.SynthesisInput(ssml=text)
+        else:
+            synthesis_input = texttospeech.SynthesisInput(text=text)
         voice = texttospeech.VoiceSelectionParams(
-            language_code="en-US",
-            name="en-US-Standard-A",
-            ssml_gender=texttospeech.SsmlVoiceGender.FEMALE
+            language_code=VOICE_SETTINGS["language_code"],
+            name=VOICE_SETTINGS["name"],
+            ssml_gender=texttospeech.SsmlVoiceGender[VOICE_SETTINGS["ssml_gender"]]
         )
         audio_config = texttospeech.AudioConfig(
-            audio_encoding=texttospeech.AudioEncoding.MP3,
-            speaking_rate=0.9
+            audio_encoding=texttospeech.AudioEncoding[audio_profile.audio_encoding],
+            speaking_rate=SPEAKING_RATE,
+            sample_rate_hertz=audio_profile.sample_rate_hertz or 0,
+            effects_profile_id=list(audio_profile.effects_profile_id)
         )
-        
+
         response = self.client.synthesize_speech(
             input=synthesis_input, voice=voice, audio_config=audio_config
         )
         return response.audio_content
 
-       
-    def _upload_to_storage(self, audio_content: bytes, record_id: str) -> str:
-        bucket = self.storage_client.bucket(self.bucket_name)
-        blob_name = f"meditations/{record_id}.mp3"
-        blob = bucket.blob(blob_name)
-        
-        blob.upload_from_string(audio_content, content_type="audio/mpeg")
-        blob.make_public()
-        
-        return blob.public_url
\ No newline at end of file
+
+    def _find_in_storage(self, blob_name: str, touch: bool = False) -> Optional[str]:
+        """URL of an already uploaded blob, or None; `touch` marks it as reused"""
+        try:
+            return self.storage.find(blob_name, touch=touch)
+        except Exception as e:
+            print(f"Audio lookup failed for {blob_name}: {e}")
+        return None
+
+    def _upload_to_storage(self, audio_content: bytes, blob_name: str,
+                           content_type: str = "audio/mpeg") -> str:
+        return self.storage.upload(blob_name, audio_content, content_type)
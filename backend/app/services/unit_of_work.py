@@ -0,0 +1,169 @@
+import os
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Dict, Any, Optional, Callable, TypeVar
+
+from google.cloud import firestore
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from config.config import db
+
+# Firestore rejects batches with more than 500 writes
+FIRESTORE_BATCH_LIMIT = int(os.getenv("FIRESTORE_BATCH_LIMIT", "500"))
+
+T = TypeVar("T")
+
+
+@dataclass
+class CommitTiming:
+    """Batch commits made while handling one request"""
+    commits: int = 0
+    writes: int = 0
+    seconds: float = 0.0
+
+    def server_timing(self) -> str:
+        return (
+            f'db-commit;dur={self.seconds * 1000:.1f};'
+            f'desc="{self.commits} commit(s), {self.writes} write(s)"'
+        )
+
+
+_request_timing: ContextVar[Optional[CommitTiming]] = ContextVar("request_commit_timing", default=None)
+_current_unit: ContextVar[Optional["UnitOfWork"]] = ContextVar("current_unit_of_work", default=None)
+
+
+class UnitOfWork:
+    """Collect Firestore writes and commit them in a single batch
+
+    Used as a context manager: the writes are committed together when the
+    block exits normally and dropped if it raises. A unit opened while
+    another one is active joins it, so the outermost block decides when
+    the commit happens. Only writes are batched; reads inside the block go
+    to Firestore directly and do not see the pending writes. Given a
+    `transaction`, writes go into it instead and its owner commits them
+    (see run_in_transaction).
+    """
+
+    def __init__(self, client=None, transaction=None):
+        self.db = client if client is not None else db
+        self._transaction = transaction
+        self._batch = None
+        self._pending = 0
+        self._outer: Optional["UnitOfWork"] = None
+        self._token = None
+        self.writes = 0
+
+    def _active(self) -> "UnitOfWork":
+        return self._outer or self
+
+    def _add(self, op: str, *args, **kwargs):
+        unit = self._active()
+        if unit._batch is None:
+            unit._batch = unit._transaction if unit._transaction is not None else unit.db.batch()
+        getattr(unit._batch, op)(*args, **kwargs)
+        unit._pending += 1
+        unit.writes += 1
+        if unit._pending >= FIRESTORE_BATCH_LIMIT and unit._transaction is None:
+            unit._commit()
+
+    def set(self, doc_ref, data: Dict[str, Any], merge: bool = False):
+        self._add("set", doc_ref, data, merge=merge)
+
+    def update(self, doc_ref, data: Dict[str, Any]):
+        self._add("update", doc_ref, data)
+
+    def delete(self, doc_ref):
+        self._add("delete", doc_ref)
+
+    def _commit(self):
+        if self._batch is None:
+            return
+        batch, writes = self._batch, self._pending
+        self._batch = None
+        self._pending = 0
+
+        started = time.perf_counter()
+        batch.commit()
+        _record_commit(writes, time.perf_counter() - started)
+
+    def __enter__(self) -> "UnitOfWork":
+        # A transaction never joins an outer batch: its writes must commit with its reads
+        self._outer = _current_unit.get() if self._transaction is None else None
+        if self._outer is None:
+            self._token = _current_unit.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._outer is not None:
+            return False
+        _current_unit.reset(self._token)
+        if exc_type is None and self._transaction is None:
+            self._commit()
+        else:
+            self._batch = None
+            self._pending = 0
+        return False
+
+
+def _record_commit(writes: int, seconds: float):
+    timing = _request_timing.get()
+    if timing is not None:
+        timing.commits += 1
+        timing.writes += writes
+        timing.seconds += seconds
+
+
+def run_in_transaction(func: Callable[[Any, UnitOfWork], T], client=None) -> T:
+    """Run func(transaction, uow) in a Firestore transaction and return its result
+
+    Reads must go through the transaction and happen before any write.
+    Writes made through `uow` (or any UnitOfWork opened inside func) are
+    committed with the transaction. On contention Firestore retries the
+    whole function, so it must not have side effects outside the writes.
+    """
+    client = client if client is not None else db
+    writes = 0
+
+    def attempt(transaction):
+        nonlocal writes
+        with UnitOfWork(client, transaction=transaction) as uow:
+            result = func(transaction, uow)
+        writes = uow.writes
+        return result
+
+    started = time.perf_counter()
+    result = firestore.transactional(attempt)(client.transaction())
+    _record_commit(writes, time.perf_counter() - started)
+    return result
+
+
+class CommitTimingMiddleware:
+    """Report each request's Firestore commit time in a Server-Timing header
+
+    Commits that happen after the response headers are sent (streaming
+    endpoints) are not included.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timing = CommitTiming()
+        token = _request_timing.set(timing)
+
+        async def send_with_timing(message: Message):
+            if message["type"] == "http.response.start" and timing.commits:
+                headers = MutableHeaders(scope=message)
+                headers.append("Server-Timing", timing.server_timing())
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _request_timing.reset(token)
@@ -0,0 +1,146 @@
+import os
+import time
+import asyncio
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Dict, Any, Optional, Callable, Awaitable, List, Tuple
+
+WARM_POOL_SIZE = int(os.getenv("MEDITATION_WARM_POOL_SIZE", "0"))  # 0 disables the pool
+WARM_POOL_CONCURRENCY = int(os.getenv("MEDITATION_WARM_POOL_CONCURRENCY", "2"))
+WARM_POOL_RETRY_DELAY = float(os.getenv("MEDITATION_WARM_POOL_RETRY_DELAY", "30"))
+# Items are dropped after this long: their audio is referenced by no record until handed out,
+# so it must be served well within the audio GC grace period
+WARM_POOL_MAX_AGE = float(os.getenv("MEDITATION_WARM_POOL_MAX_AGE", str(24 * 3600)))
+
+PoolKey = Tuple[str, str]
+
+
+@dataclass
+class WarmPoolItem:
+    """A ready-to-serve script with its audio already uploaded"""
+    script: str
+    audio_url: Optional[str]
+    metadata: Dict[str, Any] = field(default_factory=dict)
+    created_at: float = field(default_factory=time.monotonic)
+
+
+class MeditationWarmPool:
+    """Background pool of pre-generated meditations per (mood, context category)
+
+    `classify` maps a user's mood and description to a pool key, or None when
+    the request needs a bespoke script. `produce` generates one item for a
+    key (returning None on failure). Each key is kept filled up to `size`
+    items; taking an item schedules an asynchronous refill. Items older
+    than `max_age` are discarded instead of served.
+    """
+
+    def __init__(
+        self,
+        keys: List[PoolKey],
+        classify: Callable[[str, str], Optional[PoolKey]],
+        produce: Callable[[PoolKey], Awaitable[Optional[WarmPoolItem]]],
+        size: int = WARM_POOL_SIZE,
+        concurrency: int = WARM_POOL_CONCURRENCY,
+        retry_delay: float = WARM_POOL_RETRY_DELAY,
+        max_age: float = WARM_POOL_MAX_AGE,
+    ):
+        self.keys = keys
+        self.classify = classify
+        self.produce = produce
+        self.size = size
+        self.concurrency = concurrency
+        self.retry_delay = retry_delay
+        self.max_age = max_age
+
+        self._pools: Dict[PoolKey, deque] = {key: deque() for key in keys}
+        self._refills: Dict[PoolKey, asyncio.Task] = {}
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._running = False
+
+        self.hits = 0
+        self.misses = 0
+        self.produced = 0
+        self.failures = 0
+        self.expired = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.size > 0
+
+    async def start(self):
+        """Start filling every pool (called on application startup)"""
+        if not self.enabled:
+            return
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        self._running = True
+        for key in self.keys:
+            self._schedule_refill(key)
+
+    async def stop(self):
+        """Cancel outstanding refills (called on application shutdown)"""
+        self._running = False
+        tasks = list(self._refills.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._refills.clear()
+
+    def take(self, mood: str, description: str) -> Optional[WarmPoolItem]:
+        """Pop a ready item matching the request, or None if the request is not poolable or the pool is empty"""
+        if not self._running:
+            return None
+
+        key = self.classify(mood, description)
+        if key is None or key not in self._pools:
+            return None
+
+        pool = self._pools[key]
+        now = time.monotonic()
+        while pool and now - pool[0].created_at > self.max_age:
+            pool.popleft()
+            self.expired += 1
+        item = pool.popleft() if pool else None
+        if item is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        self._schedule_refill(key)
+        return item
+
+    def _schedule_refill(self, key: PoolKey):
+        task = self._refills.get(key)
+        if task is not None and not task.done():
+            return
+        self._refills[key] = asyncio.create_task(self._refill(key))
+
+    async def _refill(self, key: PoolKey):
+        pool = self._pools[key]
+        while self._running and len(pool) < self.size:
+            async with self._semaphore:
+                try:
+                    item = await self.produce(key)
+                except Exception as e:
+                    print(f"Warm pool generation failed for {key}: {e}")
+                    item = None
+
+            if item is None:
+                self.failures += 1
+                await asyncio.sleep(self.retry_delay)
+                continue
+
+            pool.append(item)
+            self.produced += 1
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "target_size": self.size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "produced": self.produced,
+            "failures": self.failures,
+            "expired": self.expired,
+            "pools": {f"{mood}/{category}": len(pool) for (mood, category), pool in self._pools.items()},
+        }
@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+"""
+Recompute the rating statistics aggregates from the ratings collection
+"""
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+# Add current directory to Python path
+current_dir = Path(__file__).parent
+app_dir = current_dir / "app"
+sys.path.insert(0, str(current_dir))
+sys.path.insert(0, str(app_dir))
+
+from services.rating_aggregates import rating_aggregates
+
+
+def main():
+    """Rebuild rating aggregates"""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.parse_args()
+
+    print("📊 Rebuilding rating aggregates (run while rating traffic is quiet)...")
+    try:
+        result = rating_aggregates.rebuild()
+    except Exception as e:
+        print(f"❌ Rebuild failed: {e}")
+        sys.exit(1)
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
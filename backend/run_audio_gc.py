@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Delete stored meditation audio that no record references any more
+"""
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+# Add current directory to Python path
+current_dir = Path(__file__).parent
+app_dir = current_dir / "app"
+sys.path.insert(0, str(current_dir))
+sys.path.insert(0, str(app_dir))
+
+from services.audio_gc import (
+    AudioGarbageCollector,
+    AUDIO_GC_GRACE_DAYS,
+    AUDIO_GC_WORKERS,
+    AUDIO_GC_PAGE_SIZE,
+)
+
+
+def main():
+    """Run the audio garbage collector"""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--dry-run", action="store_true", help="report orphans without deleting them")
+    parser.add_argument("--grace-days", type=float, default=AUDIO_GC_GRACE_DAYS,
+                        help="never delete objects younger than this")
+    parser.add_argument("--workers", type=int, default=AUDIO_GC_WORKERS,
+                        help="parallel Firestore lookups and deletes")
+    parser.add_argument("--page-size", type=int, default=AUDIO_GC_PAGE_SIZE)
+    parser.add_argument("--prefix", default="meditations/")
+    parser.add_argument("--restart", action="store_true",
+                        help="ignore an interrupted run's checkpoint and start from the beginning")
+    args = parser.parse_args()
+
+    collector = AudioGarbageCollector(
+        grace_days=args.grace_days,
+        workers=args.workers,
+        page_size=args.page_size,
+        prefix=args.prefix,
+        dry_run=args.dry_run,
+    )
+
+    print(f"🧹 Sweeping {args.prefix} (grace {args.grace_days} days{', dry run' if args.dry_run else ''})...")
+    try:
+        result = collector.run(resume=not args.restart)
+    except KeyboardInterrupt:
+        print("\n🛑 Interrupted, rerun to resume from the last checkpoint")
+        sys.exit(1)
+    print(json.dumps(result, indent=2, default=str))
+
+
+if __name__ == "__main__":
+    main()
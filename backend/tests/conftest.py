@@ -0,0 +1,17 @@
+import os
+import sys
+
+import pytest
+
+# The services import each other as top-level packages, as when run from backend/app
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app"))
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+@pytest.fixture
+def read_fixture():
+    def read(file_name: str) -> bytes:
+        with open(os.path.join(FIXTURES_DIR, file_name), "rb") as f:
+            return f.read()
+    return read
@@ -0,0 +1,121 @@
+"""Regenerate the synthetic audio fixtures used by the unit tests
+
+    python tests/fixtures/make_fixtures.py
+
+The files are written by hand here, independently of services.mp3 and
+services.ogg, so the tests do not check the parsers against themselves.
+"""
+import os
+import struct
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# MPEG-2 Layer III, 24 kHz, 32 kbps, mono, no CRC: what Google TTS returns.
+# 576 samples per frame, 576 / 8 * 32000 / 24000 = 96 bytes per frame.
+MP3_HEADER = bytes([0xFF, 0xF3, 0x44, 0xC4])
+MP3_FRAME_BYTES = 96
+
+
+def mp3_frame(fill: int) -> bytes:
+    return MP3_HEADER + bytes([fill]) * (MP3_FRAME_BYTES - 4)
+
+
+def xing_frame() -> bytes:
+    # The Xing tag follows the 9-byte MPEG-2 mono side info
+    body = bytearray(MP3_FRAME_BYTES - 4)
+    body[9:13] = b"Xing"
+    return MP3_HEADER + bytes(body)
+
+
+def id3v2_tag() -> bytes:
+    # The payload contains a frame sync, which a parser must not mistake for audio
+    payload = b"TIT2" + b"\x00\x00\x00\x0a\x00\x00" + b"\x03meditate" + MP3_HEADER + b"\x00" * 8
+    size = len(payload)
+    synchsafe = bytes([(size >> 21) & 0x7F, (size >> 14) & 0x7F, (size >> 7) & 0x7F, size & 0x7F])
+    return b"ID3\x04\x00\x00" + synchsafe + payload
+
+
+def id3v1_tag() -> bytes:
+    return b"TAG" + b"meditation".ljust(125, b"\x00")
+
+
+def tagged_mp3() -> bytes:
+    """ID3v2 tag, Xing header frame, five audio frames filled with 1..5, ID3v1 tag"""
+    frames = b"".join(mp3_frame(fill) for fill in range(1, 6))
+    return id3v2_tag() + xing_frame() + frames + id3v1_tag()
+
+
+def _ogg_crc(data: bytes) -> int:
+    crc = 0
+    for byte in data:
+        crc ^= byte << 24
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x04C11DB7) if crc & 0x80000000 else crc << 1
+            crc &= 0xFFFFFFFF
+    return crc
+
+
+def ogg_page(flags: int, granule: int, serial: int, sequence: int, page_packets) -> bytes:
+    lacing = bytearray()
+    for packet in page_packets:
+        lacing += b"\xff" * (len(packet) // 255) + bytes([len(packet) % 255])
+    header = b"OggS" + struct.pack("<BBqIIIB", 0, flags, granule, serial, sequence, 0, len(lacing))
+    page = bytearray(header + lacing + b"".join(page_packets))
+    page[22:26] = struct.pack("<I", _ogg_crc(bytes(page)))
+    return bytes(page)
+
+
+def opus_head(pre_skip: int = 312) -> bytes:
+    return b"OpusHead" + struct.pack("<BBHIhB", 1, 1, pre_skip, 24000, 0, 0)
+
+
+def opus_tags() -> bytes:
+    vendor = b"fixture"
+    return b"OpusTags" + struct.pack("<I", len(vendor)) + vendor + struct.pack("<I", 0)
+
+
+# TOC bytes: CELT config 19 (20 ms = 960 samples), frame count codes 0 and 1
+CELT_20MS_ONE_FRAME = 0x98
+CELT_20MS_TWO_FRAMES = 0x99
+
+
+def opus_packet(toc: int, fill: int, size: int = 40) -> bytes:
+    return bytes([toc]) + bytes([fill]) * (size - 1)
+
+
+def opus_part_a() -> bytes:
+    """Three 20 ms packets on one audio page; final granule 2880, nothing trimmed"""
+    serial = 0x1111
+    audio = [opus_packet(CELT_20MS_ONE_FRAME, fill) for fill in (1, 2, 3)]
+    return b"".join([
+        ogg_page(0x02, 0, serial, 0, [opus_head()]),
+        ogg_page(0, 0, serial, 1, [opus_tags()]),
+        ogg_page(0x04, 2880, serial, 2, audio),
+    ])
+
+
+def opus_part_b() -> bytes:
+    """Four packets (5 x 960 samples, one 300-byte packet) over two pages; final granule 4500, 300 trimmed"""
+    serial = 0x2222
+    first = [opus_packet(CELT_20MS_ONE_FRAME, 4), opus_packet(CELT_20MS_TWO_FRAMES, 5, size=300)]
+    second = [opus_packet(CELT_20MS_ONE_FRAME, 6), opus_packet(CELT_20MS_ONE_FRAME, 7)]
+    return b"".join([
+        ogg_page(0x02, 0, serial, 0, [opus_head()]),
+        ogg_page(0, 0, serial, 1, [opus_tags()]),
+        ogg_page(0, 2880, serial, 2, first),
+        ogg_page(0x04, 4500, serial, 3, second),
+    ])
+
+
+FIXTURES = {
+    "tagged.mp3": tagged_mp3,
+    "part_a.opus": opus_part_a,
+    "part_b.opus": opus_part_b,
+}
+
+
+if __name__ == "__main__":
+    for file_name, build in FIXTURES.items():
+        with open(os.path.join(HERE, file_name), "wb") as f:
+            f.write(build())
+        print(f"✅ {file_name}")
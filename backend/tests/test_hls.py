@@ -0,0 +1,81 @@
+import struct
+
+import pytest
+
+from services import hls, mp3
+
+OWNER = b"com.apple.streaming.transportStreamTimestamp\x00"
+FRAME_BYTES = 96
+FRAME_SECONDS = 576 / 24000
+
+
+def unsynchsafe(raw: bytes) -> int:
+    assert all(byte < 0x80 for byte in raw)
+    return (raw[0] << 21) | (raw[1] << 14) | (raw[2] << 7) | raw[3]
+
+
+def tag_pts(tag: bytes) -> int:
+    assert tag[:6] == b"ID3\x04\x00\x00" and tag[10:14] == b"PRIV"
+    assert tag[20:20 + len(OWNER)] == OWNER
+    return struct.unpack(">Q", tag[20 + len(OWNER):20 + len(OWNER) + 8])[0]
+
+
+@pytest.mark.parametrize("size, raw", [
+    (0, b"\x00\x00\x00\x00"),
+    (127, b"\x00\x00\x00\x7f"),
+    (128, b"\x00\x00\x01\x00"),
+    (255, b"\x00\x00\x01\x7f"),
+    (0x0FFFFFFF, b"\x7f\x7f\x7f\x7f"),
+])
+def test_synchsafe(size, raw):
+    assert hls._synchsafe(size) == raw
+    assert unsynchsafe(raw) == size
+
+
+def test_timestamp_tag_sizes():
+    tag = hls.timestamp_tag(0)
+    frame_body = len(OWNER) + 8
+    assert unsynchsafe(tag[14:18]) == frame_body
+    assert unsynchsafe(tag[6:10]) == 10 + frame_body
+    assert len(tag) == 10 + 10 + frame_body
+
+
+def test_timestamp_tag_is_skipped_as_id3():
+    frame = bytes([0xFF, 0xF3, 0x44, 0xC4]) + b"\x01" * (FRAME_BYTES - 4)
+    assert mp3.strip_tags(hls.timestamp_tag(12.5) + frame) == frame
+
+
+@pytest.mark.parametrize("seconds, pts", [
+    (0, 0),
+    (1, 90000),
+    (FRAME_SECONDS, 2160),
+    ((2 ** 33 - 1) / 90000, 2 ** 33 - 1),
+    (2 ** 33 / 90000, 0),
+    ((2 ** 33 + 90000) / 90000, 90000),
+])
+def test_timestamp_tag_wraps_at_33_bits(seconds, pts):
+    assert tag_pts(hls.timestamp_tag(seconds)) == pts
+
+
+def test_segment_mp3_cuts_on_frame_boundaries(read_fixture):
+    data = read_fixture("tagged.mp3")
+    segments = hls.segment_mp3(data, 2 * FRAME_SECONDS)
+    assert [round(duration, 6) for _, duration in segments] == [round(2 * FRAME_SECONDS, 6)] * 2 + [round(FRAME_SECONDS, 6)]
+
+    audio = b""
+    start = 0.0
+    for content, duration in segments:
+        tag_size = 10 + unsynchsafe(content[6:10])
+        assert tag_pts(content[:tag_size]) == round(start * 90000)
+        body = content[tag_size:]
+        assert len(body) % FRAME_BYTES == 0
+        assert [f.offset for f in mp3.iter_frames(body)] == list(range(0, len(body), FRAME_BYTES))
+        audio += body
+        start += duration
+    assert audio == mp3.concat([data])
+
+
+def test_peak_bandwidth():
+    segments = [(b"\x00" * 1000, 1.0), (b"\x00" * 1500, 1.0), (b"\x00" * 10, 0.0)]
+    assert hls.peak_bandwidth(segments) == 12000
+    assert hls.peak_bandwidth([]) == 0
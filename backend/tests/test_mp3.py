@@ -0,0 +1,74 @@
+from services import mp3
+
+# MPEG-2 Layer III, 24 kHz, 32 kbps, mono (see fixtures/make_fixtures.py)
+HEADER = bytes([0xFF, 0xF3, 0x44, 0xC4])
+FRAME_BYTES = 96
+FRAME_SECONDS = 576 / 24000
+
+
+def frame(fill: int) -> bytes:
+    return HEADER + bytes([fill]) * (FRAME_BYTES - 4)
+
+
+def test_parse_frame_header():
+    parsed = mp3.parse_frame_header(frame(1), 0)
+    assert (parsed.length, parsed.sample_rate, parsed.samples) == (FRAME_BYTES, 24000, 576)
+    assert parsed.duration == FRAME_SECONDS
+
+
+def test_parse_frame_header_padding_and_mpeg1():
+    padded = bytes([0xFF, 0xF3, 0x46, 0xC4])
+    assert mp3.parse_frame_header(padded, 0).length == FRAME_BYTES + 1
+    # MPEG-1, 128 kbps, 44.1 kHz: 1152 / 8 * 128000 / 44100 = 417 bytes
+    parsed = mp3.parse_frame_header(bytes([0xFF, 0xFB, 0x90, 0x64]), 0)
+    assert (parsed.length, parsed.samples) == (417, 1152)
+
+
+def test_parse_frame_header_rejects_invalid():
+    assert mp3.parse_frame_header(b"\xff\xf3\x44", 0) is None  # truncated
+    assert mp3.parse_frame_header(bytes([0xFF, 0xEB, 0x44, 0xC4]), 0) is None  # reserved version
+    assert mp3.parse_frame_header(bytes([0xFF, 0xF5, 0x44, 0xC4]), 0) is None  # layer II
+    assert mp3.parse_frame_header(bytes([0xFF, 0xF3, 0x04, 0xC4]), 0) is None  # free format
+    assert mp3.parse_frame_header(bytes([0xFF, 0xF3, 0xF4, 0xC4]), 0) is None  # bad bitrate
+    assert mp3.parse_frame_header(bytes([0xFF, 0xF3, 0x4C, 0xC4]), 0) is None  # reserved sample rate
+
+
+def test_strip_tags_fixture(read_fixture):
+    data = mp3.strip_tags(read_fixture("tagged.mp3"))
+    # Xing frame plus five audio frames, nothing before or after
+    assert len(data) == 6 * FRAME_BYTES
+    assert data[:4] == HEADER and data[-FRAME_BYTES:] == frame(5)
+
+
+def test_strip_tags_with_footer():
+    tag = b"ID3\x04\x00\x10\x00\x00\x00\x02" + b"\x00\x00" + b"3DI\x04\x00\x10\x00\x00\x00\x02"
+    assert mp3.strip_tags(tag + frame(1)) == frame(1)
+
+
+def test_audio_frames_skip_xing_header(read_fixture):
+    data = mp3.strip_tags(read_fixture("tagged.mp3"))
+    frames = mp3.audio_frames(data)
+    assert [f.offset for f in frames] == [FRAME_BYTES * i for i in range(1, 6)]
+    assert [data[f.offset + 4] for f in frames] == [1, 2, 3, 4, 5]
+
+
+def test_audio_frames_keep_first_frame_without_xing():
+    data = frame(1) + frame(2)
+    assert [f.offset for f in mp3.audio_frames(data)] == [0, FRAME_BYTES]
+
+
+def test_iter_frames_resyncs_and_drops_truncated_tail():
+    data = b"\x00\x12" + frame(1) + b"\xff\x00" + frame(2) + frame(3)[:50]
+    offsets = [f.offset for f in mp3.iter_frames(data)]
+    assert offsets == [2, 2 + FRAME_BYTES + 2]
+
+
+def test_concat_joins_on_frame_boundaries(read_fixture):
+    part = read_fixture("tagged.mp3")
+    joined = mp3.concat([part, part])
+    assert joined == b"".join(frame(fill) for fill in [1, 2, 3, 4, 5] * 2)
+    assert b"Xing" not in joined and b"ID3" not in joined and b"TAG" not in joined
+
+
+def test_duration(read_fixture):
+    assert mp3.duration(read_fixture("tagged.mp3")) == 5 * FRAME_SECONDS
@@ -0,0 +1,119 @@
+import struct
+
+import pytest
+
+from services import ogg
+
+BOS, EOS = 0x02, 0x04
+
+
+def raw_pages(data: bytes):
+    offset = 0
+    for page in ogg.iter_pages(data):
+        length = 27 + len(page.lacing) + len(page.body)
+        yield data[offset:offset + length]
+        offset += length
+
+
+def page_crc_ok(data: bytes) -> bool:
+    """Recompute the checksum of every page of `data` with its CRC field zeroed"""
+    for raw in raw_pages(data):
+        stored = struct.unpack_from("<I", raw, 22)[0]
+        if ogg._crc(raw[:22] + b"\x00\x00\x00\x00" + raw[26:]) != stored:
+            return False
+    return True
+
+
+def test_crc_check_value():
+    # CRC-32/MPEG-2 parameters without the initial value; the catalogue check value for init 0
+    assert ogg._crc(b"123456789") == 0x89A1897F
+
+
+@pytest.mark.parametrize("toc, extra, samples", [
+    (0x98, b"", 960),         # CELT 20 ms, one frame
+    (0x99, b"", 1920),        # CELT 20 ms, two frames
+    (0x9B, b"\x03", 2880),    # CELT 20 ms, code 3 with three frames
+    (0x80, b"", 120),         # CELT 2.5 ms
+    (0x18, b"", 2880),        # SILK 60 ms
+    (0x60, b"", 480),         # Hybrid 10 ms
+])
+def test_opus_packet_samples(toc, extra, samples):
+    assert ogg.opus_packet_samples(bytes([toc]) + extra + b"\x00") == samples
+
+
+def test_packets_of_fixture(read_fixture):
+    part_packets, granule = ogg.packets(read_fixture("part_b.opus"))
+    assert part_packets[0].startswith(b"OpusHead") and part_packets[1].startswith(b"OpusTags")
+    # The 300-byte packet is laced as 255 + 45 and comes back whole
+    assert [len(p) for p in part_packets[2:]] == [40, 300, 40, 40]
+    assert granule == 4500
+
+
+def test_concat_opus_single_part_is_unchanged(read_fixture):
+    part = read_fixture("part_a.opus")
+    assert ogg.concat_opus([part]) == part
+
+
+def test_concat_opus_is_one_logical_stream(read_fixture):
+    joined = ogg.concat_opus([read_fixture("part_a.opus"), read_fixture("part_b.opus")])
+    pages = list(ogg.iter_pages(joined))
+    assert {page.serial for page in pages} == {0x1111}
+    assert [page.flags for page in pages] == [BOS] + [0] * (len(pages) - 2) + [EOS]
+    assert [struct.unpack_from("<I", raw, 18)[0] for raw in raw_pages(joined)] == list(range(len(pages)))
+    assert page_crc_ok(joined)
+
+
+def test_concat_opus_keeps_first_headers_and_all_audio(read_fixture):
+    part_a, part_b = read_fixture("part_a.opus"), read_fixture("part_b.opus")
+    joined_packets, _ = ogg.packets(ogg.concat_opus([part_a, part_b]))
+    a_packets, _ = ogg.packets(part_a)
+    b_packets, _ = ogg.packets(part_b)
+    assert joined_packets == a_packets + b_packets[2:]
+
+
+def test_concat_opus_granules_continue_across_parts(read_fixture):
+    joined = ogg.concat_opus([read_fixture("part_a.opus"), read_fixture("part_b.opus")])
+    position = 0
+    granules = []
+    for page in ogg.iter_pages(joined):
+        packet_start = body = 0
+        for lace in page.lacing:
+            body += lace
+            if lace < 255:
+                if page.granule > 0:
+                    position += ogg.opus_packet_samples(page.body[packet_start:body])
+                packet_start = body
+        granules.append((page.granule, position))
+
+    # Header pages have granule 0; audio pages end at the samples decoded so far
+    assert granules[:2] == [(0, 0), (0, 0)]
+    assert all(granule == decoded for granule, decoded in granules[2:-1])
+    # A decodes 3 x 960, B 5 x 960 of which the last 300 are end trimming
+    assert granules[-1] == (2880 + 4500, 2880 + 4800)
+    assert [g for g, _ in granules] == sorted(g for g, _ in granules)
+
+
+def test_concat_opus_splits_pages_by_size(read_fixture):
+    many = ogg.concat_opus([read_fixture("part_a.opus")] * 100)  # 300 packets of 40 bytes
+    pages = list(ogg.iter_pages(many))
+    assert len(pages) > 3
+    assert all(len(page.body) < 4096 + 40 for page in pages)
+    assert page_crc_ok(many)
+    assert pages[-1].granule == 300 * 960
+
+
+def test_concat_opus_splits_pages_at_255_segments(read_fixture):
+    head, tags = ogg.packets(read_fixture("part_a.opus"))[0][:2]
+    tiny = [bytes([0x80, 0])] * 600  # 2.5 ms packets, far below the size target
+    part = (ogg._page(BOS, 0, 7, 0, [head]) + ogg._page(0, 0, 7, 1, [tags])
+            + ogg._page(0, 200 * 120, 7, 2, tiny[:200]) + ogg._page(0, 400 * 120, 7, 3, tiny[200:400])
+            + ogg._page(EOS, 600 * 120, 7, 4, tiny[400:]))
+    joined = ogg.concat_opus([part, part])
+    pages = list(ogg.iter_pages(joined))
+    assert [len(page.lacing) for page in pages[2:]] == [255, 255, 255, 255, 180]
+    assert [page.granule for page in pages[2:]] == [255 * 120 * n for n in range(1, 5)] + [1200 * 120]
+
+
+def test_concat_opus_rejects_non_opus(read_fixture):
+    with pytest.raises(ValueError):
+        ogg.concat_opus([read_fixture("part_a.opus"), read_fixture("tagged.mp3")])
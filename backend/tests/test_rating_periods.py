@@ -0,0 +1,88 @@
+from datetime import date, datetime, timedelta, timezone
+
+import pytest
+
+from services.rating_periods import utc_day, rollup_periods, cover_window
+
+
+def bucket_days(tier: str, period: str):
+    """The UTC days a (tier, period key) bucket counts"""
+    if tier == "day":
+        return [date.fromisoformat(period)]
+    if tier == "week":
+        start = date.fromisoformat(period)
+        assert start.weekday() == 0
+        return [start + timedelta(days=i) for i in range(7)]
+    start = date.fromisoformat(period + "-01")
+    days = []
+    while start.strftime("%Y-%m") == period:
+        days.append(start)
+        start += timedelta(days=1)
+    return days
+
+
+def covered_days(buckets):
+    return [day for tier, period in buckets for day in bucket_days(tier, period)]
+
+
+def test_utc_day():
+    assert utc_day(datetime(2024, 3, 1, 23, 30)) == date(2024, 3, 1)  # naive is UTC
+    assert utc_day(datetime(2024, 3, 1, 1, 0, tzinfo=timezone(timedelta(hours=8)))) == date(2024, 2, 29)
+
+
+def test_rollup_periods():
+    # A Sunday: its week started on the Monday of the previous month
+    assert rollup_periods(date(2024, 3, 3)) == [
+        ("day", "2024-03-03", date(2024, 3, 3)),
+        ("week", "2024-02-26", date(2024, 2, 26)),
+        ("month", "2024-03", date(2024, 3, 1)),
+    ]
+
+
+def test_rollup_periods_cover_the_day():
+    for tier, period, start in rollup_periods(date(2023, 12, 31)):
+        days = bucket_days(tier, period)
+        assert start == days[0] and date(2023, 12, 31) in days
+
+
+@pytest.mark.parametrize("start, end, expected", [
+    # Single day
+    (date(2024, 5, 15), date(2024, 5, 15), [("day", "2024-05-15")]),
+    # Empty window
+    (date(2024, 5, 15), date(2024, 5, 14), []),
+    # Exactly a (leap) month
+    (date(2024, 2, 1), date(2024, 2, 29), [("month", "2024-02")]),
+    # One day short of a month: weeks and days instead
+    (date(2024, 4, 1), date(2024, 4, 29), [
+        ("week", "2024-04-01"), ("week", "2024-04-08"), ("week", "2024-04-15"),
+        ("week", "2024-04-22"), ("day", "2024-04-29"),
+    ]),
+    # Exactly a Monday-Sunday week
+    (date(2024, 5, 13), date(2024, 5, 19), [("week", "2024-05-13")]),
+    # Six days from a Monday are not a week
+    (date(2024, 5, 13), date(2024, 5, 18), [("day", f"2024-05-{d}") for d in range(13, 19)]),
+    # A week may straddle a month boundary; the next month is then read by weeks and days
+    (date(2024, 4, 29), date(2024, 5, 6), [("week", "2024-04-29"), ("day", "2024-05-06")]),
+    # Across the new year: days up to a month start, then whole months
+    (date(2023, 11, 29), date(2024, 1, 31), [
+        ("day", "2023-11-29"), ("day", "2023-11-30"), ("month", "2023-12"), ("month", "2024-01"),
+    ]),
+])
+def test_cover_window_edges(start, end, expected):
+    assert cover_window(start, end) == expected
+
+
+def test_cover_window_covers_each_day_once():
+    start = date(2023, 12, 18)
+    for offset in range(0, 70, 3):
+        for length in (1, 6, 7, 8, 28, 31, 45, 90, 400):
+            window_start = start + timedelta(days=offset)
+            window_end = window_start + timedelta(days=length - 1)
+            days = covered_days(cover_window(window_start, window_end))
+            assert days == [window_start + timedelta(days=i) for i in range(length)]
+
+
+def test_cover_window_year_is_few_buckets():
+    buckets = cover_window(date(2023, 6, 15), date(2024, 6, 13))
+    assert len(buckets) <= 40
+    assert sum(1 for tier, _ in buckets if tier == "month") == 11